@@ -36,7 +36,6 @@ async def generate_deepseek_report(
             model=model,
         )
         report.report_md_llm = content
-        report.chart_spec_json = None
         report.llm_model = resolved_model
         report.llm_generated_at = datetime.now(timezone.utc)
         report.llm_status = "success"
@@ -106,7 +105,6 @@ async def analyze_with_deepseek(
             model=model,
         )
         report.report_md_llm = content
-        report.chart_spec_json = None
         report.llm_model = resolved_model
         report.llm_generated_at = datetime.now(timezone.utc)
         report.llm_status = "success"
@@ -160,7 +158,6 @@ def _run_deepseek_task(report_id: str, model: str | None, api_key: str | None) -
         payload = build_deepseek_payload(db, report)
         content, resolved_model = generate_deepseek_markdown(payload, api_key=api_key, model=model)
         report.report_md_llm = content
-        report.chart_spec_json = None
         report.llm_model = resolved_model
         report.llm_generated_at = datetime.now(timezone.utc)
         report.llm_status = "success"
@@ -3,9 +3,9 @@ from sqlalchemy.orm import Session
 
 from app.api.deps import get_db, require_token
 from app.db.models import ReportRun
-from app.schemas.report import ReportOut, ReportRequest, ReportStatusOut
+from app.schemas.report import ReportBatchRequest, ReportOut, ReportRequest, ReportStatusOut
 from app.services.report_progress_store import get_progress, set_progress
-from app.services.report_service import run_report, run_report_task
+from app.services.report_service import run_report, run_report_batch, run_report_task
 
 router = APIRouter()
 
@@ -19,23 +19,19 @@ async def run_report_endpoint(payload: ReportRequest, db: Session = Depends(get_
         if message.startswith("SYNC_RUNNING:"):
             raise HTTPException(status_code=409, detail=message.replace("SYNC_RUNNING: ", "")) from exc
         raise HTTPException(status_code=400, detail=message) from exc
-    return ReportOut(
-        id=str(report.id),
-        summary=report.summary_json,
-        anomalies=report.anomalies_json,
-        report_md=report.report_md,
-        report_md_llm=report.report_md_llm,
-        chart_spec_json=report.chart_spec_json,
-        facts_path=report.facts_path,
-        evidence_path=report.evidence_path,
-        evidence_json=report.evidence_json,
-        schema_version=report.schema_version,
-        llm_model=report.llm_model,
-        llm_generated_at=report.llm_generated_at,
-        llm_status=report.llm_status,
-        llm_error=report.llm_error,
-        created_at=report.created_at,
-    ).model_dump()
+    return _report_out(report)
+
+
+@router.post("/run-batch", dependencies=[Depends(require_token)])
+async def run_report_batch_endpoint(payload: ReportBatchRequest, db: Session = Depends(get_db)):
+    try:
+        reports = run_report_batch(db, payload)
+    except RuntimeError as exc:
+        message = str(exc)
+        if message.startswith("SYNC_RUNNING:"):
+            raise HTTPException(status_code=409, detail=message.replace("SYNC_RUNNING: ", "")) from exc
+        raise HTTPException(status_code=400, detail=message) from exc
+    return [_report_out(report) for report in reports]
 
 
 @router.post("/run-async", dependencies=[Depends(require_token)])
@@ -75,23 +71,7 @@ async def get_report(report_id: str, db: Session = Depends(get_db)):
     report = db.get(ReportRun, report_id)
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
-    return ReportOut(
-        id=str(report.id),
-        summary=report.summary_json,
-        anomalies=report.anomalies_json,
-        report_md=report.report_md,
-        report_md_llm=report.report_md_llm,
-        chart_spec_json=report.chart_spec_json,
-        facts_path=report.facts_path,
-        evidence_path=report.evidence_path,
-        evidence_json=report.evidence_json,
-        schema_version=report.schema_version,
-        llm_model=report.llm_model,
-        llm_generated_at=report.llm_generated_at,
-        llm_status=report.llm_status,
-        llm_error=report.llm_error,
-        created_at=report.created_at,
-    ).model_dump()
+    return _report_out(report)
 
 
 @router.get("/{report_id}/status", dependencies=[Depends(require_token)])
@@ -119,3 +99,23 @@ async def get_report_status(report_id: str, db: Session = Depends(get_db)):
         error=progress.error,
         updated_at=progress.updated_at,
     ).model_dump()
+
+
+def _report_out(report: ReportRun) -> dict:
+    return ReportOut(
+        id=str(report.id),
+        summary=report.summary_json,
+        anomalies=report.anomalies_json,
+        report_md=report.report_md,
+        report_md_llm=report.report_md_llm,
+        chart_spec_json=report.chart_spec_json,
+        facts_path=report.facts_path,
+        evidence_path=report.evidence_path,
+        evidence_json=report.evidence_json,
+        schema_version=report.schema_version,
+        llm_model=report.llm_model,
+        llm_generated_at=report.llm_generated_at,
+        llm_status=report.llm_status,
+        llm_error=report.llm_error,
+        created_at=report.created_at,
+    ).model_dump()
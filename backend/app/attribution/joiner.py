@@ -1,13 +1,19 @@
 from __future__ import annotations
 
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
+from app.attribution.lots import match_lots
 from app.connectors.binance_um import BinanceUMClient
 from app.features.behavior_features import add_behavior_features
+from app.features.excursion import RangeExtremaIndex, trade_excursions
 from app.features.market_features import WindowConfig, build_kline_features, oi_proxy_for_times
 from app.core.config import settings
 from app.storage.cache import MarketDataCache, compute_missing_ranges
@@ -26,6 +32,10 @@ INTERVALS = {
     "24h": "1h",
 }
 
+EXCURSION_INTERVAL = "1m"
+MARK_INTERVAL = "1m"
+MARK_INTERVAL_MS = 60 * 1000
+
 
 @dataclass
 class AttributionConfig:
@@ -55,11 +65,12 @@ def build_trade_attribution_table(
     symbols: list[str],
     market_store: MarketDataStore | None = None,
     fetch_market: bool = True,
+    lot_method: str | None = None,
+    workers: int | None = None,
 ) -> pd.DataFrame:
-    closes = _extract_closes(bybit_df, start_ms, end_ms, symbols)
+    closes = _extract_closes(bybit_df, start_ms, end_ms, symbols, lot_method)
     if closes.empty:
         return closes
-    funding_df = _extract_funding(bybit_df, start_ms, end_ms, symbols)
     market_features = _load_market_features(
         client,
         cache,
@@ -68,7 +79,64 @@ def build_trade_attribution_table(
         end_ms,
         market_store,
         fetch_missing=fetch_market,
+        workers=workers,
     )
+    return _attach_features(closes, bybit_df, market_features, cache, symbols, start_ms, end_ms)
+
+
+def build_trade_attribution_tables(
+    bybit_dfs: list[pd.DataFrame],
+    client: BinanceUMClient,
+    cache: MarketDataCache,
+    ranges_ms: list[tuple[int, int]],
+    symbols: list[list[str]],
+    market_store: MarketDataStore | None = None,
+    fetch_market: bool = True,
+    lot_method: str | None = None,
+    workers: int | None = None,
+    group_workers: int | None = None,
+) -> list[pd.DataFrame]:
+    # Market features are loaded once over the union range for every symbol
+    # that has closes anywhere; matching, funding and behaviour stay per range
+    # and can run on a thread pool since the feature frames are only read.
+    group_workers = max(1, int(group_workers if group_workers is not None else settings.REPORT_GROUP_WORKERS))
+    jobs = list(zip(bybit_dfs, ranges_ms, symbols))
+    with ThreadPoolExecutor(max_workers=group_workers) if group_workers > 1 else nullcontext() as pool:
+        run = pool.map if pool is not None else map
+        closes = list(run(lambda job: _extract_closes(job[0], *job[1], job[2], lot_method), jobs))
+        needed = sorted({symbol for table, names in zip(closes, symbols) if not table.empty for symbol in names})
+        market_features = {}
+        if needed:
+            market_features = _load_market_features(
+                client,
+                cache,
+                needed,
+                min(start_ms for start_ms, _ in ranges_ms),
+                max(end_ms for _, end_ms in ranges_ms),
+                market_store,
+                fetch_missing=fetch_market,
+                workers=workers,
+            )
+
+        def attach(item: tuple) -> pd.DataFrame:
+            table, (bybit_df, (start_ms, end_ms), range_symbols) = item
+            if table.empty:
+                return table
+            return _attach_features(table, bybit_df, market_features, cache, range_symbols, start_ms, end_ms)
+
+        return list(run(attach, zip(closes, jobs)))
+
+
+def _attach_features(
+    closes: pd.DataFrame,
+    bybit_df: pd.DataFrame,
+    market_features: dict[str, dict[str, pd.DataFrame]],
+    cache: MarketDataCache,
+    symbols: list[str],
+    start_ms: int,
+    end_ms: int,
+) -> pd.DataFrame:
+    funding_df = _extract_funding(bybit_df, start_ms, end_ms, symbols)
     closes = _merge_market_features(closes, market_features, funding_df, cache, symbols, start_ms, end_ms)
     closes = add_behavior_features(closes)
     return closes
@@ -81,7 +149,9 @@ def save_trade_attribution(df: pd.DataFrame, output_dir: Path, month_tag: str) -
     return path
 
 
-def _extract_closes(df: pd.DataFrame, start_ms: int, end_ms: int, symbols: list[str]) -> pd.DataFrame:
+def _extract_closes(
+    df: pd.DataFrame, start_ms: int, end_ms: int, symbols: list[str], lot_method: str | None = None
+) -> pd.DataFrame:
     data = df.copy()
     if symbols:
         data = data[data["symbol"].isin(symbols)]
@@ -97,12 +167,12 @@ def _extract_closes(df: pd.DataFrame, start_ms: int, end_ms: int, symbols: list[
     closes["fee"] = pd.to_numeric(closes["Fee Paid"], errors="coerce").fillna(0).abs()
     closes["pnl_net"] = pd.to_numeric(closes["Change"], errors="coerce").fillna(0)
     closes["direction"] = closes["direction_norm"].map({"BUY": "long", "SELL": "short"}).fillna("unknown")
-    open_times, holding_seconds = _match_open_times(data, closes)
+    open_times, holding_seconds = _match_open_times(data, closes, lot_method)
     closes["open_time"] = open_times
     closes["holding_seconds"] = holding_seconds
     closes["pnl_gross"] = closes["pnl_net"] + closes["fee"]
     closes["taker_proxy"] = (closes["fee"] > 0).astype(int)
-    closes["fee_bps"] = closes.apply(_fee_bps, axis=1)
+    closes["fee_bps"] = _fee_bps(closes["fee"], closes["turnover"])
     closes["close_fee_bps"] = closes["fee_bps"]
     return closes[
         [
@@ -143,46 +213,100 @@ def _load_market_features(
     end_ms: int,
     market_store: MarketDataStore | None,
     fetch_missing: bool,
+    workers: int | None = None,
 ) -> dict[str, dict[str, pd.DataFrame]]:
-    features: dict[str, dict[str, pd.DataFrame]] = {}
-    for symbol in symbols:
-        features[symbol] = {}
-        for window in WINDOWS:
-            interval = INTERVALS[window.label]
-            cached = cache.load("klines", symbol, interval)
-            if cached.empty and market_store is not None:
+    workers = max(1, int(workers if workers is not None else settings.MARKET_FEATURE_WORKERS))
+    if workers == 1 or len(symbols) < 2:
+        return {
+            symbol: _compute_symbol_features(
+                _load_symbol_market_data(client, cache, symbol, start_ms, end_ms, market_store, fetch_missing)
+            )
+            for symbol in symbols
+        }
+
+    # Threads, not processes: a spawned worker pool took ~3 s to start, while
+    # a symbol's features take ~25-120 ms for 7-90 days of bars, and threads
+    # overlap the pandas work with the I/O already done here.
+    store_lock = threading.Lock()
+    with ThreadPoolExecutor(max_workers=min(workers, len(symbols))) as pool:
+        computed = list(
+            pool.map(
+                lambda symbol: _compute_symbol_features(
+                    _load_symbol_market_data(
+                        client, cache, symbol, start_ms, end_ms, market_store, fetch_missing, store_lock
+                    )
+                ),
+                symbols,
+            )
+        )
+    return dict(zip(symbols, computed))
+
+
+def _load_symbol_market_data(
+    client: BinanceUMClient,
+    cache: MarketDataCache,
+    symbol: str,
+    start_ms: int,
+    end_ms: int,
+    market_store: MarketDataStore | None,
+    fetch_missing: bool,
+    store_lock: threading.Lock | None = None,
+) -> dict[str, object]:
+    store_guard = store_lock or nullcontext()
+    klines: dict[str, pd.DataFrame] = {}
+    mark_klines: dict[str, pd.DataFrame] = {}
+    for window in WINDOWS:
+        interval = INTERVALS[window.label]
+        cached = cache.load("klines", symbol, interval)
+        if cached.empty and market_store is not None:
+            with store_guard:
                 cached = market_store.load_klines(symbol, interval)
-            if fetch_missing:
-                for miss_start, miss_end in compute_missing_ranges(cached, start_ms, end_ms, "open_time"):
-                    rows = client.get_klines(symbol, interval, miss_start, miss_end)
-                    cached = cache.upsert("klines", symbol, interval, rows, time_col="open_time")
-                    if market_store is not None:
+        if fetch_missing:
+            for miss_start, miss_end in compute_missing_ranges(cached, start_ms, end_ms, "open_time"):
+                rows = client.get_klines(symbol, interval, miss_start, miss_end)
+                cached = cache.upsert("klines", symbol, interval, rows, time_col="open_time")
+                if market_store is not None:
+                    with store_guard:
                         market_store.upsert_klines(rows)
-            feat = build_kline_features(cached, window.kline_window, window.label)
-            features[symbol][window.label] = feat
-            mark_cached = cache.load("mark_klines", symbol, interval)
-            if mark_cached.empty and market_store is not None:
+        klines[window.label] = cached
+        mark_cached = cache.load("mark_klines", symbol, interval)
+        if mark_cached.empty and market_store is not None:
+            with store_guard:
                 mark_cached = market_store.load_mark_klines(symbol, interval)
-            if fetch_missing:
-                for miss_start, miss_end in compute_missing_ranges(mark_cached, start_ms, end_ms, "open_time"):
-                    rows = client.get_mark_klines(symbol, interval, miss_start, miss_end)
-                    mark_cached = cache.upsert("mark_klines", symbol, interval, rows, time_col="open_time")
-                    if market_store is not None:
+        if fetch_missing:
+            for miss_start, miss_end in compute_missing_ranges(mark_cached, start_ms, end_ms, "open_time"):
+                rows = client.get_mark_klines(symbol, interval, miss_start, miss_end)
+                mark_cached = cache.upsert("mark_klines", symbol, interval, rows, time_col="open_time")
+                if market_store is not None:
+                    with store_guard:
                         market_store.upsert_mark_klines(rows)
-        features[symbol]["funding"] = pd.DataFrame()
-        if settings.ENABLE_OI_FETCH:
-            oi_cached = cache.load("open_interest_hist", symbol, "5m")
-            if oi_cached.empty and market_store is not None:
+        mark_klines[window.label] = mark_cached
+    oi_cached = pd.DataFrame()
+    if settings.ENABLE_OI_FETCH:
+        oi_cached = cache.load("open_interest_hist", symbol, "5m")
+        if oi_cached.empty and market_store is not None:
+            with store_guard:
                 oi_cached = market_store.load_open_interest(symbol, "5m")
-            if fetch_missing:
-                for miss_start, miss_end in compute_missing_ranges(oi_cached, start_ms, end_ms, "timestamp"):
-                    rows = client.get_open_interest_hist(symbol, "5m", miss_start, miss_end)
-                    oi_cached = cache.upsert("open_interest_hist", symbol, "5m", rows, time_col="timestamp")
-                    if market_store is not None:
+        if fetch_missing:
+            for miss_start, miss_end in compute_missing_ranges(oi_cached, start_ms, end_ms, "timestamp"):
+                rows = client.get_open_interest_hist(symbol, "5m", miss_start, miss_end)
+                oi_cached = cache.upsert("open_interest_hist", symbol, "5m", rows, time_col="timestamp")
+                if market_store is not None:
+                    with store_guard:
                         market_store.upsert_open_interest(rows)
-            features[symbol]["oi"] = oi_cached
-        else:
-            features[symbol]["oi"] = pd.DataFrame()
+    return {"klines": klines, "mark_klines": mark_klines, "oi": oi_cached}
+
+
+def _compute_symbol_features(raw: dict[str, object]) -> dict[str, pd.DataFrame]:
+    features: dict[str, pd.DataFrame] = {}
+    for window in WINDOWS:
+        features[window.label] = build_kline_features(raw["klines"][window.label], window.kline_window, window.label)
+    features["funding"] = pd.DataFrame()
+    features["oi"] = raw["oi"]
+    excursion_label = next(label for label, interval in INTERVALS.items() if interval == EXCURSION_INTERVAL)
+    features["excursion_bars"] = raw["klines"][excursion_label]
+    mark_label = next(label for label, interval in INTERVALS.items() if interval == MARK_INTERVAL)
+    features["mark_bars"] = raw["mark_klines"][mark_label]
     return features
 
 
@@ -195,101 +319,194 @@ def _merge_market_features(
     start_ms: int,
     end_ms: int,
 ) -> pd.DataFrame:
-    merged_rows = []
-    for symbol in symbols:
-        symbol_closes = closes[closes["symbol"] == symbol].sort_values("close_time").copy()
-        if symbol_closes.empty:
-            continue
-        for window in WINDOWS:
-            feature_df = market_features[symbol][window.label]
-            if not feature_df.empty:
-                feature_df = feature_df.sort_values("open_time")
-                symbol_closes = pd.merge_asof(
-                    symbol_closes,
-                    feature_df,
-                    left_on="close_time",
-                    right_on="open_time",
-                    direction="backward",
-                    suffixes=("", "_market"),
-                )
-                if "open_time_market" in symbol_closes.columns:
-                    symbol_closes = symbol_closes.drop(columns=["open_time_market"])
-            else:
-                symbol_closes[f"trend_score_{window.label}"] = 0.0
-                symbol_closes[f"vol_bucket_{window.label}"] = "na"
-        for window in WINDOWS:
-            symbol_closes[f"funding_bucket_{window.label}"] = "na"
+    merged = closes[closes["symbol"].isin(symbols)]
+    if merged.empty:
+        return closes
+    merged = merged.sort_values("close_time", kind="mergesort").reset_index(drop=True)
+    for window in WINDOWS:
+        merged = _asof_window_features(merged, market_features, symbols, window)
+    merged = _asof_mark_slippage(merged, market_features, symbols)
+    for window in WINDOWS:
+        merged[f"funding_bucket_{window.label}"] = "na"
+    merged = _sort_by_symbol(merged, symbols)
+    for window in WINDOWS:
+        merged[f"oi_proxy_{window.label}"] = "na"
+    merged["mae_bps"] = np.nan
+    merged["mfe_bps"] = np.nan
+    for symbol, positions in merged.groupby("symbol", sort=False).indices.items():
         oi_local = market_features[symbol]["oi"]
+        close_times = merged["close_time"].to_numpy()[positions]
         for window in WINDOWS:
-            oi_buckets = oi_proxy_for_times(oi_local, symbol_closes["close_time"], window.window_ms, window.label)
-            symbol_closes[oi_buckets.name] = oi_buckets.values
-        symbol_closes["trend_bucket"] = symbol_closes["trend_score_24h"].apply(_trend_bucket)
-        symbol_closes["vol_bucket"] = symbol_closes["vol_bucket_24h"]
-        symbol_closes["funding_bucket"] = "na"
-        symbol_closes["oi_quadrant"] = symbol_closes.apply(_oi_quadrant, axis=1)
-        symbol_closes["funding"] = 0.0
-        if not funding_df.empty:
-            funding_symbol = funding_df[funding_df["symbol"] == symbol].sort_values("time_ms")
-            prev_time = start_ms
-            for idx, row in symbol_closes.iterrows():
-                close_time = row["close_time"]
-                window_rows = funding_symbol[(funding_symbol["time_ms"] > prev_time) & (funding_symbol["time_ms"] <= close_time)]
-                if not window_rows.empty:
-                    symbol_closes.at[idx, "funding"] = float(window_rows["funding"].sum())
-                prev_time = close_time
-        symbol_closes["pnl_gross"] = symbol_closes["pnl_net"] + symbol_closes["fee"] + symbol_closes["funding"]
-        merged_rows.append(symbol_closes)
-    if not merged_rows:
-        return closes
-    merged = pd.concat(merged_rows, ignore_index=True)
+            oi_buckets = oi_proxy_for_times(oi_local, close_times, window.window_ms, window.label)
+            merged.iloc[positions, merged.columns.get_loc(oi_buckets.name)] = oi_buckets.to_numpy()
+        open_times = merged["open_time"].to_numpy(dtype=float)[positions]
+        known_opens = open_times[np.isfinite(open_times)]
+        if known_opens.size:
+            excursion_index = RangeExtremaIndex.from_klines(
+                market_features[symbol]["excursion_bars"], int(known_opens.min()), int(close_times.max())
+            )
+        else:
+            excursion_index = RangeExtremaIndex.from_klines(pd.DataFrame())
+        mae, mfe = trade_excursions(
+            excursion_index,
+            open_times,
+            close_times,
+            merged["direction"].to_numpy()[positions],
+        )
+        merged.iloc[positions, merged.columns.get_loc("mae_bps")] = mae
+        merged.iloc[positions, merged.columns.get_loc("mfe_bps")] = mfe
+    score_24h = merged["trend_score_24h"].to_numpy(dtype=float)
+    merged["trend_bucket"] = np.where(np.abs(score_24h) >= 0.2, "trend", "range")
+    merged["vol_bucket"] = merged["vol_bucket_24h"]
+    merged["funding_bucket"] = "na"
+    merged["oi_quadrant"] = _oi_quadrant(merged["oi_proxy_24h"].to_numpy(), score_24h)
+    merged["funding"] = _funding_between_closes(merged, funding_df, start_ms)
+    merged["pnl_gross"] = merged["pnl_net"] + merged["fee"] + merged["funding"]
     return merged
 
 
-def _fee_bps(row: pd.Series) -> float:
-    turnover = row.get("turnover", 0) or 0
-    fee = row.get("fee", 0) or 0
-    if turnover <= 0:
-        return 0.0
-    return float(fee / turnover * 1e4)
-
-
-def _trend_bucket(score: float) -> str:
-    if score >= 0.2:
-        return "trend"
-    if score <= -0.2:
-        return "trend"
-    return "range"
-
-
-def _oi_quadrant(row: pd.Series) -> str:
-    oi_proxy = row.get("oi_proxy_24h", "na")
-    score = row.get("trend_score_24h", 0.0) or 0.0
-    if oi_proxy == "na":
-        return "na"
-    price_dir = "up" if score > 0.05 else "down" if score < -0.05 else "flat"
-    return f"oi_{oi_proxy}_price_{price_dir}"
-
-
-def _match_open_times(data: pd.DataFrame, closes: pd.DataFrame) -> tuple[pd.Series, pd.Series]:
-    opens = data[data["action_norm"].str.contains("OPEN", na=False)].copy()
-    opens = opens.sort_values("time_ms")
-    stacks: dict[tuple[str, str], list[int]] = {}
-    for _, row in opens.iterrows():
-        key = (row["symbol"], row["direction_norm"])
-        stacks.setdefault(key, []).append(int(row["time_ms"]))
-    open_time_map: dict[int, int | None] = {}
-    holding_map: dict[int, int | None] = {}
-    for idx, row in closes.sort_values("time_ms").iterrows():
-        key = (row["symbol"], row["direction_norm"])
-        if stacks.get(key):
-            open_time = stacks[key].pop()
-            open_time_map[idx] = open_time
-            holding_map[idx] = int((row["time_ms"] - open_time) / 1000)
-        else:
-            open_time_map[idx] = None
-            holding_map[idx] = None
-    open_series = pd.Series(open_time_map).reindex(closes.index)
-    holding_series = pd.Series(holding_map).reindex(closes.index)
+def _asof_window_features(
+    closes: pd.DataFrame,
+    market_features: dict[str, dict[str, pd.DataFrame]],
+    symbols: list[str],
+    window: WindowConfig,
+) -> pd.DataFrame:
+    trend_col = f"trend_score_{window.label}"
+    vol_col = f"vol_bucket_{window.label}"
+    frames = []
+    missing = []
+    for symbol in symbols:
+        feature_df = market_features[symbol][window.label]
+        if feature_df.empty:
+            missing.append(symbol)
+            continue
+        frames.append(feature_df[["open_time", trend_col, vol_col]].assign(symbol=symbol))
+    if frames:
+        features = pd.concat(frames, ignore_index=True)
+        features = features.rename(columns={"open_time": "open_time_market"})
+        features = features.sort_values("open_time_market", kind="mergesort")
+        closes = pd.merge_asof(
+            closes,
+            features,
+            left_on="close_time",
+            right_on="open_time_market",
+            by="symbol",
+            direction="backward",
+        )
+        closes = closes.drop(columns=["open_time_market"])
+    else:
+        closes[trend_col] = np.nan
+        closes[vol_col] = np.nan
+    if missing:
+        no_data = closes["symbol"].isin(missing)
+        closes[trend_col] = closes[trend_col].astype(float).mask(no_data, 0.0)
+        closes[vol_col] = closes[vol_col].astype(object).mask(no_data, "na")
+    return closes
+
+
+def _asof_mark_slippage(
+    closes: pd.DataFrame,
+    market_features: dict[str, dict[str, pd.DataFrame]],
+    symbols: list[str],
+) -> pd.DataFrame:
+    # Slippage is a cost: positive bps means the close executed worse than the
+    # mark (a long sold below it, a short bought back above it). The mark is
+    # the (open + close) / 2 midpoint of the execution minute's mark-price bar.
+    # Rows are closing fills, so opening fills are not measured.
+    frames = []
+    for symbol in symbols:
+        mark_df = market_features[symbol]["mark_bars"]
+        if mark_df.empty:
+            continue
+        frames.append(
+            pd.DataFrame(
+                {
+                    "mark_open_time": mark_df["open_time"].to_numpy(dtype=np.int64),
+                    "mark_price": (mark_df["open"].to_numpy(dtype=float) + mark_df["close"].to_numpy(dtype=float)) / 2,
+                    "symbol": symbol,
+                }
+            )
+        )
+    if not frames:
+        closes["mark_price"] = np.nan
+        closes["slippage_bps"] = np.nan
+        return closes
+    marks = pd.concat(frames, ignore_index=True).sort_values("mark_open_time", kind="mergesort")
+    closes = pd.merge_asof(
+        closes,
+        marks,
+        left_on="close_time",
+        right_on="mark_open_time",
+        by="symbol",
+        direction="backward",
+        tolerance=MARK_INTERVAL_MS - 1,
+    )
+    closes = closes.drop(columns=["mark_open_time"])
+    mark = closes["mark_price"].to_numpy(dtype=float)
+    price = closes["price"].to_numpy(dtype=float)
+    side = np.select([closes["direction"] == "long", closes["direction"] == "short"], [1.0, -1.0], default=np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slippage = side * (mark - price) / mark * 1e4
+    closes["slippage_bps"] = np.where((mark > 0) & (price > 0), slippage, np.nan)
+    return closes
+
+
+def _sort_by_symbol(df: pd.DataFrame, symbols: list[str]) -> pd.DataFrame:
+    rank = {symbol: idx for idx, symbol in enumerate(symbols)}
+    order = np.lexsort((df["close_time"].to_numpy(), df["symbol"].map(rank).to_numpy()))
+    return df.iloc[order].reset_index(drop=True)
+
+
+def _funding_between_closes(closes: pd.DataFrame, funding_df: pd.DataFrame, start_ms: int) -> np.ndarray:
+    funding = np.zeros(len(closes))
+    if funding_df.empty:
+        return funding
+    grouped_funding = dict(tuple(funding_df.groupby("symbol", sort=False)))
+    for symbol, positions in closes.groupby("symbol", sort=False).indices.items():
+        funding_symbol = grouped_funding.get(symbol)
+        if funding_symbol is None or funding_symbol.empty:
+            continue
+        funding_symbol = funding_symbol.sort_values("time_ms", kind="mergesort")
+        times = funding_symbol["time_ms"].to_numpy()
+        cum = np.concatenate(([0.0], np.cumsum(funding_symbol["funding"].to_numpy(dtype=float))))
+        close_times = closes["close_time"].to_numpy()[positions]
+        prev_times = np.concatenate(([start_ms], close_times[:-1]))
+        upper = cum[np.searchsorted(times, close_times, side="right")]
+        lower = cum[np.searchsorted(times, prev_times, side="right")]
+        funding[positions] = np.where(close_times > prev_times, upper - lower, 0.0)
+    return funding
+
+
+def _fee_bps(fee: pd.Series, turnover: pd.Series) -> np.ndarray:
+    turnover_arr = turnover.fillna(0).to_numpy(dtype=float)
+    fee_arr = fee.fillna(0).to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(turnover_arr > 0, fee_arr / turnover_arr * 1e4, 0.0)
+
+
+def _oi_quadrant(oi_proxy: np.ndarray, trend_score: np.ndarray) -> np.ndarray:
+    price_dir = np.select([trend_score > 0.05, trend_score < -0.05], ["up", "down"], default="flat")
+    labels = np.char.add(np.char.add(np.char.add("oi_", oi_proxy.astype(str)), "_price_"), price_dir)
+    return np.where(oi_proxy == "na", "na", labels).astype(object)
+
+
+def _match_open_times(
+    data: pd.DataFrame, closes: pd.DataFrame, lot_method: str | None = None
+) -> tuple[pd.Series, pd.Series]:
+    opens = data[data["action_norm"].str.contains("OPEN", na=False)]
+    opens = pd.DataFrame(
+        {
+            "symbol": opens["symbol"],
+            "direction_norm": opens["direction_norm"],
+            "time_ms": opens["time_ms"],
+            "qty": pd.to_numeric(opens["Quantity"], errors="coerce"),
+        }
+    )
+    open_times, _ = match_lots(opens, closes, lot_method or settings.LOT_MATCH_METHOD)
+    open_times = np.round(open_times)
+    holding = np.trunc((closes["time_ms"].to_numpy(dtype=float) - open_times) / 1000)
+    open_series = pd.Series(open_times, index=closes.index)
+    holding_series = pd.Series(holding, index=closes.index)
     return open_series, holding_series
 
 
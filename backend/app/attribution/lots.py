@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+LOT_METHODS = ("fifo", "lifo")
+_LOT_UNITS = 10**8
+
+
+def match_lots(
+    opens: pd.DataFrame,
+    closes: pd.DataFrame,
+    method: str = "lifo",
+) -> tuple[np.ndarray, np.ndarray]:
+    method = (method or "lifo").lower()
+    if method not in LOT_METHODS:
+        raise ValueError(f"unsupported lot method: {method}")
+    n_close = len(closes)
+    if n_close == 0:
+        return np.empty(0, dtype=float), np.empty(0, dtype=float)
+    if opens.empty:
+        return np.full(n_close, np.nan), np.zeros(n_close)
+
+    open_keys = opens["symbol"].astype(str) + "|" + opens["direction_norm"].astype(str)
+    close_keys = closes["symbol"].astype(str) + "|" + closes["direction_norm"].astype(str)
+    codes, _ = pd.factorize(pd.concat([open_keys, close_keys], ignore_index=True), sort=True)
+    g_open = codes[: len(opens)].astype(np.int64)
+    g_close = codes[len(opens) :].astype(np.int64)
+
+    t_open = opens["time_ms"].to_numpy(dtype=np.int64)
+    t_close = closes["time_ms"].to_numpy(dtype=np.int64)
+    q_open = _lot_qty(opens["qty"])
+    q_close = _lot_qty(closes["qty"])
+
+    if method == "lifo":
+        return _match_lifo(g_open, t_open, q_open, g_close, t_close, q_close)
+    return _match_fifo(g_open, t_open, q_open, g_close, t_close, q_close)
+
+
+def _lot_qty(series: pd.Series) -> np.ndarray:
+    qty = np.abs(pd.to_numeric(series, errors="coerce").to_numpy(dtype=float))
+    usable = np.isfinite(qty) & (qty > 0)
+    missing = int((~usable).sum())
+    if missing:
+        # Rows without a usable size count as one unit so logs lacking quantities
+        # still pair one open per close.
+        logger.warning("Lot matching: %d of %d rows have no quantity; counting each as one unit", missing, len(qty))
+    return np.where(usable, qty, 1.0)
+
+
+def _match_fifo(
+    g_open: np.ndarray,
+    t_open: np.ndarray,
+    q_open: np.ndarray,
+    g_close: np.ndarray,
+    t_close: np.ndarray,
+    q_close: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    n_open, n_close = len(g_open), len(g_close)
+    groups = np.concatenate((g_open, g_close))
+    times = np.concatenate((t_open, t_close))
+    is_close = np.concatenate((np.zeros(n_open, dtype=bool), np.ones(n_close, dtype=bool)))
+    units = np.maximum(np.rint(np.concatenate((q_open, q_close)) * _LOT_UNITS), 1).astype(np.int64)
+    order = np.lexsort((is_close, times, groups))
+
+    # Position after each event, clamped at zero: a close beyond the open
+    # position leaves its shortfall unmatched instead of borrowing later opens.
+    g_sorted = groups[order]
+    closing = is_close[order]
+    closed = np.where(closing, units[order], 0)
+    running = pd.Series(np.where(closing, -units[order], units[order])).groupby(g_sorted).cumsum()
+    uncovered = -np.minimum(running.groupby(g_sorted).cummin().to_numpy(), 0)
+    consumed = pd.Series(closed).groupby(g_sorted).cumsum().to_numpy() - uncovered
+    first = np.r_[True, g_sorted[1:] != g_sorted[:-1]]
+    before = np.where(first, 0, np.r_[0, consumed[:-1]])
+
+    # The queue is every open of a group laid end to end in time order; each
+    # close takes the stretch between the queue consumed before and after it.
+    open_order = np.lexsort((t_open, g_open))
+    g_o = g_open[open_order]
+    u_o = units[:n_open][open_order]
+    t_ref = int(min(t_open.min(), t_close.min()))
+    t_o = (t_open[open_order] - t_ref).astype(float)
+    edges = np.r_[0, np.cumsum(u_o)]
+    weighted_edges = np.r_[0.0, np.cumsum(u_o * t_o)]
+
+    close_rows = np.flatnonzero(closing)
+    base = edges[np.searchsorted(g_o, g_sorted[close_rows], side="left")]
+    lo = base + before[close_rows]
+    hi = base + consumed[close_rows]
+
+    def integrate(x: np.ndarray) -> np.ndarray:
+        k = np.clip(np.searchsorted(edges, x, side="right") - 1, 0, n_open - 1)
+        return weighted_edges[k] + (x - edges[k]) * t_o[k]
+
+    matched = hi - lo
+    weighted = integrate(hi) - integrate(lo)
+    close_idx = order[close_rows] - n_open
+    open_time = np.full(n_close, np.nan)
+    known_qty = np.zeros(n_close)
+    hit = matched > 0
+    open_time[close_idx[hit]] = t_ref + weighted[hit] / matched[hit]
+    known_qty[close_idx] = matched / _LOT_UNITS
+    return open_time, known_qty
+
+
+def _match_lifo(
+    g_open: np.ndarray,
+    t_open: np.ndarray,
+    q_open: np.ndarray,
+    g_close: np.ndarray,
+    t_close: np.ndarray,
+    q_close: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    n_open, n_close = len(g_open), len(g_close)
+    groups = np.concatenate((g_open, g_close))
+    times = np.concatenate((t_open, t_close))
+    is_close = np.concatenate((np.zeros(n_open, dtype=bool), np.ones(n_close, dtype=bool)))
+    units = np.maximum(np.rint(np.concatenate((q_open, q_close)) * _LOT_UNITS), 1).astype(np.int64)
+    order = np.lexsort((is_close, times, groups))
+
+    # Every group starts with a sentinel row sitting below an empty stack.
+    g_sorted = groups[order]
+    starts = np.flatnonzero(np.r_[True, g_sorted[1:] != g_sorted[:-1]])
+    source = np.insert(order, starts, -1)
+    sentinel = source < 0
+    pick = np.where(sentinel, 0, source)
+    closing = is_close[pick] & ~sentinel
+    row_time = np.where(sentinel, 0, times[pick])
+    delta = np.where(sentinel, 0, np.where(closing, -units[pick], units[pick]))
+
+    # Stack height after each event; closes beyond the stack clamp it at zero.
+    group_id = np.cumsum(sentinel) - 1
+    running = np.cumsum(delta)
+    running -= np.repeat(running[sentinel], np.diff(np.r_[np.flatnonzero(sentinel), len(source)]))
+    floor = pd.Series(running).groupby(group_id).cummin().to_numpy()
+    level = np.where(sentinel, -1, running - np.minimum(floor, 0))
+
+    # Nearest earlier row with a strictly lower stack, resolved by pointer jumping.
+    prev = np.arange(len(source)) - 1
+    prev[sentinel] = np.flatnonzero(sentinel)
+    pending = np.flatnonzero(~sentinel)
+    while pending.size:
+        cand = prev[pending]
+        stuck = level[cand] >= level[pending]
+        pending = pending[stuck]
+        prev[pending] = prev[cand[stuck]]
+
+    # A close pops the levels between its post-close height and the stack top;
+    # each step down the lower-row chain is one lot, opened by the row above it.
+    close_rows = np.flatnonzero(closing)
+    bottom = level[close_rows]
+    top = close_rows - 1
+    matched = np.zeros(len(close_rows))
+    weighted = np.zeros(len(close_rows))
+    live = np.flatnonzero(level[top] > bottom)
+    while live.size:
+        above = top[live]
+        below = prev[above]
+        width = (level[above] - np.maximum(level[below], bottom[live])).astype(float)
+        matched[live] += width
+        weighted[live] += width * (row_time[below + 1] - row_time[close_rows[live]])
+        top[live] = below
+        live = live[level[below] > bottom[live]]
+
+    close_idx = source[close_rows] - n_open
+    open_time = np.full(n_close, np.nan)
+    known_qty = np.zeros(n_close)
+    hit = matched > 0
+    open_time[close_idx[hit]] = row_time[close_rows[hit]] + weighted[hit] / matched[hit]
+    known_qty[close_idx] = matched / _LOT_UNITS
+    return open_time, known_qty
@@ -17,6 +17,14 @@ class Settings(BaseSettings):
     DEEPSEEK_BASE_URL: str = "https://api.deepseek.com"
     DEEPSEEK_MODEL: str = "deepseek-chat"
     ENABLE_OI_FETCH: bool = True
+    LOT_MATCH_METHOD: str = "lifo"
+    MARKET_FEATURE_WORKERS: int = 1
+    EVIDENCE_BOOTSTRAP_RESAMPLES: int = 0
+    CHART_POINT_BUDGET: int = 500
+    REPORT_CACHE_ENABLED: bool = True
+    REPORT_STREAM_CHUNK_ROWS: int = 50000
+    REPORT_GROUP_WORKERS: int = 1
+    MONTHLY_REPORT_PER_ACCOUNT: bool = False
 
     class Config:
         env_file = ".env"
@@ -22,3 +22,10 @@ def to_local(dt: datetime) -> datetime:
 
 def now_utc() -> datetime:
     return datetime.now(tz=UTC)
+
+
+def to_naive_utc(dt: datetime) -> datetime:
+    # Ledger timestamps are stored as naive UTC.
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(UTC).replace(tzinfo=None)
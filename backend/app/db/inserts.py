@@ -0,0 +1,18 @@
+from sqlalchemy import insert as sa_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+
+def insert_ignoring_conflicts(db: Session, model, rows: list[dict], conflict_cols: list[str]) -> None:
+    # Derived rows written by two sessions at once carry the same values, so
+    # the later insert is dropped instead of failing the caller's transaction.
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = pg_insert(model).on_conflict_do_nothing(index_elements=conflict_cols)
+    elif dialect == "sqlite":
+        stmt = sa_insert(model).prefix_with("OR IGNORE")
+    else:
+        stmt = sa_insert(model)
+    db.execute(stmt, rows)
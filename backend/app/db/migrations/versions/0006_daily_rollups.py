@@ -0,0 +1,56 @@
+"""add daily_rollups table
+
+Revision ID: 0006_daily_rollups
+Revises: 0005_report_runs_evidence_fields
+Create Date: 2026-02-02
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0006_daily_rollups"
+down_revision = "0005_report_runs_evidence_fields"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "daily_rollups",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("account_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("accounts.id"), nullable=False),
+        sa.Column("exchange_id", sa.String(length=50), nullable=False),
+        sa.Column("source", sa.String(length=20), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("symbol", sa.String(length=50), nullable=False),
+        sa.Column("asset", sa.String(length=20), nullable=False),
+        sa.Column("turnover", sa.Float(), nullable=False),
+        sa.Column("trades", sa.BigInteger(), nullable=False),
+        sa.Column("fill_fees", sa.Float(), nullable=False),
+        sa.Column("realized_pnl", sa.Float(), nullable=False),
+        sa.Column("open_turnover", sa.Float(), nullable=False),
+        sa.Column("open_trades", sa.BigInteger(), nullable=False),
+        sa.Column("open_fees", sa.Float(), nullable=False),
+        sa.Column("open_pnl", sa.Float(), nullable=False),
+        sa.Column("commission", sa.Float(), nullable=False),
+        sa.Column("commission_flows", sa.BigInteger(), nullable=False),
+        sa.Column("borrow_interest", sa.Float(), nullable=False),
+        sa.Column("rebates", sa.Float(), nullable=False),
+        sa.Column("funding", sa.Float(), nullable=False),
+        sa.Column("other_cashflow", sa.Float(), nullable=False),
+        sa.Column("cashflows", sa.BigInteger(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_daily_rollups_account_id", "daily_rollups", ["account_id"])
+    op.create_index("ix_daily_rollups_exchange_id", "daily_rollups", ["exchange_id"])
+    op.create_index("ix_daily_rollups_source", "daily_rollups", ["source"])
+    op.create_index("ix_daily_rollups_day", "daily_rollups", ["day"])
+    op.create_unique_constraint(
+        "uq_daily_rollups", "daily_rollups", ["account_id", "source", "day", "symbol", "asset"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("daily_rollups")
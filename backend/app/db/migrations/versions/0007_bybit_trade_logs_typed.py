@@ -0,0 +1,43 @@
+"""add typed numeric and normalised columns to bybit_trade_logs
+
+Revision ID: 0007_bybit_trade_logs_typed
+Revises: 0006_daily_rollups
+Create Date: 2026-02-09
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0007_bybit_trade_logs_typed"
+down_revision = "0006_daily_rollups"
+branch_labels = None
+depends_on = None
+
+NUMERIC_COLUMNS = ["quantity", "filled_price", "funding", "fee_paid", "change", "wallet_balance"]
+NUMBER_PATTERN = r"^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\s*$"
+
+
+def upgrade() -> None:
+    op.add_column("bybit_trade_logs", sa.Column("type_norm", sa.String(length=30), nullable=False, server_default=""))
+    op.add_column("bybit_trade_logs", sa.Column("action_norm", sa.String(length=30), nullable=False, server_default=""))
+    for name in NUMERIC_COLUMNS:
+        op.add_column("bybit_trade_logs", sa.Column(f"{name}_num", sa.Numeric(38, 18), nullable=True))
+
+    # Blanks, "--" and other non-numeric text stay NULL, as the string parser treated them.
+    assignments = ", ".join(
+        f"{name}_num = CASE WHEN {name} ~ '{NUMBER_PATTERN}' THEN CAST(TRIM({name}) AS NUMERIC) END"
+        for name in NUMERIC_COLUMNS
+    )
+    op.execute(
+        "UPDATE bybit_trade_logs SET "
+        "type_norm = UPPER(TRIM(COALESCE(type, ''))), "
+        f"action_norm = UPPER(TRIM(COALESCE(action, ''))), {assignments}"
+    )
+
+
+def downgrade() -> None:
+    for name in reversed(NUMERIC_COLUMNS):
+        op.drop_column("bybit_trade_logs", f"{name}_num")
+    op.drop_column("bybit_trade_logs", "action_norm")
+    op.drop_column("bybit_trade_logs", "type_norm")
@@ -0,0 +1,31 @@
+"""add report cache key and market data watermark indexes
+
+Revision ID: 0008_report_cache
+Revises: 0007_bybit_trade_logs_typed
+Create Date: 2026-02-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0008_report_cache"
+down_revision = "0007_bybit_trade_logs_typed"
+branch_labels = None
+depends_on = None
+
+MARKET_TABLES = ["market_klines", "market_mark_klines", "market_funding_rates", "market_open_interest"]
+
+
+def upgrade() -> None:
+    op.add_column("report_runs", sa.Column("cache_key", sa.String(length=64), nullable=True))
+    op.create_index("ix_report_runs_cache_key", "report_runs", ["cache_key"])
+    for table in MARKET_TABLES:
+        op.create_index(f"ix_{table}_created_at", table, ["created_at"])
+
+
+def downgrade() -> None:
+    for table in reversed(MARKET_TABLES):
+        op.drop_index(f"ix_{table}_created_at", table_name=table)
+    op.drop_index("ix_report_runs_cache_key", table_name="report_runs")
+    op.drop_column("report_runs", "cache_key")
@@ -0,0 +1,40 @@
+"""add monthly_snapshots table
+
+Revision ID: 0009_monthly_snapshots
+Revises: 0008_report_cache
+Create Date: 2026-02-23
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0009_monthly_snapshots"
+down_revision = "0008_report_cache"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "monthly_snapshots",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("account_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("accounts.id"), nullable=False),
+        sa.Column("source", sa.String(length=20), nullable=False),
+        sa.Column("month", sa.String(length=7), nullable=False),
+        sa.Column("base_currency", sa.String(length=20), nullable=False),
+        sa.Column("metrics", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("daily", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_monthly_snapshots_account_id", "monthly_snapshots", ["account_id"])
+    op.create_index("ix_monthly_snapshots_source", "monthly_snapshots", ["source"])
+    op.create_index("ix_monthly_snapshots_month", "monthly_snapshots", ["month"])
+    op.create_unique_constraint(
+        "uq_monthly_snapshots", "monthly_snapshots", ["account_id", "source", "month", "base_currency"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("monthly_snapshots")
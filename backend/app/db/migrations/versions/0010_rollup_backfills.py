@@ -0,0 +1,64 @@
+"""add rollup_backfills table and store rollup amounts as numeric
+
+Revision ID: 0010_rollup_backfills
+Revises: 0009_monthly_snapshots
+Create Date: 2026-03-02
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0010_rollup_backfills"
+down_revision = "0009_monthly_snapshots"
+branch_labels = None
+depends_on = None
+
+AMOUNT_COLUMNS = [
+    "turnover",
+    "fill_fees",
+    "realized_pnl",
+    "open_turnover",
+    "open_fees",
+    "open_pnl",
+    "commission",
+    "borrow_interest",
+    "rebates",
+    "funding",
+    "other_cashflow",
+]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "rollup_backfills",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("account_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("accounts.id"), nullable=False),
+        sa.Column("source", sa.String(length=20), nullable=False),
+        sa.Column("completed_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_rollup_backfills_account_id", "rollup_backfills", ["account_id"])
+    op.create_unique_constraint("uq_rollup_backfills", "rollup_backfills", ["account_id", "source"])
+    for column in AMOUNT_COLUMNS:
+        op.alter_column(
+            "daily_rollups",
+            column,
+            type_=sa.Numeric(38, 18),
+            existing_type=sa.Float(),
+            existing_nullable=False,
+            postgresql_using=f"{column}::numeric(38, 18)",
+        )
+
+
+def downgrade() -> None:
+    for column in AMOUNT_COLUMNS:
+        op.alter_column(
+            "daily_rollups",
+            column,
+            type_=sa.Float(),
+            existing_type=sa.Numeric(38, 18),
+            existing_nullable=False,
+            postgresql_using=f"{column}::double precision",
+        )
+    op.drop_table("rollup_backfills")
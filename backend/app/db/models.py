@@ -1,7 +1,8 @@
 import uuid
-from datetime import datetime
+from datetime import date, datetime
+from decimal import Decimal
 
-from sqlalchemy import BigInteger, Boolean, DateTime, Float, ForeignKey, String, Text, UniqueConstraint
+from sqlalchemy import BigInteger, Boolean, Date, DateTime, Float, ForeignKey, Numeric, String, Text, UniqueConstraint
 from sqlalchemy.dialects.postgresql import BYTEA, JSONB, UUID
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -108,12 +109,80 @@ class BybitTradeLog(Base):
     order_id: Mapped[str] = mapped_column(String(120))
     trade_id: Mapped[str] = mapped_column(String(120))
     ts_utc: Mapped[datetime] = mapped_column(DateTime, index=True)
+    type_norm: Mapped[str] = mapped_column(String(30), default="")
+    action_norm: Mapped[str] = mapped_column(String(30), default="")
+    quantity_num: Mapped[Decimal | None] = mapped_column(Numeric(38, 18))
+    filled_price_num: Mapped[Decimal | None] = mapped_column(Numeric(38, 18))
+    funding_num: Mapped[Decimal | None] = mapped_column(Numeric(38, 18))
+    fee_paid_num: Mapped[Decimal | None] = mapped_column(Numeric(38, 18))
+    change_num: Mapped[Decimal | None] = mapped_column(Numeric(38, 18))
+    wallet_balance_num: Mapped[Decimal | None] = mapped_column(Numeric(38, 18))
 
     __table_args__ = (
         UniqueConstraint("account_id", "trade_id", "ts_utc", "type", "action", name="uq_bybit_trade_log"),
     )
 
 
+class DailyRollup(Base):
+    __tablename__ = "daily_rollups"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    account_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("accounts.id"), index=True)
+    exchange_id: Mapped[str] = mapped_column(String(50), index=True)
+    source: Mapped[str] = mapped_column(String(20), index=True)
+    day: Mapped[date] = mapped_column(Date, index=True)
+    symbol: Mapped[str] = mapped_column(String(50))
+    asset: Mapped[str] = mapped_column(String(20))
+    turnover: Mapped[Decimal] = mapped_column(Numeric(38, 18), default=0)
+    trades: Mapped[int] = mapped_column(BigInteger, default=0)
+    fill_fees: Mapped[Decimal] = mapped_column(Numeric(38, 18), default=0)
+    realized_pnl: Mapped[Decimal] = mapped_column(Numeric(38, 18), default=0)
+    open_turnover: Mapped[Decimal] = mapped_column(Numeric(38, 18), default=0)
+    open_trades: Mapped[int] = mapped_column(BigInteger, default=0)
+    open_fees: Mapped[Decimal] = mapped_column(Numeric(38, 18), default=0)
+    open_pnl: Mapped[Decimal] = mapped_column(Numeric(38, 18), default=0)
+    commission: Mapped[Decimal] = mapped_column(Numeric(38, 18), default=0)
+    commission_flows: Mapped[int] = mapped_column(BigInteger, default=0)
+    borrow_interest: Mapped[Decimal] = mapped_column(Numeric(38, 18), default=0)
+    rebates: Mapped[Decimal] = mapped_column(Numeric(38, 18), default=0)
+    funding: Mapped[Decimal] = mapped_column(Numeric(38, 18), default=0)
+    other_cashflow: Mapped[Decimal] = mapped_column(Numeric(38, 18), default=0)
+    cashflows: Mapped[int] = mapped_column(BigInteger, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("account_id", "source", "day", "symbol", "asset", name="uq_daily_rollups"),
+    )
+
+
+class RollupBackfill(Base):
+    __tablename__ = "rollup_backfills"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    account_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("accounts.id"), index=True)
+    source: Mapped[str] = mapped_column(String(20))
+    completed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (UniqueConstraint("account_id", "source", name="uq_rollup_backfills"),)
+
+
+class MonthlySnapshot(Base):
+    __tablename__ = "monthly_snapshots"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    account_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("accounts.id"), index=True)
+    source: Mapped[str] = mapped_column(String(20), index=True)
+    month: Mapped[str] = mapped_column(String(7), index=True)
+    base_currency: Mapped[str] = mapped_column(String(20))
+    metrics: Mapped[dict] = mapped_column(JSONB)
+    daily: Mapped[list] = mapped_column(JSONB)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("account_id", "source", "month", "base_currency", name="uq_monthly_snapshots"),
+    )
+
+
 class MarketKline(Base):
     __tablename__ = "market_klines"
 
@@ -131,7 +200,7 @@ class MarketKline(Base):
     trades: Mapped[int] = mapped_column(BigInteger)
     taker_buy_base: Mapped[float] = mapped_column(Float)
     taker_buy_quote: Mapped[float] = mapped_column(Float)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
 
     __table_args__ = (
         UniqueConstraint("symbol", "interval", "open_time", name="uq_market_klines"),
@@ -150,7 +219,7 @@ class MarketMarkKline(Base):
     low: Mapped[float] = mapped_column(Float)
     close: Mapped[float] = mapped_column(Float)
     close_time: Mapped[int] = mapped_column(BigInteger)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
 
     __table_args__ = (
         UniqueConstraint("symbol", "interval", "open_time", name="uq_market_mark_klines"),
@@ -165,7 +234,7 @@ class MarketFundingRate(Base):
     funding_time: Mapped[int] = mapped_column(BigInteger, index=True)
     funding_rate: Mapped[float] = mapped_column(Float)
     mark_price: Mapped[float] = mapped_column(Float)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
 
     __table_args__ = (UniqueConstraint("symbol", "funding_time", name="uq_market_funding"),)
 
@@ -179,7 +248,7 @@ class MarketOpenInterest(Base):
     timestamp: Mapped[int] = mapped_column(BigInteger, index=True)
     sum_open_interest: Mapped[float] = mapped_column(Float)
     sum_open_interest_value: Mapped[float] = mapped_column(Float)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
 
     __table_args__ = (UniqueConstraint("symbol", "period", "timestamp", name="uq_market_oi"),)
 
@@ -202,6 +271,7 @@ class ReportRun(Base):
     evidence_path: Mapped[str | None] = mapped_column(Text)
     evidence_json: Mapped[dict | None] = mapped_column(JSONB)
     schema_version: Mapped[str | None] = mapped_column(String(20))
+    cache_key: Mapped[str | None] = mapped_column(String(64), index=True)
     llm_model: Mapped[str | None] = mapped_column(String(50))
     llm_generated_at: Mapped[datetime | None] = mapped_column(DateTime)
     llm_status: Mapped[str | None] = mapped_column(String(20))
@@ -0,0 +1,11 @@
+from itertools import islice
+
+
+def iter_chunks(query, chunk_rows: int):
+    # Server-side cursor in chunks of `chunk_rows`; 0 loads the result in one go.
+    if chunk_rows <= 0:
+        yield query.all()
+        return
+    rows = iter(query.yield_per(chunk_rows))
+    while chunk := list(islice(rows, chunk_rows)):
+        yield chunk
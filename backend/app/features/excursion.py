@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class RangeExtremaIndex:
+    bar_open_time: np.ndarray
+    bar_open: np.ndarray
+    max_table: np.ndarray
+    min_table: np.ndarray
+
+    @classmethod
+    def from_klines(
+        cls, klines: pd.DataFrame, start_ms: int | None = None, end_ms: int | None = None
+    ) -> "RangeExtremaIndex":
+        if klines.empty:
+            return cls(
+                bar_open_time=np.empty(0, dtype=np.int64),
+                bar_open=np.empty(0),
+                max_table=np.empty((1, 0)),
+                min_table=np.empty((1, 0)),
+            )
+        bars = klines.sort_values("open_time", kind="mergesort").drop_duplicates("open_time", keep="last")
+        # Only the bars a query can touch go into the tables: from the bar
+        # containing start_ms through the last bar opening by end_ms.
+        bar_times = bars["open_time"].to_numpy(dtype=np.int64)
+        first = 0 if start_ms is None else max(int(np.searchsorted(bar_times, start_ms, side="right")) - 1, 0)
+        last = len(bars) if end_ms is None else int(np.searchsorted(bar_times, end_ms, side="right"))
+        bars = bars.iloc[first:last]
+        return cls(
+            bar_open_time=bars["open_time"].to_numpy(dtype=np.int64),
+            bar_open=bars["open"].to_numpy(dtype=float),
+            max_table=_sparse_table(bars["high"].to_numpy(dtype=float), np.maximum),
+            min_table=_sparse_table(bars["low"].to_numpy(dtype=float), np.minimum),
+        )
+
+    def bar_span(self, start_ms: np.ndarray, end_ms: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        lo = np.searchsorted(self.bar_open_time, start_ms, side="right") - 1
+        hi = np.searchsorted(self.bar_open_time, end_ms, side="right") - 1
+        valid = (lo >= 0) & (hi >= lo)
+        lo = np.where(valid, lo, 0)
+        hi = np.where(valid, hi, 0)
+        return lo, hi, valid
+
+    def range_max(self, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        return _query(self.max_table, lo, hi, np.maximum)
+
+    def range_min(self, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        return _query(self.min_table, lo, hi, np.minimum)
+
+
+def trade_excursions(
+    index: RangeExtremaIndex,
+    open_times: np.ndarray,
+    close_times: np.ndarray,
+    directions: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    n = len(close_times)
+    mae = np.full(n, np.nan)
+    mfe = np.full(n, np.nan)
+    if n == 0 or index.bar_open_time.size == 0:
+        return mae, mfe
+    open_times = np.asarray(open_times, dtype=float)
+    known = np.isfinite(open_times)
+    lo, hi, valid = index.bar_span(
+        np.where(known, open_times, 0).astype(np.int64),
+        np.asarray(close_times, dtype=np.int64),
+    )
+    directions = np.asarray(directions, dtype=object)
+    is_long = directions == "long"
+    is_short = directions == "short"
+    valid &= known & (is_long | is_short)
+
+    # Entry is priced at the open of the bar the trade was opened in.
+    entry = index.bar_open[lo]
+    valid &= entry > 0
+    entry = np.where(valid, entry, 1.0)
+    up = (index.range_max(lo, hi) / entry - 1) * 1e4
+    down = (1 - index.range_min(lo, hi) / entry) * 1e4
+    mae[valid] = np.where(is_long, down, up)[valid]
+    mfe[valid] = np.where(is_long, up, down)[valid]
+    return mae, mfe
+
+
+def _sparse_table(values: np.ndarray, combine) -> np.ndarray:
+    n = values.size
+    levels = max(1, int(np.floor(np.log2(n))) + 1) if n else 1
+    table = np.empty((levels, n))
+    if n == 0:
+        return table
+    table[0] = values
+    for level in range(1, levels):
+        half = 1 << (level - 1)
+        table[level] = table[level - 1]
+        table[level, : n - half] = combine(table[level - 1, : n - half], table[level - 1, half:])
+    return table
+
+
+def _query(table: np.ndarray, lo: np.ndarray, hi: np.ndarray, combine) -> np.ndarray:
+    length = hi - lo + 1
+    level = np.floor(np.log2(np.maximum(length, 1))).astype(np.int64)
+    return combine(table[level, lo], table[level, hi - (1 << level) + 1])
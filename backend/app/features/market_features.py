@@ -70,27 +70,23 @@ def oi_proxy_for_times(
 ) -> pd.Series:
     if oi_df.empty:
         return pd.Series(["na"] * len(list(times_ms)), name=f"oi_proxy_{prefix}")
-    oi = oi_df.sort_values("timestamp").copy()
-    buckets = []
-    values = oi["sum_open_interest"].values
+    oi = oi_df.sort_values("timestamp")
+    values = oi["sum_open_interest"].to_numpy(dtype=float)
     if values.size:
         abs_change = np.abs(np.diff(values))
         change_thr = np.quantile(abs_change, 0.7) if abs_change.size else 0.0
     else:
         change_thr = 0.0
-    for ts in times_ms:
-        start = ts - window_ms
-        window = oi[(oi["timestamp"] >= start) & (oi["timestamp"] <= ts)]
-        if len(window) < 2:
-            buckets.append("na")
-            continue
-        delta = float(window["sum_open_interest"].iloc[-1] - window["sum_open_interest"].iloc[0])
-        if delta > change_thr:
-            buckets.append("up")
-        elif delta < -change_thr:
-            buckets.append("down")
-        else:
-            buckets.append("flat")
+    stamps = oi["timestamp"].to_numpy()
+    times = np.asarray(times_ms, dtype=np.int64)
+    lo = np.searchsorted(stamps, times - window_ms, side="left")
+    hi = np.searchsorted(stamps, times, side="right")
+    enough = (hi - lo) >= 2
+    last = values[np.clip(hi - 1, 0, values.size - 1)]
+    first = values[np.clip(lo, 0, values.size - 1)]
+    delta = np.where(enough, last - first, 0.0)
+    buckets = np.select([delta > change_thr, delta < -change_thr], ["up", "down"], default="flat").astype(object)
+    buckets[~enough] = "na"
     return pd.Series(buckets, name=f"oi_proxy_{prefix}")
 
 
@@ -5,10 +5,15 @@ from apscheduler.triggers.interval import IntervalTrigger
 from app.core.config import settings
 from app.db.session import SessionLocal
 from app.schemas.report import ReportRequest
-from app.services.market_sync import parse_market_sync_symbols, resolve_market_sync_range, sync_market_data
+from app.services.market_sync import (
+    parse_market_sync_symbols,
+    resolve_market_sync_range,
+    sync_conversion_rates,
+    sync_market_data,
+)
 from app.storage.cache import MarketDataCache
 from app.storage.market_store import MarketDataStore
-from app.services.report_service import run_report
+from app.services.report_service import resolve_range, run_report, run_report_fan_out
 from app.services.sync_service import run_sync
 
 
@@ -42,7 +47,10 @@ def _run_monthly_report() -> None:
     db = SessionLocal()
     try:
         payload = ReportRequest(preset="last_month", net_mode="fees_only")
-        run_report(db, payload)
+        if settings.MONTHLY_REPORT_PER_ACCOUNT:
+            run_report_fan_out(db, payload, include_combined=True)
+        else:
+            run_report(db, payload)
     finally:
         db.close()
 
@@ -52,6 +60,9 @@ def _run_periodic_sync() -> None:
     try:
         payload = ReportRequest(preset=settings.SYNC_PRESET)
         run_sync(db, payload)
+        start, end = resolve_range(payload)
+        if start and end:
+            sync_conversion_rates(db, MarketDataStore(db), MarketDataCache("outputs/market_cache"), start, end)
     finally:
         db.close()
 
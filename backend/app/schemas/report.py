@@ -14,6 +14,21 @@ class ReportRequest(BaseModel):
     include_market: Optional[bool] = False
 
 
+class ReportRange(BaseModel):
+    preset: Optional[str] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+
+class ReportBatchRequest(BaseModel):
+    account_ids: Optional[list[str]] = None
+    exchange_id: Optional[str] = None
+    presets: list[str] = []
+    ranges: list[ReportRange] = []
+    net_mode: Optional[str] = "fees_only"
+    include_market: Optional[bool] = False
+
+
 class ReportOut(BaseModel):
     id: str
     summary: dict
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+from datetime import date, datetime
+from functools import cached_property
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.timezone import to_naive_utc
+from app.db.models import BybitTradeLog
+from app.db.streaming import iter_chunks
+from app.services.anomalies import anomalies_from_parts
+from app.services.conversion import BaseCurrencyConverter
+from app.services.equity_curve import EquityCurve, TradeLogCurves, equity_curve_from_columns
+from app.services.ledger_columns import LedgerColumns
+from app.services.metrics import (
+    DailyNet,
+    TradeLogTotals,
+    compute_daily_series_from_rollups,
+    compute_metrics_from_rollups,
+)
+from app.services.progress import (
+    MonthlySummary,
+    detect_progress,
+    monthly_aggregate_from_rollups,
+    rolling_compare_from_daily,
+)
+from app.services.rollups import ROLLUP_SOURCE_LEDGER, ROLLUP_SOURCE_TRADE_LOGS
+from app.services.snapshots import load_rollups_with_snapshots
+
+
+TRADE_LOG_COLUMNS = (
+    BybitTradeLog.ts_utc,
+    BybitTradeLog.contract,
+    BybitTradeLog.currency,
+    BybitTradeLog.type_norm,
+    BybitTradeLog.action_norm,
+    BybitTradeLog.quantity_num,
+    BybitTradeLog.filled_price_num,
+    BybitTradeLog.fee_paid_num,
+    BybitTradeLog.change_num,
+    BybitTradeLog.funding_num,
+    BybitTradeLog.wallet_balance_num,
+    BybitTradeLog.account_id,
+)
+
+
+class RollupHistory:
+    # All-time baseline, monthly progress and rolling windows over the daily
+    # rollups, with closed months served from frozen monthly snapshots. It does
+    # not depend on the report range, so a batch of reports shares one.
+    def __init__(self, rollups: pd.DataFrame, frozen_months: dict[str, dict] | None = None) -> None:
+        self.rollups = rollups
+        self.frozen_months = frozen_months or {}
+        self._rolling: dict[int, dict] = {}
+
+    @cached_property
+    def baseline_metrics(self) -> dict:
+        return compute_metrics_from_rollups(self.rollups)
+
+    @cached_property
+    def baseline_daily(self) -> dict[date, DailyNet]:
+        return compute_daily_series_from_rollups(self.rollups)
+
+    @cached_property
+    def monthly(self) -> list[MonthlySummary]:
+        return monthly_aggregate_from_rollups(self.rollups, self.frozen_months)
+
+    @cached_property
+    def progress(self) -> dict:
+        return detect_progress(self.monthly)
+
+    def rolling(self, window_days: int) -> dict:
+        if window_days not in self._rolling:
+            self._rolling[window_days] = rolling_compare_from_daily(self.baseline_daily, window_days)
+        return self._rolling[window_days]
+
+
+class LedgerAnalytics:
+    # The period reads raw rows (ledger columns or trade logs); everything
+    # all-time comes from the rollup history.
+    def __init__(
+        self,
+        rollups: pd.DataFrame,
+        ledger: LedgerColumns | None = None,
+        trade_totals: TradeLogTotals | None = None,
+        trade_curves: TradeLogCurves | None = None,
+        frozen_months: dict[str, dict] | None = None,
+        history: RollupHistory | None = None,
+    ) -> None:
+        self.ledger = ledger
+        self.trade_totals = trade_totals
+        self.trade_curves = trade_curves
+        self.history = history or RollupHistory(rollups, frozen_months)
+
+    @classmethod
+    def load(
+        cls,
+        db: Session,
+        account_ids: list,
+        start: datetime | None,
+        end: datetime | None,
+        exchange_id: str | None = None,
+        use_trade_logs: bool = False,
+        converter: BaseCurrencyConverter | None = None,
+    ) -> "LedgerAnalytics":
+        return cls.load_many(db, account_ids, [(start, end)], exchange_id, use_trade_logs, converter)[0]
+
+    @classmethod
+    def load_many(
+        cls,
+        db: Session,
+        account_ids: list,
+        ranges: list[tuple[datetime | None, datetime | None]],
+        exchange_id: str | None = None,
+        use_trade_logs: bool = False,
+        converter: BaseCurrencyConverter | None = None,
+        account_groups: list[list] | None = None,
+    ) -> list["LedgerAnalytics"]:
+        # Rows are read once over the union of the ranges for every account and
+        # split per range and account group; each distinct group shares one
+        # rollup history.
+        start, end = _union(ranges)
+        groups = [list(group) for group in account_groups] if account_groups else [list(account_ids)] * len(ranges)
+        keys = [_group_key(group) for group in groups]
+        everyone = _group_key(account_ids)
+        source = ROLLUP_SOURCE_TRADE_LOGS if use_trade_logs else ROLLUP_SOURCE_LEDGER
+        histories: dict[tuple, RollupHistory] = {}
+        for group, key in zip(groups, keys):
+            if key not in histories:
+                if use_trade_logs:
+                    rollups, frozen = load_rollups_with_snapshots(db, group, source, exchange_id)
+                else:
+                    rollups, frozen = load_rollups_with_snapshots(db, group, source, converter=converter)
+                histories[key] = RollupHistory(rollups, frozen)
+
+        if use_trade_logs:
+            logs_query = db.query(*TRADE_LOG_COLUMNS).filter(BybitTradeLog.account_id.in_(account_ids))
+            if exchange_id:
+                logs_query = logs_query.filter(BybitTradeLog.exchange_id == exchange_id)
+            if start:
+                logs_query = logs_query.filter(BybitTradeLog.ts_utc >= start)
+            if end:
+                logs_query = logs_query.filter(BybitTradeLog.ts_utc <= end)
+            # The curve accumulators carry state across chunks and need time order.
+            logs_query = logs_query.order_by(BybitTradeLog.ts_utc, BybitTradeLog.id)
+            totals = [TradeLogTotals() for _ in ranges]
+            curves = [TradeLogCurves() for _ in ranges]
+            for rows in iter_chunks(logs_query, settings.REPORT_STREAM_CHUNK_ROWS):
+                for bounds, key, range_totals, range_curves in zip(ranges, keys, totals, curves):
+                    whole = bounds == (start, end) and key == everyone
+                    window = rows if whole else _rows_within(rows, *bounds, set(key))
+                    range_totals.add(window)
+                    range_curves.add(window)
+            return [
+                cls(history.rollups, trade_totals=range_totals, trade_curves=range_curves, history=history)
+                for range_totals, range_curves, history in zip(totals, curves, (histories[key] for key in keys))
+            ]
+
+        ledger = LedgerColumns.load(db, account_ids, start, end)
+        if converter is not None:
+            ledger = ledger.to_base(converter)
+        analytics = []
+        for bounds, key in zip(ranges, keys):
+            part = ledger
+            if bounds != (start, end):
+                part = part.between(*bounds)
+            if key != everyone:
+                part = part.for_accounts(list(key))
+            history = histories[key]
+            analytics.append(cls(history.rollups, ledger=part, history=history))
+        return analytics
+
+    @property
+    def uses_trade_logs(self) -> bool:
+        return self.trade_totals is not None
+
+    @property
+    def _period(self) -> LedgerColumns | TradeLogTotals:
+        return self.trade_totals if self.uses_trade_logs else self.ledger
+
+    @cached_property
+    def period_metrics(self) -> dict:
+        return self._period.metrics()
+
+    @cached_property
+    def period_daily(self) -> dict[date, DailyNet]:
+        return self._period.daily_series()
+
+    @cached_property
+    def anomalies(self) -> list[dict]:
+        period = self._period
+        return anomalies_from_parts(self.period_metrics, self.period_daily, period.window(), period.symbol_pnl())
+
+    @cached_property
+    def trade_curve(self) -> EquityCurve:
+        if self.uses_trade_logs:
+            return self.trade_curves.trade_curve()
+        return equity_curve_from_columns(self.ledger)
+
+    @cached_property
+    def wallet_curve(self) -> EquityCurve | None:
+        if self.uses_trade_logs:
+            return self.trade_curves.wallet_curve()
+        return None
+
+    @cached_property
+    def top_symbols(self) -> list[dict]:
+        return self._period.top_symbols()
+
+    @property
+    def baseline_metrics(self) -> dict:
+        return self.history.baseline_metrics
+
+    @property
+    def baseline_daily(self) -> dict[date, DailyNet]:
+        return self.history.baseline_daily
+
+    @property
+    def monthly(self) -> list[MonthlySummary]:
+        return self.history.monthly
+
+    @property
+    def progress(self) -> dict:
+        return self.history.progress
+
+    def rolling(self, window_days: int) -> dict:
+        return self.history.rolling(window_days)
+
+
+def _union(ranges: list[tuple[datetime | None, datetime | None]]) -> tuple[datetime | None, datetime | None]:
+    starts = [start for start, _ in ranges]
+    ends = [end for _, end in ranges]
+    start = None if any(value is None for value in starts) else min(starts, key=to_naive_utc)
+    end = None if any(value is None for value in ends) else max(ends, key=to_naive_utc)
+    return start, end
+
+
+def _group_key(account_ids: list) -> tuple[str, ...]:
+    return tuple(sorted(str(account_id) for account_id in account_ids))
+
+
+def _rows_within(rows: list, start: datetime | None, end: datetime | None, accounts: set[str]) -> list:
+    lo = to_naive_utc(start) if start else None
+    hi = to_naive_utc(end) if end else None
+    return [
+        row
+        for row in rows
+        if str(row.account_id) in accounts
+        and (lo is None or to_naive_utc(row.ts_utc) >= lo)
+        and (hi is None or to_naive_utc(row.ts_utc) <= hi)
+    ]
@@ -1,13 +1,31 @@
 from __future__ import annotations
 
 from datetime import datetime, timedelta
-from io import StringIO
 
+import numpy as np
 import pandas as pd
 from sqlalchemy.orm import Session
 
-from app.attribution.joiner import load_bybit_trade_log
+from app.core.config import settings
+from app.core.timezone import to_naive_utc
 from app.db.models import BybitTradeLog, Cashflow, Fill
+from app.db.streaming import iter_chunks
+
+
+REALIZED_MATCH_WINDOW = timedelta(minutes=5)
+
+LEDGER_FRAME_COLUMNS = [
+    "time_ms",
+    "symbol",
+    "action_norm",
+    "type_norm",
+    "direction_norm",
+    "Quantity",
+    "Filled Price",
+    "Funding",
+    "Fee Paid",
+    "Change",
+]
 
 
 def _build_bybit_df_from_db(
@@ -18,7 +36,74 @@ def _build_bybit_df_from_db(
     end: datetime,
     symbols: list[str],
 ) -> tuple[pd.DataFrame, bool]:
-    logs_query = db.query(BybitTradeLog)
+    (logs,) = _trade_log_frames(_trade_log_query(db, account_ids, exchange_id, start, end, symbols), [None])
+    if logs is not None:
+        return logs
+    return _ledger_rows_frame(*_ledger_rows(db, account_ids, exchange_id, start, end, symbols))
+
+
+def _build_bybit_dfs_from_db(
+    db: Session,
+    account_ids: list[str] | None,
+    exchange_id: str | None,
+    ranges: list[tuple[datetime, datetime]],
+    symbols: list[str],
+    account_groups: list[list[str]] | None = None,
+) -> list[tuple[pd.DataFrame, bool]]:
+    # One read over the union range and accounts; each range takes the rows of
+    # its account group and falls back to fills/cashflows exactly when its own
+    # window has no logs.
+    start = min((range_start for range_start, _ in ranges), key=to_naive_utc)
+    end = max((range_end for _, range_end in ranges), key=to_naive_utc)
+    groups = account_groups or [None] * len(ranges)
+    filters = [_row_filter(range_start, range_end, group) for (range_start, range_end), group in zip(ranges, groups)]
+    logs = _trade_log_frames(_trade_log_query(db, account_ids, exchange_id, start, end, symbols), filters)
+    ledger = None
+    frames = []
+    for keep, log_frame in zip(filters, logs):
+        if log_frame is not None:
+            frames.append(log_frame)
+            continue
+        if ledger is None:
+            ledger = _ledger_rows(db, account_ids, exchange_id, start, end, symbols)
+        fills, cashflows = ledger
+        frames.append(_ledger_rows_frame([row for row in fills if keep(row)], [row for row in cashflows if keep(row)]))
+    return frames
+
+
+def _row_filter(start: datetime, end: datetime, account_ids: list[str] | None):
+    lo, hi = to_naive_utc(start), to_naive_utc(end)
+    accounts = {str(account_id) for account_id in account_ids} if account_ids is not None else None
+
+    def keep(row) -> bool:
+        if accounts is not None and str(row.account_id) not in accounts:
+            return False
+        return lo <= to_naive_utc(row.ts_utc) <= hi
+
+    return keep
+
+
+def _trade_log_query(
+    db: Session,
+    account_ids: list[str] | None,
+    exchange_id: str | None,
+    start: datetime,
+    end: datetime,
+    symbols: list[str],
+):
+    logs_query = db.query(
+        BybitTradeLog.ts_utc,
+        BybitTradeLog.contract,
+        BybitTradeLog.type_norm,
+        BybitTradeLog.direction,
+        BybitTradeLog.action_norm,
+        BybitTradeLog.quantity_num,
+        BybitTradeLog.filled_price_num,
+        BybitTradeLog.funding_num,
+        BybitTradeLog.fee_paid_num,
+        BybitTradeLog.change_num,
+        BybitTradeLog.account_id,
+    )
     if account_ids:
         logs_query = logs_query.filter(BybitTradeLog.account_id.in_(account_ids))
     if exchange_id:
@@ -26,36 +111,55 @@ def _build_bybit_df_from_db(
     logs_query = logs_query.filter(BybitTradeLog.ts_utc >= start, BybitTradeLog.ts_utc <= end)
     if symbols:
         logs_query = logs_query.filter(BybitTradeLog.contract.in_(symbols))
-    logs = logs_query.all()
-    if logs:
-        rows = []
-        for log in logs:
-            rows.append(
-                {
-                    "Currency": log.currency or "USDT",
-                    "Contract": log.contract or "",
-                    "Type": log.type or "",
-                    "Direction": log.direction or "",
-                    "Quantity": log.quantity or "",
-                    "Position": log.position or "",
-                    "Filled Price": log.filled_price or "",
-                    "Funding": log.funding or "",
-                    "Fee Paid": log.fee_paid or "",
-                    "Cash Flow": log.cash_flow or "",
-                    "Change": log.change or "",
-                    "Wallet Balance": log.wallet_balance or "",
-                    "Action": log.action or "",
-                    "OrderId": log.order_id or "",
-                    "TradeId": log.trade_id or "",
-                    "Time": log.ts_utc.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
-                }
-            )
-        df = pd.DataFrame(rows)
-        realized_present = pd.to_numeric(df.get("Change"), errors="coerce").fillna(0).ne(0).any()
-        return load_bybit_trade_log(StringIO(df.to_csv(index=False))), realized_present
-
-    fills_query = db.query(Fill)
-    cash_query = db.query(Cashflow)
+    return logs_query.order_by(BybitTradeLog.ts_utc, BybitTradeLog.id)
+
+
+def _trade_log_frames(logs_query, filters: list) -> list[tuple[pd.DataFrame, bool] | None]:
+    # Each streamed chunk becomes frame columns before the next is fetched, so
+    # row tuples never pile up; None marks a filter that matched no logs.
+    parts: list[list] = [[] for _ in filters]
+    for rows in iter_chunks(logs_query, settings.REPORT_STREAM_CHUNK_ROWS):
+        for keep, frames in zip(filters, parts):
+            window = rows if keep is None else [row for row in rows if keep(row)]
+            if window:
+                frames.append(_trade_log_frame(window))
+    return [_joined_frames(frames) if frames else None for frames in parts]
+
+
+def _joined_frames(frames: list[tuple[pd.DataFrame, bool]]) -> tuple[pd.DataFrame, bool]:
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat([df for df, _ in frames], ignore_index=True), any(present for _, present in frames)
+
+
+def _trade_log_frame(logs: list) -> tuple[pd.DataFrame, bool]:
+    ts, contract, row_type, direction, action, quantity, price, funding, fee_paid, change, _ = zip(*logs)
+    df = _ledger_frame(
+        ts_utc=ts,
+        symbol=_strip_text(contract),
+        type_norm=np.array(row_type, dtype=object),
+        direction_norm=_upper_text(direction),
+        action_norm=np.array(action, dtype=object),
+        quantity=_as_float(quantity),
+        price=_as_float(price),
+        funding=_as_float(funding),
+        fee_paid=_as_float(fee_paid),
+        change=_as_float(change),
+    )
+    realized_present = bool(df["Change"].fillna(0).ne(0).any())
+    return df, realized_present
+
+
+def _ledger_rows(
+    db: Session,
+    account_ids: list[str] | None,
+    exchange_id: str | None,
+    start: datetime,
+    end: datetime,
+    symbols: list[str],
+) -> tuple[list, list]:
+    fills_query = db.query(Fill.ts_utc, Fill.symbol, Fill.side, Fill.qty, Fill.price, Fill.fee, Fill.account_id)
+    cash_query = db.query(Cashflow.ts_utc, Cashflow.symbol, Cashflow.type, Cashflow.amount, Cashflow.account_id)
     if account_ids:
         fills_query = fills_query.filter(Fill.account_id.in_(account_ids))
         cash_query = cash_query.filter(Cashflow.account_id.in_(account_ids))
@@ -67,80 +171,134 @@ def _build_bybit_df_from_db(
     if symbols:
         fills_query = fills_query.filter(Fill.symbol.in_(symbols))
         cash_query = cash_query.filter(Cashflow.symbol.in_(symbols))
-    fills = fills_query.all()
-    cashflows = cash_query.all()
+    return fills_query.all(), cash_query.all()
+
 
-    rows: list[dict] = []
+def _ledger_rows_frame(fills: list, cashflows: list) -> tuple[pd.DataFrame, bool]:
     realized = [cf for cf in cashflows if cf.type == "realized_pnl"]
     realized_present = len(realized) > 0
-    realized_df = pd.DataFrame(
-        [
-            {
-                "symbol": cf.symbol,
-                "time": cf.ts_utc,
-                "amount": float(cf.amount),
-            }
-            for cf in realized
-            if cf.symbol
-        ]
+    funding_flows = [cf for cf in cashflows if cf.type == "funding"]
+
+    fill_ts, fill_symbol, fill_side, fill_qty, fill_price, fill_fee, _ = _columns(fills, 7)
+    fill_frame = _ledger_frame(
+        ts_utc=fill_ts,
+        symbol=_strip_text(fill_symbol),
+        type_norm=np.full(len(fills), "TRADE", dtype=object),
+        direction_norm=_upper_text(fill_side),
+        action_norm=np.full(len(fills), "CLOSE", dtype=object),
+        quantity=_as_float(fill_qty),
+        price=_as_float(fill_price),
+        funding=np.zeros(len(fills)),
+        fee_paid=-np.abs(_as_float(fill_fee)),
+        change=np.zeros(len(fills)),
+    )
+    cash_ts, cash_symbol, _, cash_amount, _ = _columns(funding_flows, 5)
+    amounts = _as_float(cash_amount)
+    funding_frame = _ledger_frame(
+        ts_utc=cash_ts,
+        symbol=np.array([symbol or "--" for symbol in cash_symbol], dtype=object),
+        type_norm=np.full(len(funding_flows), "SETTLEMENT", dtype=object),
+        direction_norm=np.where(amounts >= 0, "BUY", "SELL").astype(object),
+        action_norm=np.full(len(funding_flows), "SETTLEMENT", dtype=object),
+        quantity=np.full(len(funding_flows), np.nan),
+        price=np.full(len(funding_flows), np.nan),
+        funding=amounts,
+        fee_paid=np.zeros(len(funding_flows)),
+        change=amounts,
     )
-    for fill in fills:
-        rows.append(
+    df = pd.concat([fill_frame, funding_frame], ignore_index=True)
+
+    realized_rows = [(cf.ts_utc, cf.symbol, cf.amount) for cf in realized if cf.symbol]
+    if realized_present and realized_rows:
+        realized_ts, realized_symbol, realized_amount = zip(*realized_rows)
+        realized_df = pd.DataFrame(
             {
-                "Currency": fill.fee_asset or "USDT",
-                "Contract": fill.symbol,
-                "Type": "TRADE",
-                "Direction": (fill.side or "").upper(),
-                "Quantity": str(fill.qty),
-                "Position": "--",
-                "Filled Price": str(fill.price),
-                "Funding": "0",
-                "Fee Paid": str(-abs(fill.fee)),
-                "Cash Flow": "--",
-                "Change": "0",
-                "Wallet Balance": "--",
-                "Action": "CLOSE",
-                "OrderId": fill.order_id or "--",
-                "TradeId": fill.trade_id or "--",
-                "Time": fill.ts_utc.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+                "symbol": list(realized_symbol),
+                "time_ns": pd.to_datetime(list(realized_ts), utc=True).as_unit("ns").asi8,
+                "amount": _as_float(realized_amount),
             }
         )
-    for cf in cashflows:
-        if cf.type != "funding":
-            continue
-        rows.append(
-            {
-                "Currency": cf.asset or "USDT",
-                "Contract": cf.symbol or "--",
-                "Type": "SETTLEMENT",
-                "Direction": "BUY" if cf.amount >= 0 else "SELL",
-                "Quantity": "--",
-                "Position": "--",
-                "Filled Price": "--",
-                "Funding": str(cf.amount),
-                "Fee Paid": "0",
-                "Cash Flow": str(cf.amount),
-                "Change": str(cf.amount),
-                "Wallet Balance": "--",
-                "Action": "SETTLEMENT",
-                "OrderId": cf.flow_id or "--",
-                "TradeId": cf.flow_id or "--",
-                "Time": cf.ts_utc.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
-            }
+        is_trade = df["type_norm"].to_numpy() == "TRADE"
+        df.loc[is_trade, "Change"] = _realized_within_window(
+            df.loc[is_trade, "symbol"].to_numpy(),
+            df.loc[is_trade, "time_ms"].to_numpy(dtype=np.int64) * 1_000_000,
+            realized_df,
+            REALIZED_MATCH_WINDOW,
+            df.loc[is_trade, "Change"].to_numpy(dtype=float),
         )
-    df = pd.DataFrame(rows)
-    if realized_present and not realized_df.empty:
-        realized_df["time"] = pd.to_datetime(realized_df["time"], utc=True)
-        for idx, row in df.iterrows():
-            if row["Type"] != "TRADE":
-                continue
-            symbol = row["Contract"]
-            ts = pd.to_datetime(row["Time"], utc=True)
-            window = realized_df[
-                (realized_df["symbol"] == symbol)
-                & (realized_df["time"] >= ts - timedelta(minutes=5))
-                & (realized_df["time"] <= ts + timedelta(minutes=5))
-            ]
-            if not window.empty:
-                df.at[idx, "Change"] = str(float(window["amount"].sum()))
-    return load_bybit_trade_log(StringIO(df.to_csv(index=False))), realized_present
+    return df, realized_present
+
+
+def _realized_within_window(
+    symbols: np.ndarray,
+    times_ns: np.ndarray,
+    realized_df: pd.DataFrame,
+    window: timedelta,
+    default: np.ndarray,
+) -> np.ndarray:
+    # Sum of realized PnL per fill within +/- window on the same symbol, using
+    # searchsorted bounds over per-symbol prefix sums.
+    out = default.copy()
+    window_ns = int(window.total_seconds() * 1_000_000_000)
+    fill_groups = pd.Series(np.arange(len(symbols))).groupby(symbols, sort=False).indices
+    for symbol, realized_symbol in realized_df.groupby("symbol", sort=False):
+        positions = fill_groups.get(symbol)
+        if positions is None:
+            continue
+        realized_symbol = realized_symbol.sort_values("time_ns", kind="mergesort")
+        realized_times = realized_symbol["time_ns"].to_numpy()
+        cum = np.concatenate(([0.0], np.cumsum(realized_symbol["amount"].to_numpy(dtype=float))))
+        lo = np.searchsorted(realized_times, times_ns[positions] - window_ns, side="left")
+        hi = np.searchsorted(realized_times, times_ns[positions] + window_ns, side="right")
+        matched = hi > lo
+        out[positions[matched]] = cum[hi[matched]] - cum[lo[matched]]
+    return out
+
+
+def _ledger_frame(
+    ts_utc,
+    symbol: np.ndarray,
+    type_norm: np.ndarray,
+    direction_norm: np.ndarray,
+    action_norm: np.ndarray,
+    quantity: np.ndarray,
+    price: np.ndarray,
+    funding: np.ndarray,
+    fee_paid: np.ndarray,
+    change: np.ndarray,
+) -> pd.DataFrame:
+    times = pd.to_datetime(pd.Series(list(ts_utc), dtype=object), utc=True, errors="coerce")
+    time_ms = times.fillna(pd.Timestamp(0, tz="UTC")).dt.as_unit("ns").astype("int64") // 1_000_000
+    return pd.DataFrame(
+        {
+            "time_ms": time_ms.to_numpy(),
+            "symbol": symbol,
+            "action_norm": action_norm,
+            "type_norm": type_norm,
+            "direction_norm": direction_norm,
+            "Quantity": quantity,
+            "Filled Price": price,
+            "Funding": funding,
+            "Fee Paid": fee_paid,
+            "Change": change,
+        },
+        columns=LEDGER_FRAME_COLUMNS,
+    )
+
+
+def _columns(rows: list, width: int) -> tuple:
+    if not rows:
+        return tuple(() for _ in range(width))
+    return tuple(zip(*rows))
+
+
+def _strip_text(values) -> np.ndarray:
+    return np.array([(value or "").strip() for value in values], dtype=object)
+
+
+def _upper_text(values) -> np.ndarray:
+    return np.array([(value or "").strip().upper() for value in values], dtype=object)
+
+
+def _as_float(values) -> np.ndarray:
+    return np.array([float(value) if value is not None else np.nan for value in values], dtype=float)
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from datetime import date, datetime, time, timezone
+
+import numpy as np
+
+from app.services.equity_curve import EquityCurve
+from app.services.metrics import DailyNet
+
+
+CHART_VALUE_DECIMALS = 6
+
+
+def build_chart_spec(trade_curve: EquityCurve, daily_series: dict[date, DailyNet], budget: int) -> dict:
+    charts = []
+    if trade_curve.equity.size:
+        drawdown = trade_curve.equity - np.maximum.accumulate(trade_curve.equity)
+        charts.append(_line_chart("equity", "权益曲线", trade_curve.times_ms, trade_curve.equity, budget))
+        charts.append(_line_chart("drawdown", "回撤", trade_curve.times_ms, drawdown, budget, area=True))
+    if daily_series:
+        days = sorted(daily_series)
+        day_ms = np.array(
+            [int(datetime.combine(d, time.min, tzinfo=timezone.utc).timestamp() * 1000) for d in days],
+            dtype=np.int64,
+        )
+        net = np.array([float(daily_series[d].net_after_fees_and_funding) for d in days], dtype=float)
+        fees = np.array([float(daily_series[d].trading_fees) for d in days], dtype=float)
+        turnover = np.array([float(daily_series[d].turnover) for d in days], dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fee_bps = np.where(turnover > 0, fees / turnover * 1e4, 0.0)
+        charts.append(_bar_chart("daily_net", "每日净收益", day_ms, net, budget))
+        charts.append(_line_chart("fee_bps", "每日费率 (bps)", day_ms, fee_bps, budget))
+    return {"point_budget": budget, "charts": charts}
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, budget: int) -> np.ndarray:
+    n = len(x)
+    if budget >= n or budget < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Interior points split into budget - 2 buckets; each bucket keeps the
+    # point forming the largest triangle with the previous pick and the
+    # mean of the next bucket (read from prefix sums).
+    edges = np.linspace(1, n - 1, budget - 1).astype(np.int64)
+    next_hi = np.concatenate((edges[2:], [n]))
+    cum_x = np.concatenate(([0.0], np.cumsum(x)))
+    cum_y = np.concatenate(([0.0], np.cumsum(y)))
+    next_count = next_hi - edges[1:]
+    avg_x = (cum_x[next_hi] - cum_x[edges[1:]]) / next_count
+    avg_y = (cum_y[next_hi] - cum_y[edges[1:]]) / next_count
+
+    picked = np.empty(budget, dtype=np.int64)
+    picked[0] = 0
+    picked[-1] = n - 1
+    anchor = 0
+    for bucket in range(budget - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        area = np.abs(
+            (x[anchor] - avg_x[bucket]) * (y[lo:hi] - y[anchor])
+            - (x[anchor] - x[lo:hi]) * (avg_y[bucket] - y[anchor])
+        )
+        anchor = lo + int(np.argmax(area))
+        picked[bucket + 1] = anchor
+    return picked
+
+
+def _points(times_ms: np.ndarray, values: np.ndarray, budget: int) -> list[list]:
+    keep = lttb_indices(times_ms, values, budget)
+    rounded = np.round(values[keep], CHART_VALUE_DECIMALS)
+    return [[int(t), float(v)] for t, v in zip(times_ms[keep], rounded)]
+
+
+def _line_chart(chart_id: str, title: str, times_ms, values, budget: int, area: bool = False) -> dict:
+    series = {"type": "line", "showSymbol": False, "data": _points(times_ms, values, budget)}
+    if area:
+        series["areaStyle"] = {}
+    return {"id": chart_id, "type": "line", "title": title, "option": _time_axis_option([series])}
+
+
+def _bar_chart(chart_id: str, title: str, times_ms, values, budget: int) -> dict:
+    series = {"type": "bar", "data": _points(times_ms, values, budget)}
+    return {"id": chart_id, "type": "bar", "title": title, "option": _time_axis_option([series])}
+
+
+def _time_axis_option(series: list[dict]) -> dict:
+    return {
+        "tooltip": {"trigger": "axis"},
+        "xAxis": {"type": "time"},
+        "yAxis": {"type": "value", "scale": True},
+        "series": series,
+    }
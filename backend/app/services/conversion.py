@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+from app.schemas.ledger import Cashflow, Fill
+from app.storage.cache import MarketDataCache
+from app.storage.market_store import MarketDataStore
+
+
+CONVERSION_INTERVAL = "1h"
+CONVERSION_MAX_STALENESS_MS = 24 * 60 * 60 * 1000
+
+
+@dataclass
+class RateSeries:
+    close_time: np.ndarray
+    close: np.ndarray
+
+
+class BaseCurrencyConverter:
+    def __init__(
+        self,
+        cache: MarketDataCache,
+        market_store: MarketDataStore | None = None,
+        base: str | None = None,
+        interval: str = CONVERSION_INTERVAL,
+    ) -> None:
+        self.cache = cache
+        self.market_store = market_store
+        self.base = (base or settings.BASE_CURRENCY).upper()
+        self.interval = interval
+        self._series: dict[str, RateSeries | None] = {}
+
+    def rates(self, assets: np.ndarray, times_ms: np.ndarray) -> np.ndarray:
+        assets = np.asarray(assets, dtype=object)
+        times_ms = np.asarray(times_ms, dtype=np.int64)
+        out = np.full(len(assets), np.nan)
+        if out.size == 0:
+            return out
+        codes, uniques = pd.factorize(pd.Series(assets).fillna("").astype(str).str.upper())
+        for code, asset in enumerate(uniques):
+            positions = np.flatnonzero(codes == code)
+            if asset == self.base:
+                out[positions] = 1.0
+                continue
+            out[positions] = self._asset_rates(asset, times_ms[positions])
+        return out
+
+    def convert(self, assets: np.ndarray, times_ms: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+        return np.asarray(amounts, dtype=float) * self.rates(assets, times_ms)
+
+    def _asset_rates(self, asset: str, times_ms: np.ndarray) -> np.ndarray:
+        if not asset:
+            return np.full(len(times_ms), np.nan)
+        direct = self._pair(f"{asset}{self.base}")
+        if direct is not None:
+            return _asof_close(direct, times_ms)
+        inverse = self._pair(f"{self.base}{asset}")
+        if inverse is not None:
+            with np.errstate(divide="ignore"):
+                return 1.0 / _asof_close(inverse, times_ms)
+        return np.full(len(times_ms), np.nan)
+
+    def _pair(self, pair: str) -> RateSeries | None:
+        if pair not in self._series:
+            klines = self.cache.load("klines", pair, self.interval)
+            if klines.empty and self.market_store is not None:
+                klines = self.market_store.load_klines(pair, self.interval)
+            if klines.empty:
+                self._series[pair] = None
+            else:
+                klines = klines.sort_values("open_time", kind="mergesort")
+                self._series[pair] = RateSeries(
+                    close_time=klines["open_time"].to_numpy(dtype=np.int64) + _interval_ms(self.interval),
+                    close=klines["close"].to_numpy(dtype=float),
+                )
+        return self._series[pair]
+
+
+def convert_ledger_to_base(
+    fills: list[Fill],
+    cashflows: list[Cashflow],
+    converter: BaseCurrencyConverter,
+) -> tuple[list[Fill], list[Cashflow]]:
+    base = converter.base
+    fee_positions = [idx for idx, fill in enumerate(fills) if fill.fee_asset and fill.fee_asset.upper() != base]
+    if fee_positions:
+        fee_converted = converter.convert(
+            [fills[idx].fee_asset for idx in fee_positions],
+            _times_ms([fills[idx].ts_utc for idx in fee_positions]),
+            [float(fills[idx].fee) for idx in fee_positions],
+        )
+        fills = list(fills)
+        for idx, value in zip(fee_positions, fee_converted):
+            if np.isfinite(value):
+                fills[idx] = fills[idx].model_copy(update={"fee": Decimal(str(value)), "fee_asset": base})
+
+    cash_positions = [idx for idx, cf in enumerate(cashflows) if cf.asset and cf.asset.upper() != base]
+    if cash_positions:
+        cash_converted = converter.convert(
+            [cashflows[idx].asset for idx in cash_positions],
+            _times_ms([cashflows[idx].ts_utc for idx in cash_positions]),
+            [float(cashflows[idx].amount) for idx in cash_positions],
+        )
+        cashflows = list(cashflows)
+        for idx, value in zip(cash_positions, cash_converted):
+            if np.isfinite(value):
+                cashflows[idx] = cashflows[idx].model_copy(update={"amount": Decimal(str(value)), "asset": base})
+    return fills, cashflows
+
+
+def _asof_close(series: RateSeries, times_ms: np.ndarray) -> np.ndarray:
+    # Close of the latest bar already finished at each timestamp, so a rate
+    # never comes from later in the hour; stale or missing bars leave the
+    # amount unconverted.
+    idx = np.searchsorted(series.close_time, times_ms, side="right") - 1
+    found = idx >= 0
+    idx = np.where(found, idx, 0)
+    fresh = found & (times_ms - series.close_time[idx] <= CONVERSION_MAX_STALENESS_MS)
+    return np.where(fresh & (series.close[idx] > 0), series.close[idx], np.nan)
+
+
+def _interval_ms(interval: str) -> int:
+    return int(pd.Timedelta(interval).total_seconds() * 1000)
+
+
+def _times_ms(values: list[datetime]) -> np.ndarray:
+    return pd.to_datetime(pd.Series(values, dtype=object), utc=True).dt.as_unit("ms").astype("int64").to_numpy()
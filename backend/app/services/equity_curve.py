@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from app.db.models import BybitTradeLog
+from app.schemas.ledger import Cashflow, Fill
+from app.services.ledger_columns import LedgerColumns
+
+
+PNL_CASHFLOW_TYPES = ("realized_pnl", "rebate", "funding")
+
+
+@dataclass
+class EquityCurve:
+    times_ms: np.ndarray
+    equity: np.ndarray
+
+    @classmethod
+    def from_pnl(cls, times_ms: np.ndarray, pnl: np.ndarray, start: float = 0.0) -> "EquityCurve":
+        times_ms = np.asarray(times_ms, dtype=np.int64)
+        pnl = np.asarray(pnl, dtype=float)
+        order = np.argsort(times_ms, kind="stable")
+        times_ms = times_ms[order]
+        equity = start + np.cumsum(pnl[order])
+        if times_ms.size:
+            # The starting balance is the first peak, so an opening loss
+            # already counts as drawdown.
+            times_ms = np.concatenate(([times_ms[0]], times_ms))
+            equity = np.concatenate(([start], equity))
+        return cls(times_ms=times_ms, equity=equity)
+
+    @classmethod
+    def from_levels(cls, times_ms: np.ndarray, levels: np.ndarray) -> "EquityCurve":
+        times_ms = np.asarray(times_ms, dtype=np.int64)
+        levels = np.asarray(levels, dtype=float)
+        known = np.isfinite(levels)
+        order = np.argsort(times_ms[known], kind="stable")
+        return cls(times_ms=times_ms[known][order], equity=levels[known][order])
+
+    def drawdown_stats(self) -> dict:
+        n = self.equity.size
+        if n == 0:
+            return {
+                "points": 0,
+                "max_drawdown": 0.0,
+                "max_drawdown_pct": None,
+                "peak_time": None,
+                "trough_time": None,
+                "recovery_time": None,
+                "drawdown_seconds": 0,
+                "recovery_seconds": None,
+                "underwater_seconds": 0,
+                "underwater_ratio": 0.0,
+                "longest_underwater_seconds": 0,
+            }
+        times = self.times_ms
+        peaks = np.maximum.accumulate(self.equity)
+        drawdown = peaks - self.equity
+        at_peak = drawdown <= 0
+        positions = np.arange(n)
+        last_peak = np.maximum.accumulate(np.where(at_peak, positions, 0))
+
+        trough = int(np.argmax(drawdown))
+        max_dd = float(drawdown[trough])
+        peak = int(last_peak[trough])
+        peak_positions = np.flatnonzero(at_peak)
+        later = peak_positions[peak_positions > trough]
+        recovery = int(later[0]) if max_dd > 0 and later.size else None
+
+        # Underwater spells run from one peak to the next; a trailing spell
+        # that never recovers is measured to the last point.
+        next_peak = np.concatenate((peak_positions[1:], [n]))
+        spell_end = np.minimum(next_peak, n - 1)
+        spell_lengths = np.where(next_peak - peak_positions > 1, times[spell_end] - times[peak_positions], 0)
+        underwater = int(spell_lengths.sum())
+        span = int(times[-1] - times[0])
+
+        peak_value = float(peaks[trough])
+        return {
+            "points": int(n),
+            "max_drawdown": max_dd,
+            "max_drawdown_pct": max_dd / peak_value if peak_value > 0 else None,
+            "peak_time": _iso(times[peak]) if max_dd > 0 else None,
+            "trough_time": _iso(times[trough]) if max_dd > 0 else None,
+            "recovery_time": _iso(times[recovery]) if recovery is not None else None,
+            "drawdown_seconds": int((times[trough] - times[peak]) // 1000),
+            "recovery_seconds": int((times[recovery] - times[trough]) // 1000) if recovery is not None else None,
+            "underwater_seconds": underwater // 1000,
+            "underwater_ratio": underwater / span if span > 0 else 0.0,
+            "longest_underwater_seconds": int(spell_lengths.max() // 1000),
+        }
+
+
+def equity_curve_from_trade_logs(trade_logs: list[BybitTradeLog]) -> EquityCurve:
+    return TradeLogCurves().add(trade_logs).trade_curve()
+
+
+def wallet_curve_from_trade_logs(trade_logs: list[BybitTradeLog]) -> EquityCurve | None:
+    return TradeLogCurves().add(trade_logs).wallet_curve()
+
+
+class TradeLogCurves:
+    # Keeps only the numeric columns the curves need, chunk by chunk, so
+    # streamed trade logs never have to be held as row objects. Every trade,
+    # settlement and balance row is still one curve point, so memory grows
+    # with the range rather than the chunk size.
+    def __init__(self) -> None:
+        self._trades: list[tuple] = []
+        self._balances: list[tuple] = []
+
+    def add(self, rows) -> "TradeLogCurves":
+        rows = list(rows)
+        if not rows:
+            return self
+        types = pd.Series([row.type_norm for row in rows], dtype=object)
+        actions = pd.Series([row.action_norm for row in rows], dtype=object)
+        is_trade = types.str.contains("TRADE", regex=False).to_numpy()
+        is_close = is_trade & actions.str.contains("CLOSE", regex=False).to_numpy()
+        is_settlement = types.str.contains("SETTLEMENT", regex=False).to_numpy()
+        times_ms = _times_ms([row.ts_utc for row in rows])
+
+        keep = is_trade | is_settlement
+        self._trades.append(
+            (
+                times_ms[keep],
+                is_trade[keep],
+                is_close[keep],
+                is_settlement[keep],
+                _numeric([row.change_num for row in rows])[keep],
+                np.abs(_numeric([row.fee_paid_num for row in rows]))[keep],
+                _numeric([row.funding_num for row in rows])[keep],
+            )
+        )
+        balances = _numeric([row.wallet_balance_num for row in rows], fill=np.nan)
+        known = np.isfinite(balances)
+        self._balances.append((times_ms[known], balances[known]))
+        return self
+
+    def trade_curve(self) -> EquityCurve:
+        if not self._trades:
+            return EquityCurve.from_pnl(np.empty(0, dtype=np.int64), np.empty(0))
+        times_ms, is_trade, is_close, is_settlement, change, fee_paid, funding = (
+            np.concatenate(column) for column in zip(*self._trades)
+        )
+        counted = is_close if is_close.any() else is_trade
+        pnl = np.where(counted, change - fee_paid, 0.0) + np.where(is_settlement, funding, 0.0)
+        keep = counted | is_settlement
+        return EquityCurve.from_pnl(times_ms[keep], pnl[keep])
+
+    def wallet_curve(self) -> EquityCurve | None:
+        if not self._balances:
+            return None
+        times_ms, balances = (np.concatenate(column) for column in zip(*self._balances))
+        if not balances.size:
+            return None
+        return EquityCurve.from_levels(times_ms, balances)
+
+
+def equity_curve_from_ledger(fills: list[Fill], cashflows: list[Cashflow]) -> EquityCurve:
+    return _ledger_curve(
+        np.array([cf.type for cf in cashflows], dtype=object),
+        np.array([float(cf.amount) for cf in cashflows], dtype=float),
+        _times_ms([cf.ts_utc for cf in cashflows]) if cashflows else np.empty(0, dtype=np.int64),
+        np.array([float(fill.fee) for fill in fills], dtype=float),
+        _times_ms([fill.ts_utc for fill in fills]) if fills else np.empty(0, dtype=np.int64),
+    )
+
+
+def equity_curve_from_columns(columns: LedgerColumns) -> EquityCurve:
+    return _ledger_curve(
+        columns.cash_type,
+        columns.cash_amount,
+        columns.cash_times_ms(),
+        columns.fill_fee,
+        columns.fill_times_ms(),
+    )
+
+
+def _ledger_curve(
+    cash_types: np.ndarray,
+    cash_amount: np.ndarray,
+    cash_times: np.ndarray,
+    fill_fees: np.ndarray,
+    fill_times: np.ndarray,
+) -> EquityCurve:
+    has_commission = bool((cash_types == "commission").any())
+    cash_pnl = np.select(
+        [np.isin(cash_types, PNL_CASHFLOW_TYPES), np.isin(cash_types, ("commission", "borrow_interest"))],
+        [cash_amount, -np.abs(cash_amount)],
+        default=0.0,
+    )
+    times = [cash_times]
+    pnl = [cash_pnl]
+    if not has_commission and fill_fees.size:
+        times.append(fill_times)
+        pnl.append(-np.abs(fill_fees))
+    return EquityCurve.from_pnl(np.concatenate(times), np.concatenate(pnl))
+
+
+def _numeric(values: list, fill: float = 0.0) -> np.ndarray:
+    return np.array([fill if value is None else float(value) for value in values], dtype=float)
+
+
+def _times_ms(values: list[datetime]) -> np.ndarray:
+    return pd.to_datetime(pd.Series(values, dtype=object), utc=True).dt.as_unit("ms").astype("int64").to_numpy()
+
+
+def _iso(ms: int) -> str:
+    return datetime.fromtimestamp(int(ms) / 1000, tz=timezone.utc).isoformat()
@@ -2,17 +2,20 @@ from __future__ import annotations
 
 import json
 from collections import Counter
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Iterable
 
+import numpy as np
 import pandas as pd
 from sqlalchemy.orm import Session
 
-from app.attribution.joiner import build_trade_attribution_table
+from app.attribution.joiner import build_trade_attribution_table, build_trade_attribution_tables
 from app.connectors.binance_um import BinanceUMClient
-from app.services.attribution_report import _build_bybit_df_from_db
+from app.core.config import settings
+from app.services.attribution_report import _build_bybit_df_from_db, _build_bybit_dfs_from_db
+from app.services.evidence_engine import EvidenceEngine
+from app.services.trade_anomalies import detect_trade_anomalies
 from app.storage.cache import MarketDataCache
 from app.storage.market_store import MarketDataStore
 
@@ -26,6 +29,7 @@ class FactsEvidenceResult:
     facts_path: str
     evidence_path: str
     evidence_json: dict
+    trade_anomalies: list[dict] = field(default_factory=list)
 
 
 def build_facts_and_evidence(
@@ -64,6 +68,76 @@ def build_facts_and_evidence(
         fetch_market=fetch_market,
     )
 
+    return _write_facts_and_evidence(
+        facts,
+        start=start,
+        end=end,
+        preset=preset,
+        realized_present=realized_present,
+        output_dir=output_dir,
+        report_id=report_id,
+        anomalies=anomalies,
+        include_market=include_market,
+    )
+
+
+def build_facts_and_evidence_many(
+    db: Session,
+    account_ids: list[str],
+    exchange_id: str | None,
+    ranges: list[tuple[datetime, datetime]],
+    presets: list[str | None],
+    report_ids: list[str],
+    anomalies: list[list[dict]],
+    cache_dir: Path | None = None,
+    output_dir: Path | None = None,
+    fetch_market: bool = True,
+    include_market: bool = True,
+    account_groups: list[list[str]] | None = None,
+) -> list[FactsEvidenceResult]:
+    if any(not start or not end for start, end in ranges):
+        raise RuntimeError("start/end required for evidence generation")
+
+    frames = _build_bybit_dfs_from_db(db, account_ids, exchange_id, ranges, [], account_groups)
+    symbols = [sorted(set(bybit_df["symbol"].dropna().astype(str))) for bybit_df, _ in frames]
+    tables = build_trade_attribution_tables(
+        bybit_dfs=[bybit_df for bybit_df, _ in frames],
+        client=BinanceUMClient(),
+        cache=MarketDataCache(cache_dir or Path("outputs/market_cache")),
+        ranges_ms=[(int(start.timestamp() * 1000), int(end.timestamp() * 1000)) for start, end in ranges],
+        symbols=symbols,
+        market_store=MarketDataStore(db),
+        fetch_market=fetch_market,
+    )
+    return [
+        _write_facts_and_evidence(
+            facts,
+            start=start,
+            end=end,
+            preset=preset,
+            realized_present=realized_present,
+            output_dir=output_dir,
+            report_id=report_id,
+            anomalies=report_anomalies,
+            include_market=include_market,
+        )
+        for facts, (_, realized_present), (start, end), preset, report_id, report_anomalies in zip(
+            tables, frames, ranges, presets, report_ids, anomalies
+        )
+    ]
+
+
+def _write_facts_and_evidence(
+    facts: pd.DataFrame,
+    start: datetime,
+    end: datetime,
+    preset: str | None,
+    realized_present: bool,
+    output_dir: Path | None,
+    report_id: str | None,
+    anomalies: list[dict] | None,
+    include_market: bool,
+) -> FactsEvidenceResult:
     facts = _add_market_state(facts)
     facts = _normalize_facts(facts)
 
@@ -73,13 +147,14 @@ def build_facts_and_evidence(
     facts_path = output_root / f"facts_{tag}.parquet"
     facts.to_parquet(facts_path, index=False)
 
+    trade_anomalies = detect_trade_anomalies(facts)
     evidence = build_evidence_from_facts(
         facts,
         start=start,
         end=end,
         preset=preset,
         realized_present=realized_present,
-        anomalies=anomalies or [],
+        anomalies=(anomalies or []) + trade_anomalies,
         include_market=include_market,
     )
     evidence_path = output_root / f"evidence_{tag}.json"
@@ -89,6 +164,7 @@ def build_facts_and_evidence(
         facts_path=str(facts_path),
         evidence_path=str(evidence_path),
         evidence_json=evidence,
+        trade_anomalies=trade_anomalies,
     )
 
 
@@ -100,6 +176,7 @@ def build_evidence_from_facts(
     realized_present: bool,
     anomalies: list[dict],
     include_market: bool,
+    bootstrap_resamples: int | None = None,
 ) -> dict:
     facts = facts.copy()
     trades = int(len(facts))
@@ -116,8 +193,11 @@ def build_evidence_from_facts(
             "oi_quadrant": _ratio_map(facts, "oi_quadrant"),
             "market_state": _ratio_map(facts, "market_state"),
         }
-        perf = _performance_by_regime(facts)
+        engine = EvidenceEngine.from_facts(facts)
+        resamples = bootstrap_resamples if bootstrap_resamples is not None else settings.EVIDENCE_BOOTSTRAP_RESAMPLES
+        perf = engine.performance_by_regime(bootstrap_resamples=max(0, int(resamples)))
     else:
+        engine = None
         market_regime_stats = {}
         perf = {"top": [], "bottom": []}
     behavior_flags = {
@@ -133,8 +213,10 @@ def build_evidence_from_facts(
         },
     }
 
+    trade_excursion = _trade_excursion_summary(facts) if include_market else {}
+    execution_slippage = _slippage_summary(facts) if include_market else {}
     anomalies_summary = _anomaly_counts(anomalies)
-    counterfactual = _counterfactual_stats(facts) if include_market else {}
+    counterfactual = engine.counterfactual_stats() if engine is not None else {}
     market_state_machine = _market_state_machine_summary(facts) if include_market else {
         "version": MARKET_STATE_MACHINE_VERSION,
         "constraints_by_state": {},
@@ -166,6 +248,8 @@ def build_evidence_from_facts(
         "market_regime_stats": market_regime_stats,
         "performance_by_regime": perf,
         "behavior_flags": behavior_flags,
+        "trade_excursion": trade_excursion,
+        "execution_slippage": execution_slippage,
         "anomalies": anomalies_summary,
         "counterfactual": counterfactual,
         "market_state_machine": market_state_machine,
@@ -173,83 +257,64 @@ def build_evidence_from_facts(
     }
 
 
-def _performance_by_regime(facts: pd.DataFrame) -> dict:
-    if facts.empty:
-        return {"top": [], "bottom": []}
-    grouped = facts.groupby("market_state").agg(
-        expectancy_net=("pnl_net", "mean"),
-        win_rate_net=("pnl_net", lambda x: float((x > 0).mean())),
-        pf_net=("pnl_net", _profit_factor),
-        tail_loss=("pnl_net", lambda x: float(x.quantile(0.05))),
-        fee_bps=("fee_bps", "mean"),
-        trades=("pnl_net", "count"),
-    )
-    ranked = grouped.sort_values("expectancy_net", ascending=False)
-    top = _rows_from_group(ranked.head(3))
-    bottom = _rows_from_group(ranked.tail(3).sort_values("expectancy_net"))
-    return {"top": top, "bottom": bottom}
-
-
-def _rows_from_group(df: pd.DataFrame) -> list[dict]:
-    output = []
-    for idx, row in df.iterrows():
-        output.append(
-            {
-                "market_state": idx,
-                "expectancy_net": float(row["expectancy_net"]),
-                "win_rate_net": float(row["win_rate_net"]),
-                "pf_net": float(row["pf_net"]),
-                "tail_loss": float(row["tail_loss"]),
-                "fee_bps": float(row["fee_bps"]),
-                "trades": int(row["trades"]),
-            }
-        )
-    return output
+def _ratio_map(facts: pd.DataFrame, col: str) -> dict:
+    if col not in facts.columns or facts.empty:
+        return {}
+    ratios = facts[col].value_counts(normalize=True)
+    return {str(key): float(value) for key, value in ratios.items()}
 
 
-def _counterfactual_stats(facts: pd.DataFrame) -> dict:
-    if facts.empty:
-        return {
-            "net_change_all": 0.0,
-            "net_change_exclude_bottom": 0.0,
-            "net_change_only_top": 0.0,
-            "mdd_all": 0.0,
-            "mdd_exclude_bottom": 0.0,
-            "mdd_only_top": 0.0,
-        }
-    perf = _performance_by_regime(facts)
-    top_states = {row["market_state"] for row in perf["top"]}
-    bottom_states = {row["market_state"] for row in perf["bottom"]}
-    net_all = float(facts["pnl_net"].sum())
-    net_exclude_bottom = float(facts[~facts["market_state"].isin(bottom_states)]["pnl_net"].sum())
-    net_only_top = float(facts[facts["market_state"].isin(top_states)]["pnl_net"].sum())
-    mdd_all = _max_drawdown(facts)
-    mdd_exclude_bottom = _max_drawdown(facts[~facts["market_state"].isin(bottom_states)])
-    mdd_only_top = _max_drawdown(facts[facts["market_state"].isin(top_states)])
+def _trade_excursion_summary(facts: pd.DataFrame) -> dict:
+    if "mae_bps" not in facts.columns or facts.empty:
+        return {}
+    mae = facts["mae_bps"].to_numpy(dtype=float)
+    mfe = facts["mfe_bps"].to_numpy(dtype=float)
+    known = np.isfinite(mae) & np.isfinite(mfe)
+    if not known.any():
+        return {"coverage": 0.0}
+    mae = mae[known]
+    mfe = mfe[known]
+    mae_mean = float(mae.mean())
     return {
-        "net_change_all": net_all,
-        "net_change_exclude_bottom": net_exclude_bottom,
-        "net_change_only_top": net_only_top,
-        "mdd_all": mdd_all,
-        "mdd_exclude_bottom": mdd_exclude_bottom,
-        "mdd_only_top": mdd_only_top,
+        "coverage": float(known.mean()),
+        "mae_bps_median": float(np.median(mae)),
+        "mae_bps_p90": float(np.quantile(mae, 0.9)),
+        "mfe_bps_median": float(np.median(mfe)),
+        "mfe_bps_p90": float(np.quantile(mfe, 0.9)),
+        "edge_ratio": float(mfe.mean() / mae_mean) if mae_mean > 0 else 0.0,
     }
 
 
-def _ratio_map(facts: pd.DataFrame, col: str) -> dict:
-    if col not in facts.columns or facts.empty:
+def _slippage_summary(facts: pd.DataFrame) -> dict:
+    if "slippage_bps" not in facts.columns or facts.empty:
         return {}
-    ratios = facts[col].value_counts(normalize=True)
-    return {str(key): float(value) for key, value in ratios.items()}
+    known = facts[np.isfinite(facts["slippage_bps"].to_numpy(dtype=float))]
+    basis = {
+        "sign": "positive_bps_is_cost",
+        "measured_fills": "closes_only",
+        "mark": "minute_mark_bar_midpoint",
+    }
+    if known.empty:
+        return {**basis, "coverage": 0.0}
+    slippage = known["slippage_bps"].to_numpy(dtype=float)
+    return {
+        **basis,
+        "coverage": float(len(known) / len(facts)),
+        "mean_bps": float(slippage.mean()),
+        "median_bps": float(np.median(slippage)),
+        "by_symbol": _slippage_groups(known, "symbol"),
+        "by_market_state": _slippage_groups(known, "market_state"),
+    }
 
 
-def _profit_factor(series: Iterable[float]) -> float:
-    series = pd.Series(series)
-    gains = series[series > 0].sum()
-    losses = -series[series < 0].sum()
-    if losses == 0:
-        return float("inf") if gains > 0 else 0.0
-    return float(gains / losses)
+def _slippage_groups(known: pd.DataFrame, col: str) -> dict:
+    if col not in known.columns:
+        return {}
+    grouped = known.groupby(col, sort=True)["slippage_bps"].agg(["mean", "count"])
+    return {
+        str(key): {"mean_bps": float(row["mean"]), "trades": int(row["count"])}
+        for key, row in grouped.iterrows()
+    }
 
 
 def _anomaly_counts(anomalies: list[dict]) -> dict:
@@ -264,22 +329,35 @@ def _add_market_state(facts: pd.DataFrame) -> pd.DataFrame:
     if facts.empty:
         return facts
     def _get(col, default="na"):
-        return facts[col] if col in facts.columns else default
-    facts["market_state"] = (
-        _get("trend_bucket", "na").astype(str)
-        + "|"
-        + _get("vol_bucket", "na").astype(str)
-        + "|"
-        + _get("oi_quadrant", "na").astype(str)
+        return facts[col].astype(str) if col in facts.columns else pd.Series(default, index=facts.index)
+    facts["market_state"] = _get("trend_bucket") + "|" + _get("vol_bucket") + "|" + _get("oi_quadrant")
+    codes, table = _market_state_table(facts)
+    facts["state_constraints"] = pd.Categorical.from_codes(
+        table["constraints_code"].to_numpy()[codes],
+        categories=pd.unique(table["constraints_json"]),
     )
-    constraints = facts.apply(_market_state_constraints, axis=1)
-    facts["state_constraints"] = [
-        json.dumps(item, ensure_ascii=True, separators=(",", ":")) for item in constraints
-    ]
     facts["state_machine_version"] = MARKET_STATE_MACHINE_VERSION
     return facts
 
 
+def _market_state_table(facts: pd.DataFrame) -> tuple[np.ndarray, pd.DataFrame]:
+    codes, states = pd.factorize(facts["market_state"])
+    rows = []
+    for state in states:
+        trend_bucket, vol_bucket, oi_quadrant = (str(state).split("|") + ["na", "na", "na"])[:3]
+        constraints = _market_state_constraints(trend_bucket, vol_bucket, oi_quadrant)
+        rows.append(
+            {
+                "market_state": state,
+                "constraints": constraints,
+                "constraints_json": json.dumps(constraints, ensure_ascii=True, separators=(",", ":")),
+            }
+        )
+    table = pd.DataFrame(rows, columns=["market_state", "constraints", "constraints_json"])
+    table["constraints_code"] = pd.factorize(table["constraints_json"])[0]
+    return codes, table
+
+
 def _normalize_facts(facts: pd.DataFrame) -> pd.DataFrame:
     if facts.empty:
         return facts
@@ -292,19 +370,12 @@ def _normalize_facts(facts: pd.DataFrame) -> pd.DataFrame:
 def _market_state_machine_summary(facts: pd.DataFrame) -> dict:
     if facts.empty:
         return {"version": MARKET_STATE_MACHINE_VERSION, "constraints_by_state": {}}
-    unique = facts.drop_duplicates("market_state")
-    constraints_by_state = {}
-    for _, row in unique.iterrows():
-        state = row["market_state"]
-        constraints_by_state[state] = _market_state_constraints(row)
+    _, table = _market_state_table(facts)
+    constraints_by_state = dict(zip(table["market_state"], table["constraints"]))
     return {"version": MARKET_STATE_MACHINE_VERSION, "constraints_by_state": constraints_by_state}
 
 
-def _market_state_constraints(row: pd.Series) -> dict:
-    trend_bucket = str(row.get("trend_bucket", "na"))
-    vol_bucket = str(row.get("vol_bucket", "na"))
-    oi_quadrant = str(row.get("oi_quadrant", "na"))
-
+def _market_state_constraints(trend_bucket: str, vol_bucket: str, oi_quadrant: str) -> dict:
     if vol_bucket == "high":
         max_leverage = 1
         max_trades_2h = 3
@@ -342,13 +413,3 @@ def _market_state_constraints(row: pd.Series) -> dict:
         "max_position_adds": max_position_adds,
         "allow_aggressive_taker": allow_aggressive_taker,
     }
-
-
-def _max_drawdown(facts: pd.DataFrame) -> float:
-    if facts.empty:
-        return 0.0
-    pnl = facts.sort_values("close_time")["pnl_net"].fillna(0)
-    equity = pnl.cumsum()
-    peak = equity.cummax()
-    drawdown = equity - peak
-    return float(abs(drawdown.min()))
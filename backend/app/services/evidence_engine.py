@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+
+TAIL_QUANTILE = 0.05
+BOOTSTRAP_CONFIDENCE = 0.95
+BOOTSTRAP_SEED = 0
+BOOTSTRAP_CHUNK_ELEMENTS = 4_000_000
+SCENARIO_CHUNK_ELEMENTS = 4_000_000
+TRADE_CAP_WINDOW_MS = 2 * 60 * 60 * 1000
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    exclude_states: frozenset[str] = field(default_factory=frozenset)
+    only_states: frozenset[str] | None = None
+    exclude_symbols: frozenset[str] = field(default_factory=frozenset)
+    max_trades_2h: int | None = None
+    maker_fee_bps: float | None = None
+    taker_fee_bps: float | None = None
+    drop_after_big_loss: bool = False
+
+
+@dataclass
+class EvidenceEngine:
+    close_time: np.ndarray
+    pnl: np.ndarray
+    fee_bps: np.ndarray
+    state_codes: np.ndarray
+    states: np.ndarray
+    symbol_codes: np.ndarray
+    symbols: np.ndarray
+    fee: np.ndarray
+    turnover: np.ndarray
+    taker: np.ndarray
+    after_big_loss: np.ndarray
+
+    @classmethod
+    def from_facts(cls, facts: pd.DataFrame) -> "EvidenceEngine":
+        if facts.empty:
+            return cls(
+                close_time=np.empty(0, dtype=np.int64),
+                pnl=np.empty(0),
+                fee_bps=np.empty(0),
+                state_codes=np.empty(0, dtype=np.int64),
+                states=np.empty(0, dtype=object),
+                symbol_codes=np.empty(0, dtype=np.int64),
+                symbols=np.empty(0, dtype=object),
+                fee=np.empty(0),
+                turnover=np.empty(0),
+                taker=np.empty(0, dtype=bool),
+                after_big_loss=np.empty(0, dtype=bool),
+            )
+        order = np.argsort(facts["close_time"].to_numpy(), kind="stable")
+        state_col = facts["market_state"] if "market_state" in facts.columns else pd.Series("na", index=facts.index)
+        codes, states = pd.factorize(state_col, sort=True)
+        fee_bps = facts["fee_bps"] if "fee_bps" in facts.columns else pd.Series(np.nan, index=facts.index)
+        symbol_codes, symbols = pd.factorize(_column(facts, "symbol", ""), sort=True)
+        fee = pd.to_numeric(_column(facts, "fee", 0.0), errors="coerce").fillna(0).abs()
+        turnover = pd.to_numeric(_column(facts, "turnover", 0.0), errors="coerce").fillna(0)
+        taker = _column(facts, "taker_proxy", None)
+        taker = fee > 0 if taker.isna().all() else pd.to_numeric(taker, errors="coerce").fillna(0) > 0
+        after_big_loss = pd.to_numeric(_column(facts, "after_big_loss_flag", 0), errors="coerce").fillna(0) > 0
+        return cls(
+            close_time=facts["close_time"].to_numpy()[order],
+            pnl=facts["pnl_net"].fillna(0).to_numpy(dtype=float)[order],
+            fee_bps=fee_bps.to_numpy(dtype=float)[order],
+            state_codes=codes[order].astype(np.int64),
+            states=np.asarray(states, dtype=object),
+            symbol_codes=symbol_codes[order].astype(np.int64),
+            symbols=np.asarray(symbols, dtype=object),
+            fee=fee.to_numpy(dtype=float)[order],
+            turnover=turnover.to_numpy(dtype=float)[order],
+            taker=taker.to_numpy(dtype=bool)[order],
+            after_big_loss=after_big_loss.to_numpy(dtype=bool)[order],
+        )
+
+    @property
+    def trades(self) -> int:
+        return int(self.pnl.size)
+
+    @cached_property
+    def state_stats(self) -> pd.DataFrame:
+        n_states = len(self.states)
+        valid = self.state_codes >= 0
+        codes = self.state_codes[valid]
+        pnl = self.pnl[valid]
+        fee_bps = self.fee_bps[valid]
+
+        counts = np.bincount(codes, minlength=n_states).astype(float)
+        pnl_sum = np.bincount(codes, weights=pnl, minlength=n_states)
+        wins = np.bincount(codes, weights=(pnl > 0).astype(float), minlength=n_states)
+        gains = np.bincount(codes, weights=np.where(pnl > 0, pnl, 0.0), minlength=n_states)
+        losses = -np.bincount(codes, weights=np.where(pnl < 0, pnl, 0.0), minlength=n_states)
+        fee_known = np.isfinite(fee_bps)
+        fee_sum = np.bincount(codes, weights=np.where(fee_known, fee_bps, 0.0), minlength=n_states)
+        fee_count = np.bincount(codes, weights=fee_known.astype(float), minlength=n_states)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            expectancy = pnl_sum / counts
+            win_rate = wins / counts
+            fee_mean = np.where(fee_count > 0, fee_sum / fee_count, np.nan)
+            pf = np.where(losses > 0, gains / losses, np.where(gains > 0, np.inf, 0.0))
+
+        return pd.DataFrame(
+            {
+                "expectancy_net": expectancy,
+                "win_rate_net": win_rate,
+                "pf_net": pf,
+                "tail_loss": _grouped_quantile(codes, pnl, n_states, TAIL_QUANTILE),
+                "fee_bps": fee_mean,
+                "trades": counts.astype(np.int64),
+            },
+            index=pd.Index(self.states, name="market_state"),
+        )
+
+    def performance_by_regime(self, bootstrap_resamples: int = 0) -> dict:
+        if self.trades == 0:
+            return {"top": [], "bottom": []}
+        ranked = self.state_stats.sort_values("expectancy_net", ascending=False)
+        ci = self.bootstrap_state_ci(bootstrap_resamples) if bootstrap_resamples > 0 else None
+        top = _rows_from_group(ranked.head(3), ci)
+        bottom = _rows_from_group(ranked.tail(3).sort_values("expectancy_net"), ci)
+        return {"top": top, "bottom": bottom}
+
+    def bootstrap_state_ci(
+        self,
+        resamples: int,
+        confidence: float = BOOTSTRAP_CONFIDENCE,
+        seed: int = BOOTSTRAP_SEED,
+        chunk_elements: int = BOOTSTRAP_CHUNK_ELEMENTS,
+    ) -> pd.DataFrame:
+        # Resample every state at once: each row of the index matrix is one
+        # bootstrap draw over all trades, drawn within each trade's own state.
+        valid = self.state_codes >= 0
+        codes = self.state_codes[valid]
+        order = np.argsort(codes, kind="stable")
+        grouped_pnl = self.pnl[valid][order]
+        counts = np.bincount(codes, minlength=len(self.states))
+        present = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        slot_start = np.repeat(starts, counts)
+        slot_count = np.repeat(counts, counts)
+        slot_last = slot_start + slot_count - 1
+        grouped_gains = np.where(grouped_pnl > 0, grouped_pnl, 0.0)
+        grouped_wins = (grouped_pnl > 0).astype(float)
+        bounds_idx = starts[present]
+        n_present = counts[present]
+
+        rng = np.random.default_rng(seed)
+        chunk = max(1, chunk_elements // max(grouped_pnl.size, 1))
+        expectancy, win_rate, pf = [], [], []
+        for done in range(0, resamples, chunk):
+            size = min(chunk, resamples - done)
+            draws = rng.random((size, grouped_pnl.size), dtype=np.float32) * slot_count.astype(np.float32)
+            idx = np.minimum(slot_start + draws.astype(np.int64), slot_last)
+            pnl_sum = np.add.reduceat(grouped_pnl[idx], bounds_idx, axis=1)
+            wins = np.add.reduceat(grouped_wins[idx], bounds_idx, axis=1)
+            gains = np.add.reduceat(grouped_gains[idx], bounds_idx, axis=1)
+            losses = gains - pnl_sum
+            with np.errstate(divide="ignore", invalid="ignore"):
+                expectancy.append(pnl_sum / n_present)
+                win_rate.append(wins / n_present)
+                pf.append(np.where(losses > 0, gains / losses, np.where(gains > 0, np.inf, 0.0)))
+
+        tail = (1 - confidence) / 2
+        bounds = [tail, 1 - tail]
+        out = pd.DataFrame(index=pd.Index(self.states, name="market_state"))
+        for name, values in (("expectancy_net", expectancy), ("win_rate_net", win_rate), ("pf_net", pf)):
+            low_high = np.full((len(self.states), 2), np.nan)
+            if values:
+                low_high[present] = np.quantile(np.vstack(values), bounds, axis=0).T
+            out[f"{name}_lo"] = low_high[:, 0]
+            out[f"{name}_hi"] = low_high[:, 1]
+        out.attrs["confidence"] = confidence
+        out.attrs["resamples"] = resamples
+        return out
+
+    def state_mask(self, states: set[str] | list[str] | frozenset[str]) -> np.ndarray:
+        wanted = np.isin(self.states, list(states))
+        return wanted[self.state_codes] & (self.state_codes >= 0)
+
+    def symbol_mask(self, symbols: set[str] | list[str] | frozenset[str]) -> np.ndarray:
+        wanted = np.isin(self.symbols, list(symbols))
+        return wanted[self.symbol_codes] & (self.symbol_codes >= 0)
+
+    def scenario_mask(self, scenario: Scenario) -> np.ndarray:
+        keep = np.ones(self.trades, dtype=bool)
+        if scenario.only_states is not None:
+            keep &= self.state_mask(scenario.only_states)
+        if scenario.exclude_states:
+            keep &= ~self.state_mask(scenario.exclude_states)
+        if scenario.exclude_symbols:
+            keep &= ~self.symbol_mask(scenario.exclude_symbols)
+        if scenario.drop_after_big_loss:
+            keep &= ~self.after_big_loss
+        return keep
+
+    def scenario_pnl(self, scenario: Scenario) -> np.ndarray:
+        if scenario.maker_fee_bps is None and scenario.taker_fee_bps is None:
+            return self.pnl
+        maker = self.turnover * scenario.maker_fee_bps / 1e4 if scenario.maker_fee_bps is not None else self.fee
+        taker = self.turnover * scenario.taker_fee_bps / 1e4 if scenario.taker_fee_bps is not None else self.fee
+        return self.pnl + self.fee - np.where(self.taker, taker, maker)
+
+    def evaluate_scenarios(self, scenarios: list[Scenario]) -> list[dict]:
+        n = self.trades
+        if not scenarios:
+            return []
+        if n == 0:
+            return [{"name": s.name, "net_change": 0.0, "max_drawdown": 0.0, "trades": 0} for s in scenarios]
+
+        # Trades are in close_time order, so each fixed 2h bucket is a
+        # contiguous run starting at bucket_first.
+        bucket = self.close_time.astype(np.int64) // TRADE_CAP_WINDOW_MS
+        bucket_first = np.searchsorted(bucket, bucket, side="left")
+
+        results = []
+        chunk = max(1, SCENARIO_CHUNK_ELEMENTS // n)
+        for begin in range(0, len(scenarios), chunk):
+            batch = scenarios[begin : begin + chunk]
+            keep = np.vstack([self.scenario_mask(scenario) for scenario in batch])
+            pnl = np.vstack([self.scenario_pnl(scenario) for scenario in batch])
+            caps = np.array(
+                [scenario.max_trades_2h if scenario.max_trades_2h is not None else n for scenario in batch],
+                dtype=np.int64,
+            )
+
+            # Rank of each kept trade inside its 2h bucket, counted among the
+            # trades the scenario still takes.
+            taken = np.cumsum(keep, axis=1)
+            before_bucket = np.where(bucket_first > 0, taken[:, bucket_first - 1], 0)
+            keep &= (taken - before_bucket) <= caps[:, None]
+
+            equity = np.cumsum(np.where(keep, pnl, 0.0), axis=1)
+            peaks = np.maximum.accumulate(np.where(keep, equity, -np.inf), axis=1)
+            drawdown = np.where(keep, peaks - equity, 0.0).max(axis=1)
+            for row, scenario in enumerate(batch):
+                results.append(
+                    {
+                        "name": scenario.name,
+                        "net_change": float(equity[row, -1]),
+                        "max_drawdown": float(abs(drawdown[row])),
+                        "trades": int(keep[row].sum()),
+                    }
+                )
+        return results
+
+    def counterfactual_stats(self) -> dict:
+        if self.trades == 0:
+            return {
+                "net_change_all": 0.0,
+                "net_change_exclude_bottom": 0.0,
+                "net_change_only_top": 0.0,
+                "mdd_all": 0.0,
+                "mdd_exclude_bottom": 0.0,
+                "mdd_only_top": 0.0,
+            }
+        perf = self.performance_by_regime()
+        all_trades, exclude_bottom, only_top = self.evaluate_scenarios(
+            [
+                Scenario(name="all"),
+                Scenario(name="exclude_bottom", exclude_states=frozenset(row["market_state"] for row in perf["bottom"])),
+                Scenario(name="only_top", only_states=frozenset(row["market_state"] for row in perf["top"])),
+            ]
+        )
+        return {
+            "net_change_all": all_trades["net_change"],
+            "net_change_exclude_bottom": exclude_bottom["net_change"],
+            "net_change_only_top": only_top["net_change"],
+            "mdd_all": all_trades["max_drawdown"],
+            "mdd_exclude_bottom": exclude_bottom["max_drawdown"],
+            "mdd_only_top": only_top["max_drawdown"],
+        }
+
+
+def _column(facts: pd.DataFrame, name: str, default) -> pd.Series:
+    if name in facts.columns:
+        return facts[name]
+    return pd.Series(default, index=facts.index)
+
+
+def _grouped_quantile(codes: np.ndarray, values: np.ndarray, n_groups: int, q: float) -> np.ndarray:
+    out = np.full(n_groups, np.nan)
+    if values.size == 0:
+        return out
+    order = np.lexsort((values, codes))
+    sorted_values = values[order]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    present = counts > 0
+    pos = q * (counts[present] - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, counts[present] - 1)
+    frac = pos - lo
+    low_values = sorted_values[starts[present] + lo]
+    high_values = sorted_values[starts[present] + hi]
+    out[present] = low_values + (high_values - low_values) * frac
+    return out
+
+
+def _rows_from_group(df: pd.DataFrame, ci: pd.DataFrame | None = None) -> list[dict]:
+    output = []
+    for idx, row in df.iterrows():
+        item = {
+            "market_state": idx,
+            "expectancy_net": float(row["expectancy_net"]),
+            "win_rate_net": float(row["win_rate_net"]),
+            "pf_net": float(row["pf_net"]),
+            "tail_loss": float(row["tail_loss"]),
+            "fee_bps": float(row["fee_bps"]),
+            "trades": int(row["trades"]),
+        }
+        if ci is not None:
+            bounds = ci.loc[idx]
+            item["ci"] = {
+                "confidence": float(ci.attrs["confidence"]),
+                "resamples": int(ci.attrs["resamples"]),
+                "expectancy_net": [float(bounds["expectancy_net_lo"]), float(bounds["expectancy_net_hi"])],
+                "win_rate_net": [float(bounds["win_rate_net_lo"]), float(bounds["win_rate_net_hi"])],
+                "pf_net": [float(bounds["pf_net_lo"]), float(bounds["pf_net_hi"])],
+            }
+        output.append(item)
+    return output
@@ -1,6 +1,6 @@
 import csv
 from datetime import datetime, timezone
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from io import StringIO
 from typing import Iterable
 
@@ -9,6 +9,7 @@ from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
 from app.db.models import BybitTradeLog, Cashflow, Fill
+from app.services.rollups import ROLLUP_SOURCE_LEDGER, ROLLUP_SOURCE_TRADE_LOGS, refresh_rollups_for_rows
 
 
 BYBIT_COLUMNS = [
@@ -93,32 +94,44 @@ def parse_bybit_transaction_log_rows(
 ) -> list[BybitTradeLog]:
     rows: list[BybitTradeLog] = []
     for row in _iter_bybit_rows(content):
-        rows.append(
-            BybitTradeLog(
-                account_id=account_id,
-                exchange_id=exchange_id,
-                account_type=account_type,
-                currency=(row.get("Currency") or "").strip(),
-                contract=(row.get("Contract") or "").strip(),
-                type=(row.get("Type") or "").strip(),
-                direction=(row.get("Direction") or "").strip(),
-                quantity=(row.get("Quantity") or "").strip(),
-                position=(row.get("Position") or "").strip(),
-                filled_price=(row.get("Filled Price") or "").strip(),
-                funding=(row.get("Funding") or "").strip(),
-                fee_paid=(row.get("Fee Paid") or "").strip(),
-                cash_flow=(row.get("Cash Flow") or "").strip(),
-                change=(row.get("Change") or "").strip(),
-                wallet_balance=(row.get("Wallet Balance") or "").strip(),
-                action=(row.get("Action") or "").strip(),
-                order_id=(row.get("OrderId") or "").strip(),
-                trade_id=(row.get("TradeId") or "").strip(),
-                ts_utc=_parse_time(row.get("Time")),
-            )
+        log = BybitTradeLog(
+            account_id=account_id,
+            exchange_id=exchange_id,
+            account_type=account_type,
+            currency=(row.get("Currency") or "").strip(),
+            contract=(row.get("Contract") or "").strip(),
+            type=(row.get("Type") or "").strip(),
+            direction=(row.get("Direction") or "").strip(),
+            quantity=(row.get("Quantity") or "").strip(),
+            position=(row.get("Position") or "").strip(),
+            filled_price=(row.get("Filled Price") or "").strip(),
+            funding=(row.get("Funding") or "").strip(),
+            fee_paid=(row.get("Fee Paid") or "").strip(),
+            cash_flow=(row.get("Cash Flow") or "").strip(),
+            change=(row.get("Change") or "").strip(),
+            wallet_balance=(row.get("Wallet Balance") or "").strip(),
+            action=(row.get("Action") or "").strip(),
+            order_id=(row.get("OrderId") or "").strip(),
+            trade_id=(row.get("TradeId") or "").strip(),
+            ts_utc=_parse_time(row.get("Time")),
         )
+        rows.append(_with_typed_log_fields(log))
     return rows
 
 
+def _with_typed_log_fields(log: BybitTradeLog) -> BybitTradeLog:
+    # Parsed once here so reports read typed columns instead of the raw CSV text.
+    log.type_norm = log.type.upper()
+    log.action_norm = log.action.upper()
+    log.quantity_num = _log_number(log.quantity)
+    log.filled_price_num = _log_number(log.filled_price)
+    log.funding_num = _log_number(log.funding)
+    log.fee_paid_num = _log_number(log.fee_paid)
+    log.change_num = _log_number(log.change)
+    log.wallet_balance_num = _log_number(log.wallet_balance)
+    return log
+
+
 def _iter_bybit_rows(content: str) -> Iterable[dict]:
     reader = csv.DictReader(StringIO(content))
     if reader.fieldnames and "Type" in reader.fieldnames:
@@ -139,6 +152,7 @@ def upsert_imported_data(db: Session, fills: Iterable[Fill], cashflows: Iterable
     cash_rows = [_cash_row(cf) for cf in cashflows]
     inserted_fills = _insert_ignore(db, Fill, fill_rows)
     inserted_cashflows = _insert_ignore(db, Cashflow, cash_rows)
+    refresh_rollups_for_rows(db, ROLLUP_SOURCE_LEDGER, fill_rows + cash_rows)
     db.commit()
     return {"fills": inserted_fills, "cashflows": inserted_cashflows}
 
@@ -146,6 +160,7 @@ def upsert_imported_data(db: Session, fills: Iterable[Fill], cashflows: Iterable
 def upsert_bybit_trade_logs(db: Session, rows: Iterable[BybitTradeLog]) -> int:
     log_rows = [_bybit_log_row(row) for row in rows]
     inserted = _insert_ignore(db, BybitTradeLog, log_rows)
+    refresh_rollups_for_rows(db, ROLLUP_SOURCE_TRADE_LOGS, log_rows)
     db.commit()
     return inserted
 
@@ -167,6 +182,16 @@ def _to_decimal(value: str | None) -> Decimal:
     return Decimal(str(value))
 
 
+def _log_number(value: str) -> Decimal | None:
+    if value in ("", "--"):
+        return None
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        return None
+    return number if number.is_finite() else None
+
+
 def _side_from_direction(value: str | None) -> str:
     direction = (value or "").upper()
     if direction in ("BUY", "LONG"):
@@ -245,4 +270,12 @@ def _bybit_log_row(log: BybitTradeLog) -> dict:
         "order_id": log.order_id,
         "trade_id": log.trade_id,
         "ts_utc": log.ts_utc,
+        "type_norm": log.type_norm,
+        "action_norm": log.action_norm,
+        "quantity_num": log.quantity_num,
+        "filled_price_num": log.filled_price_num,
+        "funding_num": log.funding_num,
+        "fee_paid_num": log.fee_paid_num,
+        "change_num": log.change_num,
+        "wallet_balance_num": log.wallet_balance_num,
     }
@@ -0,0 +1,371 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+from datetime import date, datetime
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import Cashflow, Fill
+from app.db.streaming import iter_chunks
+from app.schemas.ledger import Cashflow as CashflowSchema
+from app.schemas.ledger import Fill as FillSchema
+from app.services.conversion import BaseCurrencyConverter
+from app.services.metrics import DailyNet, max_drawdown, metrics_from_totals
+from app.services.progress import MonthlySummary
+
+
+LOW_BITS = 31
+LOW_MASK = (1 << LOW_BITS) - 1
+FIXED_MAX_DECIMALS = 22
+FIXED_MAX_MANTISSA = 2.0**53
+# Which (ts, ..., account_id) row fields are text, for the fill and cashflow queries.
+FILL_TEXT = (False, True, False, False, True, True)
+CASH_TEXT = (False, True, False, True, True, True)
+
+
+def to_fixed(values) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Each float as an int64 mantissa over the fewest decimals that round-trip,
+    # i.e. exactly what Decimal(str(x)) holds. Values whose mantissa would pass
+    # 2**53, where the scaled float stops being exact, are flagged instead.
+    values = np.asarray(values, dtype=float)
+    values = np.where(np.isfinite(values), values, 0.0)
+    mantissa = np.zeros(values.size, dtype=np.int64)
+    decimals = np.full(values.size, -1, dtype=np.int64)
+    pending = np.arange(values.size)
+    for scale in range(FIXED_MAX_DECIMALS + 1):
+        if pending.size == 0:
+            break
+        factor = 10.0**scale
+        scaled = np.rint(values[pending] * factor)
+        bounded = np.abs(scaled) <= FIXED_MAX_MANTISSA
+        fits = bounded & (scaled / factor == values[pending])
+        mantissa[pending[fits]] = scaled[fits].astype(np.int64)
+        decimals[pending[fits]] = scale
+        pending = pending[bounded & ~fits]
+    exact = decimals >= 0
+    return mantissa, np.maximum(decimals, 0), exact
+
+
+def fixed_sums(values, codes: np.ndarray, size: int) -> list[Decimal]:
+    values = np.asarray(values, dtype=float)
+    mantissa, decimals, exact = to_fixed(values)
+    # The few values to_fixed cannot scale go through Decimal one by one.
+    spill = [(int(codes[idx]), Decimal(str(values[idx]))) for idx in np.flatnonzero(~exact)]
+    spill = [(code, value) for code, value in spill if value.is_finite()]
+    scale = max(
+        int(decimals[exact].max()) if exact.any() else 0,
+        max((-value.as_tuple().exponent for _, value in spill), default=0),
+    )
+    totals = [0] * size
+    # Mantissas are split into high and low words so the int64 group sums
+    # cannot overflow; the words recombine exactly as Python ints.
+    for exponent in np.unique(decimals[exact]):
+        mask = exact & (decimals == exponent)
+        group = codes[mask]
+        high = np.zeros(size, dtype=np.int64)
+        low = np.zeros(size, dtype=np.int64)
+        np.add.at(high, group, mantissa[mask] >> LOW_BITS)
+        np.add.at(low, group, mantissa[mask] & LOW_MASK)
+        factor = 10 ** (scale - int(exponent))
+        for code in np.flatnonzero(high | low):
+            totals[code] += ((int(high[code]) << LOW_BITS) + int(low[code])) * factor
+    for code, value in spill:
+        totals[code] += int(value.scaleb(scale))
+    return [Decimal(f"{total}e-{scale}") if total else Decimal("0") for total in totals]
+
+
+def fixed_sum(values) -> Decimal:
+    values = np.asarray(values, dtype=float)
+    return fixed_sums(values, np.zeros(values.size, dtype=np.int64), 1)[0]
+
+
+@dataclass
+class LedgerColumns:
+    fill_ts: pd.Series
+    fill_symbol: np.ndarray
+    fill_notional: np.ndarray
+    fill_fee: np.ndarray
+    fill_fee_asset: np.ndarray
+    cash_ts: pd.Series
+    cash_type: np.ndarray
+    cash_amount: np.ndarray
+    cash_asset: np.ndarray
+    cash_symbol: np.ndarray
+    fill_account: np.ndarray
+    cash_account: np.ndarray
+
+    @classmethod
+    def load(
+        cls,
+        db: Session,
+        account_ids: list,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        chunk_rows: int | None = None,
+    ) -> "LedgerColumns":
+        fills_query = db.query(
+            Fill.ts_utc, Fill.symbol, Fill.notional, Fill.fee, Fill.fee_asset, Fill.account_id
+        ).filter(Fill.account_id.in_(account_ids))
+        cash_query = db.query(
+            Cashflow.ts_utc, Cashflow.type, Cashflow.amount, Cashflow.asset, Cashflow.symbol, Cashflow.account_id
+        ).filter(Cashflow.account_id.in_(account_ids))
+        if start:
+            fills_query = fills_query.filter(Fill.ts_utc >= start)
+            cash_query = cash_query.filter(Cashflow.ts_utc >= start)
+        if end:
+            fills_query = fills_query.filter(Fill.ts_utc <= end)
+            cash_query = cash_query.filter(Cashflow.ts_utc <= end)
+        if chunk_rows is None:
+            chunk_rows = settings.REPORT_STREAM_CHUNK_ROWS
+        # Streamed chunks arrive in time order, so rows never depend on the plan.
+        fills_query = fills_query.order_by(Fill.ts_utc, Fill.id)
+        cash_query = cash_query.order_by(Cashflow.ts_utc, Cashflow.id)
+        return cls._from_chunks(iter_chunks(fills_query, chunk_rows), iter_chunks(cash_query, chunk_rows))
+
+    @classmethod
+    def from_ledger(cls, fills: list[FillSchema], cashflows: list[CashflowSchema]) -> "LedgerColumns":
+        return cls._from_rows(
+            [(f.ts_utc, f.symbol, float(f.notional), float(f.fee), f.fee_asset, f.account_id) for f in fills],
+            [(cf.ts_utc, cf.type, float(cf.amount), cf.asset, cf.symbol, cf.account_id) for cf in cashflows],
+        )
+
+    @classmethod
+    def _from_rows(cls, fill_rows: list, cash_rows: list) -> "LedgerColumns":
+        return cls._from_chunks([fill_rows], [cash_rows])
+
+    @classmethod
+    def _from_chunks(cls, fill_chunks, cash_chunks) -> "LedgerColumns":
+        # Each chunk of row tuples is turned into columns before the next is
+        # fetched; repeated strings share one object across chunks. The joined
+        # columns cover the whole range (curves, slicing per range and the
+        # commission-or-fill fee choice need every row), so the chunk size
+        # bounds the row objects alive at once, not the columns.
+        strings: dict = {}
+        fills = _joined([_chunk_columns(rows, FILL_TEXT, strings) for rows in fill_chunks], FILL_TEXT)
+        cash = _joined([_chunk_columns(rows, CASH_TEXT, strings) for rows in cash_chunks], CASH_TEXT)
+        return cls(
+            fill_ts=fills[0],
+            fill_symbol=fills[1],
+            fill_notional=fills[2],
+            fill_fee=fills[3],
+            fill_fee_asset=fills[4],
+            cash_ts=cash[0],
+            cash_type=cash[1],
+            cash_amount=cash[2],
+            cash_asset=cash[3],
+            cash_symbol=cash[4],
+            fill_account=fills[5],
+            cash_account=cash[5],
+        )
+
+    def to_base(self, converter: BaseCurrencyConverter) -> "LedgerColumns":
+        base = converter.base
+        fee_asset = self.fill_fee_asset.copy()
+        fee = self.fill_fee.copy()
+        pending = _non_base(fee_asset, base)
+        if pending.size:
+            converted = converter.convert(fee_asset[pending], _times_ms(self.fill_ts)[pending], fee[pending])
+            found = pending[np.isfinite(converted)]
+            fee[found] = converted[np.isfinite(converted)]
+            fee_asset[found] = base
+
+        cash_asset = self.cash_asset.copy()
+        amount = self.cash_amount.copy()
+        pending = _non_base(cash_asset, base)
+        if pending.size:
+            converted = converter.convert(cash_asset[pending], _times_ms(self.cash_ts)[pending], amount[pending])
+            found = pending[np.isfinite(converted)]
+            amount[found] = converted[np.isfinite(converted)]
+            cash_asset[found] = base
+        return replace(self, fill_fee=fee, fill_fee_asset=fee_asset, cash_amount=amount, cash_asset=cash_asset)
+
+    def take(self, fill_mask: np.ndarray, cash_mask: np.ndarray) -> "LedgerColumns":
+        return LedgerColumns(
+            fill_ts=self.fill_ts[fill_mask].reset_index(drop=True),
+            fill_symbol=self.fill_symbol[fill_mask],
+            fill_notional=self.fill_notional[fill_mask],
+            fill_fee=self.fill_fee[fill_mask],
+            fill_fee_asset=self.fill_fee_asset[fill_mask],
+            cash_ts=self.cash_ts[cash_mask].reset_index(drop=True),
+            cash_type=self.cash_type[cash_mask],
+            cash_amount=self.cash_amount[cash_mask],
+            cash_asset=self.cash_asset[cash_mask],
+            cash_symbol=self.cash_symbol[cash_mask],
+            fill_account=self.fill_account[fill_mask],
+            cash_account=self.cash_account[cash_mask],
+        )
+
+    def between(self, start: datetime | None, end: datetime | None) -> "LedgerColumns":
+        return self.take(_within(self.fill_ts, start, end), _within(self.cash_ts, start, end))
+
+    def for_accounts(self, account_ids: list) -> "LedgerColumns":
+        wanted = [str(account_id) for account_id in account_ids]
+        return self.take(
+            np.isin(self.fill_account.astype(str), wanted), np.isin(self.cash_account.astype(str), wanted)
+        )
+
+    def metrics(self) -> dict:
+        base = settings.BASE_CURRENCY
+        is_commission = self.cash_type == "commission"
+        if is_commission.any():
+            trading_fees = fixed_sum(np.abs(self.cash_amount[is_commission]))
+        else:
+            trading_fees = fixed_sum(np.abs(self.fill_fee))
+        return metrics_from_totals(
+            turnover=fixed_sum(self.fill_notional),
+            trades=int(self.fill_notional.size),
+            trading_fees=trading_fees,
+            funding_pnl=fixed_sum(self.cash_amount[self.cash_type == "funding"]),
+            borrow_interest=fixed_sum(np.abs(self.cash_amount[self.cash_type == "borrow_interest"])),
+            rebates=fixed_sum(self.cash_amount[self.cash_type == "rebate"]),
+            realized_pnl=fixed_sum(self.cash_amount[self.cash_type == "realized_pnl"]),
+            unconverted_fee_assets=_unconverted(self.fill_fee_asset, base),
+            unconverted_cashflow_assets=_unconverted(self.cash_asset, base),
+        )
+
+    def daily_series(self) -> dict[date, DailyNet]:
+        # Days keep first-seen order (fills, then cashflows), like the row loop.
+        fill_days = _days(self.fill_ts)
+        cash_days = _days(self.cash_ts)
+        codes, days = pd.factorize(np.concatenate((fill_days, cash_days)))
+        size = len(days)
+        fill_codes = codes[: fill_days.size]
+        cash_codes = codes[fill_days.size :]
+
+        turnover = fixed_sums(self.fill_notional, fill_codes, size)
+        trades = np.bincount(fill_codes, minlength=size)
+        fill_fees = fixed_sums(np.abs(self.fill_fee), fill_codes, size)
+        cash_type = self.cash_type
+        signed = ~np.isin(cash_type, ("funding", "commission", "borrow_interest"))
+        funding = _masked_sums(self.cash_amount, cash_codes, cash_type == "funding", size)
+        commission = _masked_sums(np.abs(self.cash_amount), cash_codes, cash_type == "commission", size)
+        borrow = _masked_sums(np.abs(self.cash_amount), cash_codes, cash_type == "borrow_interest", size)
+        other = _masked_sums(self.cash_amount, cash_codes, signed, size)
+
+        daily: dict[date, DailyNet] = {}
+        for code, day in enumerate(days):
+            net_after_fees = other[code] - fill_fees[code] - commission[code] - borrow[code]
+            daily[pd.Timestamp(day).date()] = DailyNet(
+                net_after_fees=net_after_fees,
+                net_after_fees_and_funding=net_after_fees + funding[code],
+                turnover=turnover[code],
+                trading_fees=fill_fees[code] + commission[code],
+                trades=int(trades[code]),
+            )
+        return daily
+
+    def monthly(self) -> list[MonthlySummary]:
+        fill_months = _months(self.fill_ts)
+        cash_months = _months(self.cash_ts)
+        summaries = []
+        for month in np.unique(np.concatenate((fill_months, cash_months))):
+            subset = self.take(fill_months == month, cash_months == month)
+            metrics = subset.metrics()
+            daily_series = subset.daily_series()
+            mdd = max_drawdown([v.net_after_fees_and_funding for v in daily_series.values()])
+            metrics["max_drawdown"] = float(mdd)
+            summaries.append(MonthlySummary(month=f"{month // 100:04d}-{month % 100:02d}", metrics=metrics))
+        return summaries
+
+    def window(self) -> dict:
+        ts = pd.concat([self.fill_ts, self.cash_ts], ignore_index=True)
+        if ts.empty:
+            return {}
+        return {"start": ts.min().to_pydatetime().isoformat(), "end": ts.max().to_pydatetime().isoformat()}
+
+    def symbol_pnl(self) -> dict[str, Decimal]:
+        has_symbol = _present(self.cash_symbol)
+        codes, symbols = pd.factorize(self.cash_symbol[has_symbol])
+        return dict(zip(symbols, fixed_sums(self.cash_amount[has_symbol], codes, len(symbols))))
+
+    def top_symbols(self, limit: int = 5) -> list[dict]:
+        has_symbol = _present(self.cash_symbol)
+        codes, symbols = pd.factorize(self.cash_symbol[has_symbol])
+        totals = np.zeros(len(symbols))
+        np.add.at(totals, codes, self.cash_amount[has_symbol])
+        ranked = sorted(zip(symbols, totals.tolist()), key=lambda kv: abs(kv[1]), reverse=True)
+        return [{"symbol": sym, "amount": amt} for sym, amt in ranked[:limit]]
+
+    def fill_times_ms(self) -> np.ndarray:
+        return _times_ms(self.fill_ts)
+
+    def cash_times_ms(self) -> np.ndarray:
+        return _times_ms(self.cash_ts)
+
+
+def _chunk_columns(rows: list, text: tuple[bool, ...], strings: dict) -> list:
+    columns = list(zip(*rows)) or [[]] * len(text)
+    out: list = [pd.Series(pd.to_datetime(list(columns[0])))]
+    for values, is_text in zip(columns[1:], text[1:]):
+        if is_text:
+            out.append(np.asarray([strings.setdefault(value, value) for value in values], dtype=object))
+        else:
+            out.append(np.asarray(values, dtype=float))
+    return out
+
+
+def _joined(chunks: list[list], text: tuple[bool, ...]) -> list:
+    if not chunks:
+        chunks = [_chunk_columns([], text, {})]
+    if len(chunks) == 1:
+        return chunks[0]
+    series = pd.concat([chunk[0] for chunk in chunks], ignore_index=True)
+    return [series] + [np.concatenate([chunk[i] for chunk in chunks]) for i in range(1, len(chunks[0]))]
+
+
+def _masked_sums(values: np.ndarray, codes: np.ndarray, mask: np.ndarray, size: int) -> list[Decimal]:
+    return fixed_sums(values[mask], codes[mask], size)
+
+
+def _present(values: np.ndarray) -> np.ndarray:
+    return (pd.Series(values, dtype=object).fillna("") != "").to_numpy()
+
+
+def _non_base(assets: np.ndarray, base: str) -> np.ndarray:
+    upper = pd.Series(assets, dtype=object).fillna("").str.upper().to_numpy()
+    return np.flatnonzero((upper != "") & (upper != base))
+
+
+def _unconverted(assets: np.ndarray, base: str) -> list[str]:
+    return sorted({asset for asset in pd.unique(assets) if asset and asset != base})
+
+
+def _days(ts: pd.Series) -> np.ndarray:
+    if ts.empty:
+        return np.empty(0, dtype="datetime64[D]")
+    if ts.dt.tz is not None:
+        ts = ts.dt.tz_localize(None)
+    return ts.to_numpy().astype("datetime64[D]")
+
+
+def _months(ts: pd.Series) -> np.ndarray:
+    if ts.empty:
+        return np.empty(0, dtype=np.int64)
+    return (ts.dt.year * 100 + ts.dt.month).to_numpy(dtype=np.int64)
+
+
+def _within(ts: pd.Series, start: datetime | None, end: datetime | None) -> np.ndarray:
+    mask = np.ones(len(ts), dtype=bool)
+    if ts.empty:
+        return mask
+    times = pd.to_datetime(ts, utc=True)
+    if start:
+        mask &= (times >= _utc_timestamp(start)).to_numpy()
+    if end:
+        mask &= (times <= _utc_timestamp(end)).to_numpy()
+    return mask
+
+
+def _utc_timestamp(value: datetime) -> pd.Timestamp:
+    stamp = pd.Timestamp(value)
+    return stamp.tz_localize("UTC") if stamp.tzinfo is None else stamp.tz_convert("UTC")
+
+
+def _times_ms(ts: pd.Series) -> np.ndarray:
+    if ts.empty:
+        return np.empty(0, dtype=np.int64)
+    return pd.to_datetime(ts, utc=True).dt.as_unit("ms").astype("int64").to_numpy()
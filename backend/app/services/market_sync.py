@@ -1,16 +1,26 @@
 from __future__ import annotations
 
+import logging
 from datetime import datetime
 
+import requests
+from sqlalchemy import select, union
+from sqlalchemy.orm import Session
+
 from app.attribution.joiner import INTERVALS, WINDOWS
 from app.connectors.binance_um import BinanceUMClient
 from app.core.config import settings
+from app.db.models import Cashflow, Fill
 from app.schemas.report import ReportRequest
+from app.services.conversion import CONVERSION_INTERVAL
 from app.storage.cache import MarketDataCache, compute_missing_ranges
 from app.storage.market_store import MarketDataStore
 from app.services.report_service import resolve_range
 
 
+logger = logging.getLogger(__name__)
+
+
 def sync_market_data(
     market_store: MarketDataStore,
     cache: MarketDataCache,
@@ -55,6 +65,43 @@ def sync_market_data(
                 market_store.upsert_open_interest(rows)
 
 
+def sync_conversion_rates(
+    db: Session,
+    market_store: MarketDataStore,
+    cache: MarketDataCache,
+    start: datetime,
+    end: datetime,
+    base: str | None = None,
+) -> None:
+    # Fetches the klines BaseCurrencyConverter reads for every non-base fee or
+    # cashflow asset, trying the direct pair before the inverse one.
+    base = (base or settings.BASE_CURRENCY).upper()
+    client = BinanceUMClient()
+    start_ms = int(start.timestamp() * 1000)
+    end_ms = int(end.timestamp() * 1000)
+    for asset in _ledger_assets(db):
+        if asset == base:
+            continue
+        for pair in (f"{asset}{base}", f"{base}{asset}"):
+            cached = cache.load("klines", pair, CONVERSION_INTERVAL)
+            if cached.empty:
+                cached = market_store.load_klines(pair, CONVERSION_INTERVAL)
+            try:
+                for miss_start, miss_end in compute_missing_ranges(cached, start_ms, end_ms, "open_time"):
+                    rows = client.get_klines(pair, CONVERSION_INTERVAL, miss_start, miss_end)
+                    cached = cache.upsert("klines", pair, CONVERSION_INTERVAL, rows, time_col="open_time")
+                    market_store.upsert_klines(rows)
+            except requests.HTTPError as exc:
+                logger.warning("Conversion klines unavailable for %s: %s", pair, exc)
+                continue
+            break
+
+
+def _ledger_assets(db: Session) -> list[str]:
+    query = union(select(Fill.fee_asset), select(Cashflow.asset))
+    return sorted({str(asset).upper() for (asset,) in db.execute(query) if asset})
+
+
 def resolve_market_sync_range() -> tuple[datetime | None, datetime | None]:
     payload = ReportRequest(preset=settings.MARKET_SYNC_PRESET)
     return resolve_range(payload)
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
 from collections import defaultdict
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
 from datetime import date
 from decimal import Decimal
 from typing import Iterable
 
+import pandas as pd
+
 from app.core.config import settings
 from app.db.models import BybitTradeLog
 from app.schemas.ledger import Cashflow, Fill
@@ -19,6 +21,7 @@ class DailyNet:
     net_after_fees: Decimal = Decimal("0")
     net_after_fees_and_funding: Decimal = Decimal("0")
     turnover: Decimal = Decimal("0")
+    trading_fees: Decimal = Decimal("0")
     trades: int = 0
 
 
@@ -27,12 +30,7 @@ def _to_decimal(value) -> Decimal:
 
 
 def _log_decimal(value) -> Decimal:
-    if value in (None, "", "--"):
-        return Decimal("0")
-    try:
-        return Decimal(str(value))
-    except Exception:
-        return Decimal("0")
+    return Decimal("0") if value is None else _to_decimal(value)
 
 
 def sum_decimal(values: Iterable[Decimal]) -> Decimal:
@@ -58,6 +56,30 @@ def compute_metrics(fills: list[Fill], cashflows: list[Cashflow]) -> dict:
     rebates = sum_decimal([cf.amount for cf in cashflows if cf.type == "rebate"])
     realized_pnl = sum_decimal([cf.amount for cf in cashflows if cf.type == "realized_pnl"])
 
+    return metrics_from_totals(
+        turnover=turnover,
+        trades=trades,
+        trading_fees=trading_fees,
+        funding_pnl=funding_pnl,
+        borrow_interest=borrow_interest,
+        rebates=rebates,
+        realized_pnl=realized_pnl,
+        unconverted_fee_assets=sorted({fill.fee_asset for fill in fills if fill.fee_asset and fill.fee_asset != base}),
+        unconverted_cashflow_assets=sorted({cf.asset for cf in cashflows if cf.asset and cf.asset != base}),
+    )
+
+
+def metrics_from_totals(
+    turnover: Decimal,
+    trades: int,
+    trading_fees: Decimal,
+    funding_pnl: Decimal,
+    borrow_interest: Decimal,
+    rebates: Decimal,
+    realized_pnl: Decimal,
+    unconverted_fee_assets: list[str],
+    unconverted_cashflow_assets: list[str],
+) -> dict:
     net_after_fees = realized_pnl + rebates - trading_fees - borrow_interest
     net_after_fees_and_funding = net_after_fees + funding_pnl
 
@@ -68,9 +90,6 @@ def compute_metrics(fills: list[Fill], cashflows: list[Cashflow]) -> dict:
     denom = max(abs(realized_pnl), gross_profit, EPS)
     cost_share_fee = trading_fees / denom
 
-    unconverted_fee_assets = sorted({fill.fee_asset for fill in fills if fill.fee_asset and fill.fee_asset != base})
-    unconverted_cashflow_assets = sorted({cf.asset for cf in cashflows if cf.asset and cf.asset != base})
-
     return {
         "turnover": float(turnover),
         "trades": trades,
@@ -90,59 +109,7 @@ def compute_metrics(fills: list[Fill], cashflows: list[Cashflow]) -> dict:
 
 
 def compute_metrics_from_trade_logs(trade_logs: list[BybitTradeLog]) -> dict:
-    base = settings.BASE_CURRENCY
-    trade_rows = _trade_rows_from_logs(trade_logs)
-
-    turnover = Decimal("0")
-    trading_fees = Decimal("0")
-    realized_pnl = Decimal("0")
-    trades = 0
-    fee_assets = set()
-
-    for row in trade_rows:
-        qty = _log_decimal(row.quantity)
-        price = _log_decimal(row.filled_price)
-        fee_paid = abs(_log_decimal(row.fee_paid))
-        change = _log_decimal(row.change)
-        turnover += qty * price
-        trading_fees += fee_paid
-        realized_pnl += change
-        trades += 1
-        if row.currency and row.currency != base and fee_paid > 0:
-            fee_assets.add(row.currency)
-
-    funding_pnl = Decimal("0")
-    for row in trade_logs:
-        row_type = (row.type or "").upper()
-        if "SETTLEMENT" in row_type:
-            funding_pnl += _log_decimal(row.funding)
-
-    net_after_fees = realized_pnl - trading_fees
-    net_after_fees_and_funding = net_after_fees + funding_pnl
-
-    fee_rate_bps = (trading_fees / turnover * Decimal("10000")) if turnover > 0 else Decimal("0")
-    funding_intensity_bps = (abs(funding_pnl) / turnover * Decimal("10000")) if turnover > 0 else Decimal("0")
-
-    gross_profit = realized_pnl if realized_pnl > 0 else Decimal("0")
-    denom = max(abs(realized_pnl), gross_profit, EPS)
-    cost_share_fee = trading_fees / denom
-
-    return {
-        "turnover": float(turnover),
-        "trades": trades,
-        "trading_fees": float(trading_fees),
-        "funding_pnl": float(funding_pnl),
-        "borrow_interest": 0.0,
-        "rebates": 0.0,
-        "realized_pnl": float(realized_pnl),
-        "net_after_fees": float(net_after_fees),
-        "net_after_fees_and_funding": float(net_after_fees_and_funding),
-        "fee_rate_bps": float(fee_rate_bps),
-        "funding_intensity_bps": float(funding_intensity_bps),
-        "cost_share_fee": float(cost_share_fee),
-        "unconverted_fee_assets": sorted(fee_assets),
-        "unconverted_cashflow_assets": [],
-    }
+    return TradeLogTotals().add(trade_logs).metrics()
 
 
 def compute_daily_series(fills: list[Fill], cashflows: list[Cashflow]) -> dict[date, DailyNet]:
@@ -152,6 +119,7 @@ def compute_daily_series(fills: list[Fill], cashflows: list[Cashflow]) -> dict[d
         d = fill.ts_utc.date()
         daily[d].turnover += _to_decimal(fill.notional)
         daily[d].trades += 1
+        daily[d].trading_fees += abs(_to_decimal(fill.fee))
         daily[d].net_after_fees -= abs(_to_decimal(fill.fee))
         daily[d].net_after_fees_and_funding -= abs(_to_decimal(fill.fee))
 
@@ -161,6 +129,7 @@ def compute_daily_series(fills: list[Fill], cashflows: list[Cashflow]) -> dict[d
         if cf.type == "funding":
             daily[d].net_after_fees_and_funding += amount
         elif cf.type == "commission":
+            daily[d].trading_fees += abs(amount)
             daily[d].net_after_fees -= abs(amount)
             daily[d].net_after_fees_and_funding -= abs(amount)
         elif cf.type == "borrow_interest":
@@ -179,42 +148,166 @@ def compute_daily_series(fills: list[Fill], cashflows: list[Cashflow]) -> dict[d
     return daily
 
 
-def compute_daily_series_from_trade_logs(
-    trade_logs: list[BybitTradeLog],
-) -> dict[date, DailyNet]:
-    daily: dict[date, DailyNet] = defaultdict(DailyNet)
-    trade_rows = _trade_rows_from_logs(trade_logs)
-
-    for row in trade_rows:
-        d = row.ts_utc.date()
-        qty = _log_decimal(row.quantity)
-        price = _log_decimal(row.filled_price)
-        fee_paid = abs(_log_decimal(row.fee_paid))
-        change = _log_decimal(row.change)
-        daily[d].turnover += qty * price
-        daily[d].trades += 1
-        daily[d].net_after_fees += change - fee_paid
-        daily[d].net_after_fees_and_funding += change - fee_paid
+def compute_daily_series_from_trade_logs(trade_logs: list[BybitTradeLog]) -> dict[date, DailyNet]:
+    return TradeLogTotals().add(trade_logs).daily_series()
+
+
+class TradeLogTotals:
+    # Folds trade log rows in chunks, in query order. Closing trades count
+    # unless the logs have none, so both selections are kept until the end.
+    def __init__(self) -> None:
+        self.base = settings.BASE_CURRENCY
+        self.closing = _TradeSelection()
+        self.all_trades = _TradeSelection()
+        self.funding_pnl = Decimal("0")
+        self.funding_by_day: dict[date, list[Decimal]] = defaultdict(list)
+        self.contract_change: dict[str, float] = defaultdict(float)
+        self.first_ts = None
+        self.last_ts = None
+
+    def add(self, rows: Iterable) -> "TradeLogTotals":
+        for row in rows:
+            if self.first_ts is None or row.ts_utc < self.first_ts:
+                self.first_ts = row.ts_utc
+            if self.last_ts is None or row.ts_utc > self.last_ts:
+                self.last_ts = row.ts_utc
+            if "TRADE" in row.type_norm:
+                self.all_trades.add(row, self.base)
+                if "CLOSE" in row.action_norm:
+                    self.closing.add(row, self.base)
+                if row.contract:
+                    self.contract_change[row.contract] += float(row.change_num or 0)
+            if "SETTLEMENT" in row.type_norm:
+                funding = _log_decimal(row.funding_num)
+                self.funding_pnl += funding
+                self.funding_by_day[row.ts_utc.date()].append(funding)
+        return self
+
+    @property
+    def counted(self) -> "_TradeSelection":
+        return self.closing if self.closing.trades else self.all_trades
+
+    def metrics(self) -> dict:
+        counted = self.counted
+        return metrics_from_totals(
+            turnover=counted.turnover,
+            trades=counted.trades,
+            trading_fees=counted.trading_fees,
+            funding_pnl=self.funding_pnl,
+            borrow_interest=Decimal("0"),
+            rebates=Decimal("0"),
+            realized_pnl=counted.realized_pnl,
+            unconverted_fee_assets=sorted(counted.fee_assets),
+            unconverted_cashflow_assets=[],
+        )
+
+    def daily_series(self) -> dict[date, DailyNet]:
+        daily: dict[date, DailyNet] = defaultdict(DailyNet)
+        for d, item in self.counted.daily.items():
+            daily[d] = replace(item)
+        for d, amounts in self.funding_by_day.items():
+            for amount in amounts:
+                daily[d].net_after_fees_and_funding += amount
+        return daily
+
+    def symbol_pnl(self) -> dict[str, Decimal]:
+        return dict(self.counted.symbol_pnl)
+
+    def top_symbols(self, limit: int = 5) -> list[dict]:
+        ranked = sorted(self.contract_change.items(), key=lambda kv: abs(kv[1]), reverse=True)
+        return [{"symbol": sym, "amount": amt} for sym, amt in ranked[:limit]]
+
+    def window(self) -> dict:
+        if self.first_ts is None:
+            return {}
+        return {"start": self.first_ts.isoformat(), "end": self.last_ts.isoformat()}
 
-    for row in trade_logs:
-        row_type = (row.type or "").upper()
-        if "SETTLEMENT" not in row_type:
-            continue
-        d = row.ts_utc.date()
-        funding = _log_decimal(row.funding)
-        daily[d].net_after_fees_and_funding += funding
 
+@dataclass
+class _TradeSelection:
+    turnover: Decimal = Decimal("0")
+    trading_fees: Decimal = Decimal("0")
+    realized_pnl: Decimal = Decimal("0")
+    trades: int = 0
+    fee_assets: set = field(default_factory=set)
+    daily: dict = field(default_factory=lambda: defaultdict(DailyNet))
+    symbol_pnl: dict = field(default_factory=lambda: defaultdict(Decimal))
+
+    def add(self, row, base: str) -> None:
+        qty = _log_decimal(row.quantity_num)
+        price = _log_decimal(row.filled_price_num)
+        fee_paid = abs(_log_decimal(row.fee_paid_num))
+        change = _log_decimal(row.change_num)
+        self.turnover += qty * price
+        self.trading_fees += fee_paid
+        self.realized_pnl += change
+        self.trades += 1
+        if row.currency and row.currency != base and fee_paid > 0:
+            self.fee_assets.add(row.currency)
+        day = self.daily[row.ts_utc.date()]
+        day.turnover += qty * price
+        day.trades += 1
+        day.trading_fees += fee_paid
+        day.net_after_fees += change - fee_paid
+        day.net_after_fees_and_funding += change - fee_paid
+        if row.contract:
+            self.symbol_pnl[row.contract] += change
+
+
+def compute_metrics_from_rollups(rollups: pd.DataFrame) -> dict:
+    counted = _counted_rollups(rollups)
+    if int(rollups["commission_flows"].sum()) > 0:
+        trading_fees = sum_decimal(rollups["commission"])
+    else:
+        trading_fees = sum_decimal(counted["fill_fees"])
+
+    unconverted = ~counted["converted"] & (counted["asset"] != "")
+    if (rollups["source"] == "trade_logs").any():
+        fee_assets = unconverted & (counted["fill_fees"] > 0)
+    else:
+        fee_assets = unconverted & (counted["trades"] > 0)
+
+    return metrics_from_totals(
+        turnover=sum_decimal(counted["turnover"]),
+        trades=int(counted["trades"].sum()),
+        trading_fees=trading_fees,
+        funding_pnl=sum_decimal(rollups["funding"]),
+        borrow_interest=sum_decimal(rollups["borrow_interest"]),
+        rebates=sum_decimal(rollups["rebates"]),
+        realized_pnl=sum_decimal(counted["realized_pnl"]),
+        unconverted_fee_assets=sorted(set(counted.loc[fee_assets, "asset"])),
+        unconverted_cashflow_assets=sorted(set(counted.loc[unconverted & (counted["cashflows"] > 0), "asset"])),
+    )
+
+
+def compute_daily_series_from_rollups(rollups: pd.DataFrame) -> dict[date, DailyNet]:
+    counted = _counted_rollups(rollups)
+    amounts = ["fill_fees", "commission", "realized_pnl", "rebates", "other_cashflow", "borrow_interest", "funding", "turnover"]
+    frame = counted[["day"]].assign(**{name: counted[name].map(_to_decimal) for name in amounts}, trades=counted["trades"])
+    daily: dict[date, DailyNet] = {}
+    for row in frame.groupby("day", sort=True).sum().itertuples():
+        trading_fees = row.fill_fees + row.commission
+        net_after_fees = row.realized_pnl + row.rebates + row.other_cashflow - trading_fees - row.borrow_interest
+        daily[row.Index] = DailyNet(
+            net_after_fees=net_after_fees,
+            net_after_fees_and_funding=net_after_fees + row.funding,
+            turnover=row.turnover,
+            trading_fees=trading_fees,
+            trades=int(row.trades),
+        )
     return daily
 
 
-def _trade_rows_from_logs(trade_logs: list[BybitTradeLog]) -> list[BybitTradeLog]:
-    trades = [row for row in trade_logs if "TRADE" in (row.type or "").upper()]
-    if not trades:
-        return []
-    has_close = any("CLOSE" in (row.action or "").upper() for row in trades)
-    if has_close:
-        return [row for row in trades if "CLOSE" in (row.action or "").upper()]
-    return trades
+def _counted_rollups(rollups: pd.DataFrame) -> pd.DataFrame:
+    # Trade logs count closing trades only, unless the selection has none.
+    if int(rollups["trades"].sum()) > 0 or int(rollups["open_trades"].sum()) == 0:
+        return rollups
+    return rollups.assign(
+        turnover=rollups["open_turnover"],
+        trades=rollups["open_trades"],
+        fill_fees=rollups["open_fees"],
+        realized_pnl=rollups["open_pnl"],
+    )
 
 
 def max_drawdown(net_curve: list[Decimal]) -> Decimal:
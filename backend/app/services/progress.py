@@ -2,14 +2,20 @@ from __future__ import annotations
 
 from collections import defaultdict
 from dataclasses import dataclass
+from datetime import date
 from decimal import Decimal
 
+import pandas as pd
+
 from app.db.models import BybitTradeLog
 from app.schemas.ledger import Cashflow, Fill
 from app.services.metrics import (
+    DailyNet,
     compute_daily_series,
+    compute_daily_series_from_rollups,
     compute_daily_series_from_trade_logs,
     compute_metrics,
+    compute_metrics_from_rollups,
     compute_metrics_from_trade_logs,
     max_drawdown,
 )
@@ -59,6 +65,27 @@ def monthly_aggregate_from_trade_logs(trade_logs: list[BybitTradeLog]) -> list[M
     return summaries
 
 
+def monthly_aggregate_from_rollups(
+    rollups: pd.DataFrame,
+    frozen: dict[str, dict] | None = None,
+) -> list[MonthlySummary]:
+    if rollups.empty:
+        return []
+    months = pd.to_datetime(rollups["day"].astype(str)).dt.strftime("%Y-%m")
+
+    summaries = []
+    for key, group in rollups.groupby(months.to_numpy(), sort=True):
+        if frozen and key in frozen:
+            summaries.append(MonthlySummary(month=key, metrics=dict(frozen[key])))
+            continue
+        metrics = compute_metrics_from_rollups(group)
+        daily_series = compute_daily_series_from_rollups(group)
+        mdd = max_drawdown([v.net_after_fees_and_funding for v in daily_series.values()])
+        metrics["max_drawdown"] = float(mdd)
+        summaries.append(MonthlySummary(month=key, metrics=metrics))
+    return summaries
+
+
 def detect_progress(monthly: list[MonthlySummary]) -> dict:
     if len(monthly) < 2:
         return {"status": "insufficient_data"}
@@ -99,31 +126,18 @@ def detect_progress(monthly: list[MonthlySummary]) -> dict:
 
 
 def rolling_compare(fills: list[Fill], cashflows: list[Cashflow], window_days: int) -> dict:
-    daily = compute_daily_series(fills, cashflows)
-    dates = sorted(daily.keys())
-    if len(dates) < window_days * 2:
-        return {"status": "insufficient_data"}
+    return rolling_compare_from_daily(compute_daily_series(fills, cashflows), window_days)
 
-    def sum_window(start: int, end: int) -> Decimal:
-        total = Decimal("0")
-        for d in dates[start:end]:
-            total += daily[d].net_after_fees
-        return total
 
-    recent = sum_window(-window_days, None)
-    prev = sum_window(-window_days * 2, -window_days)
+def rolling_compare_from_trade_logs(trade_logs: list[BybitTradeLog], window_days: int) -> dict:
+    return rolling_compare_from_daily(compute_daily_series_from_trade_logs(trade_logs), window_days)
 
-    status = "flat"
-    if recent > prev:
-        status = "improved"
-    elif recent < prev:
-        status = "deteriorated"
 
-    return {"status": status, "recent": float(recent), "previous": float(prev)}
+def rolling_compare_from_rollups(rollups: pd.DataFrame, window_days: int) -> dict:
+    return rolling_compare_from_daily(compute_daily_series_from_rollups(rollups), window_days)
 
 
-def rolling_compare_from_trade_logs(trade_logs: list[BybitTradeLog], window_days: int) -> dict:
-    daily = compute_daily_series_from_trade_logs(trade_logs)
+def rolling_compare_from_daily(daily: dict[date, DailyNet], window_days: int) -> dict:
     dates = sorted(daily.keys())
     if len(dates) < window_days * 2:
         return {"status": "insufficient_data"}
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import (
+    BybitTradeLog,
+    Cashflow,
+    DailyRollup,
+    Fill,
+    MarketFundingRate,
+    MarketKline,
+    MarketMarkKline,
+    MarketOpenInterest,
+    ReportRun,
+)
+from app.schemas.report import ReportRequest
+from app.services.evidence_builder import SCHEMA_VERSION
+from app.services.rollups import ROLLUP_SOURCE_LEDGER, ROLLUP_SOURCE_TRADE_LOGS, ensure_daily_rollups
+
+
+MARKET_TABLES = (MarketKline, MarketMarkKline, MarketFundingRate, MarketOpenInterest)
+LEDGER_TABLES = (Fill, Cashflow, BybitTradeLog)
+# Presets resolved against now_utc(): all of them end at "now", and the rolling
+# windows also start relative to it.
+NOW_ENDED_PRESETS = ("last_7d", "last_30d", "this_month", "ytd")
+ROLLING_PRESETS = ("last_7d", "last_30d")
+CACHED_REPORT_FIELDS = (
+    "summary_json",
+    "anomalies_json",
+    "chart_spec_json",
+    "facts_path",
+    "evidence_path",
+    "evidence_json",
+    "schema_version",
+)
+
+
+def report_cache_key(
+    db: Session,
+    payload: ReportRequest,
+    account_ids: list[str],
+    start: datetime | None,
+    end: datetime | None,
+) -> str:
+    key_start, key_end = _key_bounds(db, payload, account_ids, start, end)
+    parts = {
+        "accounts": sorted(str(account_id) for account_id in account_ids),
+        "exchange_id": payload.exchange_id,
+        "start": key_start,
+        "end": key_end,
+        "preset": payload.preset,
+        "net_mode": payload.net_mode or "fees_only",
+        "include_market": bool(payload.include_market),
+        "schema_version": SCHEMA_VERSION,
+        "settings": {
+            "base_currency": settings.BASE_CURRENCY,
+            "chart_point_budget": settings.CHART_POINT_BUDGET,
+            "lot_match_method": settings.LOT_MATCH_METHOD,
+            "bootstrap_resamples": settings.EVIDENCE_BOOTSTRAP_RESAMPLES,
+            "market_coverage_tolerance": settings.MARKET_COVERAGE_TOLERANCE_MINUTES,
+        },
+        "ledger": ledger_watermarks(db, account_ids),
+        "market": market_watermark(db),
+    }
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def ledger_watermarks(db: Session, account_ids: list[str]) -> dict[str, str | None]:
+    # Every sync and import refreshes the rollups of the days it touched, so the
+    # latest rollup refresh per account moves whenever its ledger may have changed.
+    for source in (ROLLUP_SOURCE_LEDGER, ROLLUP_SOURCE_TRADE_LOGS):
+        ensure_daily_rollups(db, account_ids, source)
+    rows = (
+        db.query(DailyRollup.account_id, func.max(DailyRollup.updated_at))
+        .filter(DailyRollup.account_id.in_(account_ids))
+        .group_by(DailyRollup.account_id)
+        .all()
+    )
+    marks = {str(account_id): updated_at.isoformat() for account_id, updated_at in rows if updated_at}
+    return {account_id: marks.get(account_id) for account_id in sorted(str(value) for value in account_ids)}
+
+
+def ledger_span(
+    db: Session, account_ids: list[str], start: datetime | None, end: datetime | None
+) -> tuple[datetime | None, datetime | None]:
+    firsts, lasts = [], []
+    for table in LEDGER_TABLES:
+        query = db.query(func.min(table.ts_utc), func.max(table.ts_utc)).filter(table.account_id.in_(account_ids))
+        if start:
+            query = query.filter(table.ts_utc >= start)
+        if end:
+            query = query.filter(table.ts_utc <= end)
+        first, last = query.one()
+        if first is not None:
+            firsts.append(first)
+            lasts.append(last)
+    return min(firsts, default=None), max(lasts, default=None)
+
+
+def market_watermark(db: Session) -> str | None:
+    marks = [db.query(func.max(table.created_at)).scalar() for table in MARKET_TABLES]
+    latest = max([mark for mark in marks if mark is not None], default=None)
+    return latest.isoformat() if latest else None
+
+
+def find_cached_report(db: Session, cache_key: str, exclude_id=None) -> ReportRun | None:
+    query = db.query(ReportRun).filter(ReportRun.cache_key == cache_key, ReportRun.evidence_json.isnot(None))
+    if exclude_id is not None:
+        query = query.filter(ReportRun.id != exclude_id)
+    return query.order_by(ReportRun.created_at.desc()).first()
+
+
+def clone_report_result(source: ReportRun, target: ReportRun) -> None:
+    for name in CACHED_REPORT_FIELDS:
+        setattr(target, name, getattr(source, name))
+    # A hit can come from a run whose "now" bounds were earlier; the copied
+    # range labels take this run's bounds.
+    start = target.start.isoformat() if target.start else None
+    end = target.end.isoformat() if target.end else None
+    if isinstance(target.summary_json, dict) and "scope" in target.summary_json:
+        target.summary_json = {
+            **target.summary_json,
+            "scope": {**target.summary_json["scope"], "start": start, "end": end},
+        }
+    meta = (target.evidence_json or {}).get("meta") or {}
+    if "range" in meta:
+        target.evidence_json = {
+            **target.evidence_json,
+            "meta": {**meta, "range": {**meta["range"], "start": start, "end": end}},
+        }
+    target.report_md = ""
+
+
+def _key_bounds(
+    db: Session,
+    payload: ReportRequest,
+    account_ids: list[str],
+    start: datetime | None,
+    end: datetime | None,
+) -> tuple[str | None, str | None]:
+    key_start = start.isoformat() if start else None
+    key_end = end.isoformat() if end else None
+    if (payload.start and payload.end) or payload.preset not in NOW_ENDED_PRESETS:
+        return key_start, key_end
+    # A bound that moves with the clock is keyed by the ledger rows it lets in:
+    # any two "now" ends past the last row select the same data.
+    first, last = ledger_span(db, account_ids, start, end)
+    key_end = f"data:{last.isoformat()}" if last else "data:none"
+    if payload.preset in ROLLING_PRESETS:
+        key_start = f"data:{first.isoformat()}" if first else "data:none"
+    return key_start, key_end
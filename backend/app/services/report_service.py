@@ -1,6 +1,6 @@
 ﻿from __future__ import annotations
 
-from collections import defaultdict
+import json
 from datetime import datetime, timedelta, timezone
 
 from sqlalchemy import func
@@ -10,26 +10,20 @@ from app.core.config import settings
 from app.core.timezone import LOCAL_TZ, now_utc
 from app.db.models import Account, BybitTradeLog, Cashflow, Fill, ReportRun, SyncRun
 from app.db.session import SessionLocal
-from app.schemas.ledger import Cashflow as CashflowSchema
-from app.schemas.ledger import Fill as FillSchema
-from app.schemas.report import ReportRequest
-from app.services.anomalies import detect_anomalies, detect_anomalies_from_trade_logs
-from app.services.evidence_builder import build_facts_and_evidence
-from app.services.metrics import (
-    compute_daily_series,
-    compute_daily_series_from_trade_logs,
-    compute_metrics,
-    compute_metrics_from_trade_logs,
-    max_drawdown,
-)
-from app.services.progress import (
-    detect_progress,
-    monthly_aggregate,
-    monthly_aggregate_from_trade_logs,
-    rolling_compare,
-    rolling_compare_from_trade_logs,
+from app.schemas.report import ReportBatchRequest, ReportRequest
+from app.services.analytics_context import LedgerAnalytics
+from app.services.chart_series import build_chart_spec
+from app.services.conversion import BaseCurrencyConverter
+from app.services.evidence_builder import (
+    FactsEvidenceResult,
+    build_facts_and_evidence,
+    build_facts_and_evidence_many,
 )
+from app.services.metrics import max_drawdown
+from app.services.report_cache import clone_report_result, find_cached_report, report_cache_key
 from app.services.report_progress_store import set_progress
+from app.storage.cache import MarketDataCache
+from app.storage.market_store import MarketDataStore
 
 PRESETS = {
     "last_7d": timedelta(days=7),
@@ -116,9 +110,141 @@ def run_report_task(report_id: str, payload: ReportRequest) -> None:
         db.close()
 
 
+def run_report_batch(db: Session, payload: ReportBatchRequest) -> list[ReportRun]:
+    # Presets for one scope share the account lookup, one ledger read over the
+    # union range, the rollup history and one market feature load.
+    items = [_batch_item(payload, preset=preset) for preset in payload.presets]
+    items += [_batch_item(payload, preset=item.preset, start=item.start, end=item.end) for item in payload.ranges]
+    if not items:
+        raise RuntimeError("presets or ranges required")
+    account_ids = _resolve_accounts(db, payload)
+    return _run_reports(db, [(item, account_ids) for item in items], payload.exchange_id, payload.include_market)
+
+
+def run_report_fan_out(db: Session, payload: ReportRequest, include_combined: bool = True) -> list[ReportRun]:
+    # One report per enabled account in scope, plus the combined one, from a
+    # single read of the ledger grouped by account in memory.
+    account_ids = _resolve_accounts(db, payload)
+    groups = [[account_id] for account_id in account_ids]
+    if include_combined and len(account_ids) != 1:
+        groups.append(account_ids)
+    return _run_reports(db, [(payload, group) for group in groups], payload.exchange_id, payload.include_market)
+
+
+def _run_reports(
+    db: Session,
+    items: list[tuple[ReportRequest, list[str]]],
+    exchange_id: str | None,
+    include_market: bool | None,
+) -> list[ReportRun]:
+    reports = []
+    pending = []
+    for item, account_ids in items:
+        start, end = resolve_range(item)
+        start, end = _resolve_data_range(db, account_ids, exchange_id, start, end)
+        report = ReportRun(
+            account_scope={"account_ids": account_ids, "exchange_id": exchange_id},
+            start=start,
+            end=end,
+            preset=item.preset,
+            net_mode=item.net_mode or "fees_only",
+            summary_json={},
+            anomalies_json=[],
+            report_md="",
+        )
+        db.add(report)
+        db.flush()
+        reports.append(report)
+        if not _reuse_cached_report(db, report, item, account_ids, start, end, progress_cb=None):
+            pending.append((report, item, account_ids, start, end))
+
+    if pending:
+        _fill_reports(db, pending, exchange_id, include_market)
+    db.commit()
+    for report in reports:
+        db.refresh(report)
+    return reports
+
+
+def _fill_reports(db: Session, pending: list[tuple], exchange_id: str | None, include_market: bool | None) -> None:
+    scope = list(dict.fromkeys(account_id for _, _, account_ids, _, _ in pending for account_id in account_ids))
+    ranges = [(start, end) for _, _, _, start, end in pending]
+    groups = [account_ids for _, _, account_ids, _, _ in pending]
+
+    # Groups read trade logs or fills/cashflows like a single report would;
+    # each source is read once for all groups using it.
+    known: dict[tuple, bool] = {}
+    for account_ids in groups:
+        key = tuple(account_ids)
+        if key not in known:
+            known[key] = _should_use_trade_logs(db, account_ids, exchange_id)
+    modes = [known[tuple(account_ids)] for account_ids in groups]
+    analytics: list[LedgerAnalytics | None] = [None] * len(pending)
+    for use_trade_logs in (True, False):
+        positions = [idx for idx, mode in enumerate(modes) if mode == use_trade_logs]
+        if not positions:
+            continue
+        converter = None
+        if not use_trade_logs:
+            converter = BaseCurrencyConverter(MarketDataCache("outputs/market_cache"), MarketDataStore(db))
+        loaded = LedgerAnalytics.load_many(
+            db,
+            list(dict.fromkeys(account_id for idx in positions for account_id in groups[idx])),
+            [ranges[idx] for idx in positions],
+            exchange_id=exchange_id,
+            use_trade_logs=use_trade_logs,
+            converter=converter,
+            account_groups=[groups[idx] for idx in positions],
+        )
+        for idx, report_analytics in zip(positions, loaded):
+            analytics[idx] = report_analytics
+
+    for (report, item, account_ids, start, end), report_analytics in zip(pending, analytics):
+        _apply_summary(report, item, account_ids, start, end, report_analytics)
+    try:
+        results = build_facts_and_evidence_many(
+            db=db,
+            account_ids=scope,
+            exchange_id=exchange_id,
+            ranges=ranges,
+            presets=[item.preset for _, item, _, _, _ in pending],
+            report_ids=[str(report.id) for report, _, _, _, _ in pending],
+            anomalies=[report_analytics.anomalies for report_analytics in analytics],
+            fetch_market=False,
+            include_market=bool(include_market),
+            account_groups=groups,
+        )
+    except Exception:  # noqa: BLE001
+        db.rollback()
+        raise
+    for (report, _, _, _, _), report_analytics, facts_result in zip(pending, analytics, results):
+        _apply_evidence(report, report_analytics.anomalies, facts_result)
+
+
+def _batch_item(payload: ReportBatchRequest, **fields) -> ReportRequest:
+    return ReportRequest(
+        account_ids=payload.account_ids,
+        exchange_id=payload.exchange_id,
+        net_mode=payload.net_mode,
+        include_market=payload.include_market,
+        **fields,
+    )
+
+
 def _resolve_scope(db: Session, payload: ReportRequest) -> tuple[list[str], datetime | None, datetime | None]:
     start, end = resolve_range(payload)
+    account_ids = _resolve_accounts(db, payload)
+    start, end = _resolve_data_range(
+        db=db,
+        account_ids=account_ids,
+        exchange_id=payload.exchange_id,
+        start=start,
+        end=end,
+    )
+    return account_ids, start, end
+
 
+def _resolve_accounts(db: Session, payload: ReportRequest | ReportBatchRequest) -> list[str]:
     accounts_query = db.query(Account).filter(Account.is_enabled.is_(True))
     if payload.account_ids:
         accounts_query = accounts_query.filter(Account.id.in_(payload.account_ids))
@@ -127,15 +253,7 @@ def _resolve_scope(db: Session, payload: ReportRequest) -> tuple[list[str], date
     accounts = accounts_query.all()
     account_ids = [str(acc.id) for acc in accounts]
     _ensure_sync_ready(db, account_ids)
-
-    start, end = _resolve_data_range(
-        db=db,
-        account_ids=account_ids,
-        exchange_id=payload.exchange_id,
-        start=start,
-        end=end,
-    )
-    return account_ids, start, end
+    return account_ids
 
 
 def _fill_report(
@@ -147,102 +265,23 @@ def _fill_report(
     end: datetime | None,
     progress_cb: callable | None,
 ) -> None:
+    if _reuse_cached_report(db, report, payload, account_ids, start, end, progress_cb):
+        return
+
     if progress_cb:
         progress_cb("load_ledger", 20, "load fills/cashflows")
 
-    use_trade_logs = _should_use_trade_logs(db, account_ids, payload.exchange_id)
-    if use_trade_logs:
-        logs_query = db.query(BybitTradeLog).filter(BybitTradeLog.account_id.in_(account_ids))
-        if payload.exchange_id:
-            logs_query = logs_query.filter(BybitTradeLog.exchange_id == payload.exchange_id)
-        if start:
-            logs_query = logs_query.filter(BybitTradeLog.ts_utc >= start)
-        if end:
-            logs_query = logs_query.filter(BybitTradeLog.ts_utc <= end)
-        trade_logs = logs_query.all()
-        period_metrics = compute_metrics_from_trade_logs(trade_logs)
-    else:
-        fills_query = db.query(Fill).filter(Fill.account_id.in_(account_ids))
-        cash_query = db.query(Cashflow).filter(Cashflow.account_id.in_(account_ids))
-
-        if start:
-            fills_query = fills_query.filter(Fill.ts_utc >= start)
-            cash_query = cash_query.filter(Cashflow.ts_utc >= start)
-        if end:
-            fills_query = fills_query.filter(Fill.ts_utc <= end)
-            cash_query = cash_query.filter(Cashflow.ts_utc <= end)
-
-        fills = [FillSchema.model_validate(row) for row in fills_query.all()]
-        cashflows = [CashflowSchema.model_validate(row) for row in cash_query.all()]
-        period_metrics = compute_metrics(fills, cashflows)
+    analytics = _load_analytics(db, account_ids, [(start, end)], payload.exchange_id)[0]
 
     if progress_cb:
         progress_cb("metrics", 40, "compute metrics")
 
-    if use_trade_logs:
-        all_logs_query = db.query(BybitTradeLog).filter(BybitTradeLog.account_id.in_(account_ids))
-        if payload.exchange_id:
-            all_logs_query = all_logs_query.filter(BybitTradeLog.exchange_id == payload.exchange_id)
-        all_trade_logs = all_logs_query.all()
-        baseline_metrics = compute_metrics_from_trade_logs(all_trade_logs)
-        monthly = monthly_aggregate_from_trade_logs(all_trade_logs)
-        progress = detect_progress(monthly)
-        rolling_30d = rolling_compare_from_trade_logs(all_trade_logs, 30)
-        rolling_14d = rolling_compare_from_trade_logs(all_trade_logs, 14)
-        anomalies = detect_anomalies_from_trade_logs(trade_logs)
-    else:
-        all_fills = [
-            FillSchema.model_validate(row)
-            for row in db.query(Fill).filter(Fill.account_id.in_(account_ids)).all()
-        ]
-        all_cash = [
-            CashflowSchema.model_validate(row)
-            for row in db.query(Cashflow).filter(Cashflow.account_id.in_(account_ids)).all()
-        ]
-        baseline_metrics = compute_metrics(all_fills, all_cash)
-        monthly = monthly_aggregate(all_fills, all_cash)
-        progress = detect_progress(monthly)
-        rolling_30d = rolling_compare(all_fills, all_cash, 30)
-        rolling_14d = rolling_compare(all_fills, all_cash, 14)
-        anomalies = detect_anomalies(fills, cashflows)
+    anomalies = analytics.anomalies
 
     if progress_cb:
         progress_cb("anomalies", 55, "detect anomalies")
 
-    if use_trade_logs:
-        daily_series = compute_daily_series_from_trade_logs(trade_logs)
-    else:
-        daily_series = compute_daily_series(fills, cashflows)
-    mdd_fees = max_drawdown([v.net_after_fees for v in daily_series.values()])
-    mdd_funding = max_drawdown([v.net_after_fees_and_funding for v in daily_series.values()])
-
-    if use_trade_logs:
-        top_symbols = _top_symbol_contribution_from_trade_logs(trade_logs)
-    else:
-        top_symbols = _top_symbol_contribution(cashflows)
-
-    summary = {
-        "scope": {
-            "accounts": account_ids,
-            "start": start.isoformat() if start else None,
-            "end": end.isoformat() if end else None,
-            "preset": payload.preset,
-            "base_currency": settings.BASE_CURRENCY,
-        },
-        "baseline": baseline_metrics,
-        "period": period_metrics,
-        "max_drawdown": {
-            "net_after_fees": float(mdd_fees),
-            "net_after_fees_and_funding": float(mdd_funding),
-        },
-        "progress": progress,
-        "rolling": {"rolling_30d": rolling_30d, "rolling_14d": rolling_14d},
-        "top_symbols": top_symbols,
-    }
-
-    report.summary_json = summary
-    report.anomalies_json = anomalies
-    report.report_md = ""
+    _apply_summary(report, payload, account_ids, start, end, analytics)
 
     try:
         if progress_cb:
@@ -266,14 +305,105 @@ def _fill_report(
         db.rollback()
         raise
 
+    _apply_evidence(report, anomalies, facts_result)
+
+    if progress_cb:
+        progress_cb("finalize", 95, "finalize report")
+
+
+def _reuse_cached_report(
+    db: Session,
+    report: ReportRun,
+    payload: ReportRequest,
+    account_ids: list[str],
+    start: datetime | None,
+    end: datetime | None,
+    progress_cb: callable | None,
+) -> bool:
+    if not settings.REPORT_CACHE_ENABLED:
+        return False
+    report.cache_key = report_cache_key(db, payload, account_ids, start, end)
+    cached = find_cached_report(db, report.cache_key, exclude_id=report.id)
+    if cached is None:
+        return False
+    clone_report_result(cached, report)
+    if progress_cb:
+        progress_cb("finalize", 95, "reuse cached report")
+    return True
+
+
+def _load_analytics(
+    db: Session,
+    account_ids: list[str],
+    ranges: list[tuple[datetime | None, datetime | None]],
+    exchange_id: str | None,
+) -> list[LedgerAnalytics]:
+    use_trade_logs = _should_use_trade_logs(db, account_ids, exchange_id)
+    converter = None
+    if not use_trade_logs:
+        converter = BaseCurrencyConverter(MarketDataCache("outputs/market_cache"), MarketDataStore(db))
+    return LedgerAnalytics.load_many(
+        db,
+        account_ids,
+        ranges,
+        exchange_id=exchange_id,
+        use_trade_logs=use_trade_logs,
+        converter=converter,
+    )
+
+
+def _apply_summary(
+    report: ReportRun,
+    payload: ReportRequest,
+    account_ids: list[str],
+    start: datetime | None,
+    end: datetime | None,
+    analytics: LedgerAnalytics,
+) -> None:
+    daily_series = analytics.period_daily
+    mdd_fees = max_drawdown([v.net_after_fees for v in daily_series.values()])
+    mdd_funding = max_drawdown([v.net_after_fees_and_funding for v in daily_series.values()])
+    trade_curve = analytics.trade_curve
+    wallet_curve = analytics.wallet_curve
+
+    summary = {
+        "scope": {
+            "accounts": account_ids,
+            "start": start.isoformat() if start else None,
+            "end": end.isoformat() if end else None,
+            "preset": payload.preset,
+            "base_currency": settings.BASE_CURRENCY,
+        },
+        "baseline": analytics.baseline_metrics,
+        "period": analytics.period_metrics,
+        "max_drawdown": {
+            "net_after_fees": float(mdd_fees),
+            "net_after_fees_and_funding": float(mdd_funding),
+        },
+        "equity_curve": {
+            "trade_level": trade_curve.drawdown_stats(),
+            "wallet_balance": wallet_curve.drawdown_stats() if wallet_curve is not None else None,
+        },
+        "progress": analytics.progress,
+        "rolling": {"rolling_30d": analytics.rolling(30), "rolling_14d": analytics.rolling(14)},
+        "top_symbols": analytics.top_symbols,
+    }
+
+    report.summary_json = summary
+    report.chart_spec_json = json.dumps(
+        build_chart_spec(trade_curve, daily_series, settings.CHART_POINT_BUDGET), ensure_ascii=False
+    )
+    report.anomalies_json = analytics.anomalies
+    report.report_md = ""
+
+
+def _apply_evidence(report: ReportRun, anomalies: list[dict], facts_result: FactsEvidenceResult) -> None:
+    report.anomalies_json = anomalies + facts_result.trade_anomalies
     report.facts_path = facts_result.facts_path
     report.evidence_path = facts_result.evidence_path
     report.evidence_json = facts_result.evidence_json
     report.schema_version = facts_result.evidence_json.get("schema_version")
 
-    if progress_cb:
-        progress_cb("finalize", 95, "finalize report")
-
 
 def _ensure_sync_ready(db: Session, account_ids: list[str]) -> None:
     if not account_ids:
@@ -321,32 +451,6 @@ def _resolve_data_range(
     return start or min_ts, end or max_ts
 
 
-def _top_symbol_contribution(cashflows: list[CashflowSchema]) -> list[dict]:
-    totals = defaultdict(float)
-    for cf in cashflows:
-        if cf.symbol:
-            totals[cf.symbol] += float(cf.amount)
-    ranked = sorted(totals.items(), key=lambda kv: abs(kv[1]), reverse=True)
-    return [{"symbol": sym, "amount": amt} for sym, amt in ranked[:5]]
-
-
-def _top_symbol_contribution_from_trade_logs(trade_logs: list[BybitTradeLog]) -> list[dict]:
-    totals = defaultdict(float)
-    for row in trade_logs:
-        if not row.contract:
-            continue
-        if "TRADE" not in (row.type or "").upper():
-            continue
-        amount = 0.0
-        try:
-            amount = float(row.change or 0)
-        except (TypeError, ValueError):
-            amount = 0.0
-        totals[row.contract] += amount
-    ranked = sorted(totals.items(), key=lambda kv: abs(kv[1]), reverse=True)
-    return [{"symbol": sym, "amount": amt} for sym, amt in ranked[:5]]
-
-
 def _should_use_trade_logs(db: Session, account_ids: list[str], exchange_id: str | None) -> bool:
     if exchange_id and exchange_id != "bybit":
         return False
@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.inserts import insert_ignoring_conflicts
+from app.db.models import BybitTradeLog, Cashflow, DailyRollup, Fill, MonthlySnapshot, RollupBackfill
+from app.services.conversion import BaseCurrencyConverter
+from app.services.ledger_columns import fixed_sums
+
+
+ROLLUP_SOURCE_LEDGER = "ledger"
+ROLLUP_SOURCE_TRADE_LOGS = "trade_logs"
+ROLLUP_KEYS = ["exchange_id", "day", "symbol", "asset"]
+ROLLUP_COUNTS = ["trades", "open_trades", "commission_flows", "cashflows"]
+ROLLUP_AMOUNTS = [
+    "turnover",
+    "fill_fees",
+    "realized_pnl",
+    "open_turnover",
+    "open_fees",
+    "open_pnl",
+    "commission",
+    "borrow_interest",
+    "rebates",
+    "funding",
+    "other_cashflow",
+]
+# Amounts denominated in the row's asset; turnover is always quote notional.
+ROLLUP_ASSET_AMOUNTS = [
+    "fill_fees",
+    "realized_pnl",
+    "open_fees",
+    "open_pnl",
+    "commission",
+    "borrow_interest",
+    "rebates",
+    "funding",
+    "other_cashflow",
+]
+KNOWN_CASHFLOW_TYPES = ("commission", "borrow_interest", "rebate", "funding", "realized_pnl")
+
+
+def refresh_rollups_for_rows(db: Session, source: str, rows: list[dict]) -> int:
+    spans: dict = {}
+    for row in rows:
+        day = _utc_day(row["ts_utc"])
+        first, last = spans.get(row["account_id"], (day, day))
+        spans[row["account_id"]] = (min(first, day), max(last, day))
+    return sum(refresh_daily_rollups(db, account_id, source, first, last) for account_id, (first, last) in spans.items())
+
+
+def refresh_daily_rollups(db: Session, account_id, source: str, first_day: date, last_day: date) -> int:
+    start = datetime.combine(first_day, time.min)
+    end = datetime.combine(last_day + timedelta(days=1), time.min)
+    if source == ROLLUP_SOURCE_TRADE_LOGS:
+        frame = _trade_log_rollups(db, account_id, start, end)
+    else:
+        frame = _ledger_rollups(db, account_id, start, end)
+
+    db.query(DailyRollup).filter(
+        DailyRollup.account_id == account_id,
+        DailyRollup.source == source,
+        DailyRollup.day >= first_day,
+        DailyRollup.day <= last_day,
+    ).delete(synchronize_session=False)
+    # A late write into a closed month thaws its frozen snapshot.
+    db.query(MonthlySnapshot).filter(
+        MonthlySnapshot.account_id == account_id,
+        MonthlySnapshot.source == source,
+        MonthlySnapshot.month.in_(_months_between(first_day, last_day)),
+    ).delete(synchronize_session=False)
+    if frame.empty:
+        return 0
+    frame = frame.assign(account_id=account_id, source=source, updated_at=datetime.utcnow())
+    records = frame.to_dict("records")
+    insert_ignoring_conflicts(db, DailyRollup, records, ["account_id", "source", "day", "symbol", "asset"])
+    return len(records)
+
+
+def ensure_daily_rollups(db: Session, account_ids: list, source: str) -> None:
+    # Syncs and imports only roll up the days they write, so each account's
+    # full history is rolled up once on first read and recorded as backfilled.
+    # The caller owns the transaction; rows are only flushed here.
+    tables = [BybitTradeLog] if source == ROLLUP_SOURCE_TRADE_LOGS else [Fill, Cashflow]
+    backfilled = {
+        str(account_id)
+        for (account_id,) in db.query(RollupBackfill.account_id).filter(
+            RollupBackfill.account_id.in_(account_ids), RollupBackfill.source == source
+        )
+    }
+    marks = []
+    for account_id in account_ids:
+        if str(account_id) in backfilled:
+            continue
+        spans = []
+        for table in tables:
+            first, last = (
+                db.query(func.min(table.ts_utc), func.max(table.ts_utc))
+                .filter(table.account_id == account_id)
+                .one()
+            )
+            if first is not None:
+                spans.append((_utc_day(first), _utc_day(last)))
+        if spans:
+            first_day = min(span[0] for span in spans)
+            last_day = max(span[1] for span in spans)
+            refresh_daily_rollups(db, account_id, source, first_day, last_day)
+        marks.append({"account_id": account_id, "source": source, "completed_at": datetime.utcnow()})
+    if marks:
+        insert_ignoring_conflicts(db, RollupBackfill, marks, ["account_id", "source"])
+        db.flush()
+
+
+def load_daily_rollups(
+    db: Session,
+    account_ids: list,
+    source: str,
+    exchange_id: str | None = None,
+    converter: BaseCurrencyConverter | None = None,
+) -> pd.DataFrame:
+    ensure_daily_rollups(db, account_ids, source)
+    conditions = [DailyRollup.account_id.in_(account_ids)]
+    if exchange_id:
+        conditions.append(DailyRollup.exchange_id == exchange_id)
+    return query_daily_rollups(db, source, conditions, converter)
+
+
+def query_daily_rollups(
+    db: Session,
+    source: str,
+    conditions: list,
+    converter: BaseCurrencyConverter | None = None,
+) -> pd.DataFrame:
+    columns = ["account_id"] + ROLLUP_KEYS + ROLLUP_COUNTS + ROLLUP_AMOUNTS
+    query = db.query(*[getattr(DailyRollup, name) for name in columns]).filter(
+        DailyRollup.source == source,
+        *conditions,
+    )
+    frame = pd.DataFrame(query.all(), columns=columns)
+    frame["account_id"] = frame["account_id"].astype(str)
+    # Amounts stay Decimal so metrics sum the stored numeric totals exactly.
+    for name in ROLLUP_AMOUNTS:
+        frame[name] = frame[name].map(rollup_amount).astype(object)
+    frame[ROLLUP_COUNTS] = frame[ROLLUP_COUNTS].astype(np.int64)
+    frame["source"] = source
+    if converter is None:
+        return mark_converted(frame, settings.BASE_CURRENCY)
+    # Rollups keep one row per asset and day, so the day's midpoint rate
+    # stands in for the per-row timestamps.
+    days = pd.to_datetime(frame["day"].astype(str), utc=True)
+    midday_ms = (days + pd.Timedelta(hours=12)).dt.as_unit("ms").astype("int64").to_numpy()
+    return convert_rollup_amounts(frame, converter, midday_ms)
+
+
+def rollup_amount(value) -> Decimal:
+    if value is None or pd.isna(value):
+        return Decimal("0")
+    if isinstance(value, Decimal):
+        return value
+    # Snapshots hold totals as strings; floats go through their shortest repr.
+    return Decimal(value) if isinstance(value, str) else Decimal(repr(float(value)))
+
+
+def mark_converted(frame: pd.DataFrame, base: str) -> pd.DataFrame:
+    asset = frame["asset"].fillna("").astype(str)
+    frame["asset"] = asset
+    frame["converted"] = (asset == "") | (asset == base)
+    return frame
+
+
+def convert_rollup_amounts(frame: pd.DataFrame, converter: BaseCurrencyConverter, times_ms: np.ndarray) -> pd.DataFrame:
+    frame = mark_converted(frame, converter.base)
+    pending = np.flatnonzero(~frame["converted"].to_numpy())
+    if pending.size:
+        rates = converter.rates(frame["asset"].iloc[pending].to_numpy(), np.asarray(times_ms)[pending])
+        found = np.isfinite(rates)
+        rows = frame.index[pending[found]]
+        factors = np.array([Decimal(repr(float(rate))) for rate in rates[found]], dtype=object)[:, None]
+        amounts = frame.loc[rows, ROLLUP_ASSET_AMOUNTS].map(rollup_amount).to_numpy()
+        frame[ROLLUP_ASSET_AMOUNTS] = frame[ROLLUP_ASSET_AMOUNTS].astype(object)
+        frame.loc[rows, ROLLUP_ASSET_AMOUNTS] = amounts * factors
+        frame.loc[rows, "asset"] = converter.base
+        frame.loc[rows, "converted"] = True
+    return frame
+
+
+def _ledger_rollups(db: Session, account_id, start: datetime, end: datetime) -> pd.DataFrame:
+    fills = pd.DataFrame(
+        db.query(Fill.ts_utc, Fill.exchange_id, Fill.symbol, Fill.fee_asset, Fill.notional, Fill.fee)
+        .filter(Fill.account_id == account_id, Fill.ts_utc >= start, Fill.ts_utc < end)
+        .all(),
+        columns=["ts_utc", "exchange_id", "symbol", "asset", "notional", "fee"],
+    )
+    cash = pd.DataFrame(
+        db.query(Cashflow.ts_utc, Cashflow.exchange_id, Cashflow.symbol, Cashflow.asset, Cashflow.type, Cashflow.amount)
+        .filter(Cashflow.account_id == account_id, Cashflow.ts_utc >= start, Cashflow.ts_utc < end)
+        .all(),
+        columns=["ts_utc", "exchange_id", "symbol", "asset", "type", "amount"],
+    )
+    parts = []
+    if not fills.empty:
+        parts.append(
+            _keyed(fills).assign(
+                turnover=fills["notional"].astype(float),
+                trades=1,
+                fill_fees=fills["fee"].astype(float).abs(),
+            )
+        )
+    if not cash.empty:
+        kind = cash["type"].fillna("").astype(str)
+        amount = cash["amount"].astype(float)
+        parts.append(
+            _keyed(cash).assign(
+                commission=amount.abs().where(kind == "commission", 0.0),
+                commission_flows=(kind == "commission").astype(np.int64),
+                borrow_interest=amount.abs().where(kind == "borrow_interest", 0.0),
+                rebates=amount.where(kind == "rebate", 0.0),
+                funding=amount.where(kind == "funding", 0.0),
+                realized_pnl=amount.where(kind == "realized_pnl", 0.0),
+                other_cashflow=amount.where(~kind.isin(KNOWN_CASHFLOW_TYPES), 0.0),
+                cashflows=1,
+            )
+        )
+    return _aggregate(parts)
+
+
+def _trade_log_rollups(db: Session, account_id, start: datetime, end: datetime) -> pd.DataFrame:
+    logs = pd.DataFrame(
+        db.query(
+            BybitTradeLog.ts_utc,
+            BybitTradeLog.exchange_id,
+            BybitTradeLog.contract,
+            BybitTradeLog.currency,
+            BybitTradeLog.type_norm,
+            BybitTradeLog.action_norm,
+            BybitTradeLog.quantity_num,
+            BybitTradeLog.filled_price_num,
+            BybitTradeLog.fee_paid_num,
+            BybitTradeLog.change_num,
+            BybitTradeLog.funding_num,
+        )
+        .filter(BybitTradeLog.account_id == account_id, BybitTradeLog.ts_utc >= start, BybitTradeLog.ts_utc < end)
+        .all(),
+        columns=[
+            "ts_utc",
+            "exchange_id",
+            "symbol",
+            "asset",
+            "type",
+            "action",
+            "quantity",
+            "filled_price",
+            "fee_paid",
+            "change",
+            "funding",
+        ],
+    )
+    if logs.empty:
+        return _aggregate([])
+    kind = logs["type"]
+    action = logs["action"]
+    is_trade = kind.str.contains("TRADE", regex=False)
+    is_close = is_trade & action.str.contains("CLOSE", regex=False)
+    is_open = is_trade & ~is_close
+    is_settlement = kind.str.contains("SETTLEMENT", regex=False)
+
+    turnover = _log_numeric(logs["quantity"]) * _log_numeric(logs["filled_price"])
+    fee_paid = _log_numeric(logs["fee_paid"]).abs()
+    change = _log_numeric(logs["change"])
+    keep = is_trade | is_settlement
+    frame = _keyed(logs).assign(
+        turnover=turnover.where(is_close, 0.0),
+        trades=is_close.astype(np.int64),
+        fill_fees=fee_paid.where(is_close, 0.0),
+        realized_pnl=change.where(is_close, 0.0),
+        open_turnover=turnover.where(is_open, 0.0),
+        open_trades=is_open.astype(np.int64),
+        open_fees=fee_paid.where(is_open, 0.0),
+        open_pnl=change.where(is_open, 0.0),
+        funding=_log_numeric(logs["funding"]).where(is_settlement, 0.0),
+    )
+    return _aggregate([frame[keep.to_numpy()]])
+
+
+def _keyed(rows: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "exchange_id": rows["exchange_id"].fillna("").astype(str),
+            "day": pd.to_datetime(rows["ts_utc"], utc=True).dt.date,
+            "symbol": rows["symbol"].fillna("").astype(str),
+            "asset": rows["asset"].fillna("").astype(str),
+        },
+        index=rows.index,
+    )
+
+
+def _aggregate(parts: list[pd.DataFrame]) -> pd.DataFrame:
+    parts = [part for part in parts if not part.empty]
+    if not parts:
+        return pd.DataFrame(columns=ROLLUP_KEYS + ROLLUP_COUNTS + ROLLUP_AMOUNTS)
+    frame = pd.concat(parts, ignore_index=True)
+    for name in ROLLUP_COUNTS:
+        frame[name] = frame[name].fillna(0).astype(np.int64) if name in frame else 0
+    for name in ROLLUP_AMOUNTS:
+        frame[name] = frame[name].fillna(0.0).astype(float) if name in frame else 0.0
+    groups = frame.groupby(ROLLUP_KEYS, sort=True)
+    grouped = groups[ROLLUP_COUNTS].sum().reset_index()
+    for name in ROLLUP_COUNTS:
+        grouped[name] = grouped[name].astype(int)
+    # Amounts are summed exactly so the numeric columns hold Decimal totals.
+    codes = groups.ngroup().to_numpy()
+    for name in ROLLUP_AMOUNTS:
+        grouped[name] = fixed_sums(frame[name].to_numpy(), codes, len(grouped))
+    return grouped
+
+
+def _log_numeric(values: pd.Series) -> pd.Series:
+    return values.astype(float).fillna(0.0)
+
+
+def _months_between(first_day: date, last_day: date) -> list[str]:
+    months = pd.period_range(first_day.replace(day=1), last_day.replace(day=1), freq="M")
+    return [str(month) for month in months]
+
+
+def _utc_day(value: datetime) -> date:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date()
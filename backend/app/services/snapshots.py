@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.timezone import now_utc
+from app.db.inserts import insert_ignoring_conflicts
+from app.db.models import DailyRollup, MonthlySnapshot
+from app.services.conversion import BaseCurrencyConverter
+from app.services.progress import monthly_aggregate_from_rollups
+from app.services.rollups import (
+    ROLLUP_AMOUNTS,
+    ROLLUP_COUNTS,
+    ensure_daily_rollups,
+    query_daily_rollups,
+    rollup_amount,
+)
+
+
+SNAPSHOT_KEYS = ["day", "exchange_id", "asset", "converted"]
+
+
+def load_rollups_with_snapshots(
+    db: Session,
+    account_ids: list,
+    source: str,
+    exchange_id: str | None = None,
+    converter: BaseCurrencyConverter | None = None,
+) -> tuple[pd.DataFrame, dict[str, dict]]:
+    # Closed months come from frozen per-account snapshots; only the current
+    # month and months thawed by a late write are read from the rollups.
+    ensure_daily_rollups(db, account_ids, source)
+    base = converter.base if converter is not None else settings.BASE_CURRENCY
+    current_start = now_utc().date().replace(day=1)
+    current = current_start.strftime("%Y-%m")
+
+    snapshots = (
+        db.query(MonthlySnapshot)
+        .filter(
+            MonthlySnapshot.account_id.in_(account_ids),
+            MonthlySnapshot.source == source,
+            MonthlySnapshot.base_currency == base,
+            MonthlySnapshot.month < current,
+        )
+        .all()
+    )
+    frozen = {(str(snapshot.account_id), snapshot.month) for snapshot in snapshots}
+    first_days = (
+        db.query(DailyRollup.account_id, func.min(DailyRollup.day))
+        .filter(DailyRollup.account_id.in_(account_ids), DailyRollup.source == source)
+        .group_by(DailyRollup.account_id)
+        .all()
+    )
+    missing = []
+    for account_id, first_day in first_days:
+        if first_day is None or first_day >= current_start:
+            continue
+        for month in pd.period_range(first_day, current_start - timedelta(days=1), freq="M"):
+            if (str(account_id), str(month)) not in frozen:
+                missing.append((account_id, month))
+
+    windows = [DailyRollup.day >= current_start]
+    for account_id, month in missing:
+        windows.append(
+            and_(
+                DailyRollup.account_id == account_id,
+                DailyRollup.day >= month.start_time.date(),
+                DailyRollup.day <= month.end_time.date(),
+            )
+        )
+    live = query_daily_rollups(db, source, [DailyRollup.account_id.in_(account_ids), or_(*windows)], converter)
+    live_months = pd.to_datetime(live["day"].astype(str)).dt.strftime("%Y-%m")
+
+    parts = [_expand(snapshot) for snapshot in snapshots]
+    frozen_rows = []
+    for account_id, month in missing:
+        rows = live[(live["account_id"] == str(account_id)) & (live_months == str(month))]
+        daily = _compact(rows)
+        summaries = monthly_aggregate_from_rollups(rows)
+        record = {
+            "account_id": account_id,
+            "source": source,
+            "month": str(month),
+            "base_currency": base,
+            "metrics": summaries[0].metrics if summaries else {},
+            "daily": daily,
+            "updated_at": datetime.utcnow(),
+        }
+        snapshot = MonthlySnapshot(**record)
+        # Rows still waiting on a conversion rate stay live until market data fills in.
+        if converter is None or bool(rows["converted"].all()):
+            frozen_rows.append(record)
+            snapshots.append(snapshot)
+        parts.append(_expand(snapshot))
+    # Concurrent reports may freeze the same month; the caller owns the commit.
+    insert_ignoring_conflicts(db, MonthlySnapshot, frozen_rows, ["account_id", "source", "month", "base_currency"])
+
+    parts.append(live[(live_months == current).to_numpy()])
+    rollups = pd.concat([part for part in parts if not part.empty] or [live.iloc[:0]], ignore_index=True)
+    if exchange_id:
+        rollups = rollups[rollups["exchange_id"] == exchange_id].reset_index(drop=True)
+
+    # Stored monthly metrics only describe the scope when it is that one account.
+    if len(account_ids) != 1 or exchange_id:
+        return rollups, {}
+    return rollups, {snapshot.month: snapshot.metrics for snapshot in snapshots if snapshot.daily}
+
+
+def _compact(rows: pd.DataFrame) -> list[dict]:
+    if rows.empty:
+        return []
+    amounts = {name: rows[name].map(rollup_amount) for name in ROLLUP_AMOUNTS}
+    grouped = rows.assign(**amounts).groupby(SNAPSHOT_KEYS, sort=True, as_index=False)[ROLLUP_COUNTS + ROLLUP_AMOUNTS].sum()
+    grouped["day"] = grouped["day"].astype(str)
+    # Decimal totals are stored as strings so the JSON keeps every digit.
+    for name in ROLLUP_AMOUNTS:
+        grouped[name] = grouped[name].map(str)
+    return grouped.to_dict("records")
+
+
+def _expand(snapshot: MonthlySnapshot) -> pd.DataFrame:
+    frame = pd.DataFrame(snapshot.daily, columns=SNAPSHOT_KEYS + ROLLUP_COUNTS + ROLLUP_AMOUNTS)
+    frame["day"] = [date.fromisoformat(day) for day in frame["day"]]
+    frame["converted"] = frame["converted"].astype(bool)
+    for name in ROLLUP_AMOUNTS:
+        frame[name] = frame[name].map(rollup_amount).astype(object)
+    return frame.assign(account_id=str(snapshot.account_id), symbol="", source=snapshot.source)
@@ -14,6 +14,7 @@ from app.core.crypto import decrypt_dict
 from app.db.models import Account, Cashflow, Fill, SyncRun
 from app.plugins.registry import get_adapter
 from app.schemas.report import ReportRequest
+from app.services.rollups import ROLLUP_SOURCE_LEDGER, refresh_rollups_for_rows
 
 
 PRESETS = {
@@ -134,6 +135,7 @@ def _sync_kind(
 
             rows = [item.model_dump() for item in items]
             total += _insert_ignore(db, model, rows)
+            refresh_rollups_for_rows(db, ROLLUP_SOURCE_LEDGER, rows)
             db.commit()
             if not cursor:
                 break
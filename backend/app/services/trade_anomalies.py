@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+TRADE_ANOMALY_WINDOW = 50
+TRADE_ANOMALY_Z = 3.5
+TRADE_ANOMALY_LIMIT = 20
+BURST_WINDOW_MS = 30 * 60 * 1000
+BURST_MIN_TRADES = 3
+MAD_SCALE = 0.6745
+
+
+def detect_trade_anomalies(
+    facts: pd.DataFrame,
+    window: int = TRADE_ANOMALY_WINDOW,
+    threshold: float = TRADE_ANOMALY_Z,
+    limit: int = TRADE_ANOMALY_LIMIT,
+) -> list[dict]:
+    if facts.empty or len(facts) <= window:
+        return []
+    close_time = facts["close_time"].to_numpy(dtype=np.int64)
+    symbol = facts["symbol"].astype(str).to_numpy()
+    pnl = pd.to_numeric(facts["pnl_net"], errors="coerce").fillna(0).to_numpy(dtype=float)
+    fee = _column(facts, "fee")
+    fee_bps = _column(facts, "fee_bps")
+    turnover = _column(facts, "turnover")
+    holding = _column(facts, "holding_seconds")
+    if "open_time" in facts.columns:
+        open_time = pd.to_numeric(facts["open_time"], errors="coerce").fillna(0).to_numpy(dtype=float)
+        holding = np.where(open_time > 0, holding, np.nan)
+
+    candidates = []
+
+    # Fee and size are judged against the same symbol's recent trades.
+    symbol_codes, _ = pd.factorize(symbol, sort=True)
+    by_symbol = np.lexsort((close_time, symbol_codes))
+    symbol_groups = symbol_codes[by_symbol]
+    z, median = _rolling_robust_z(fee_bps[by_symbol], symbol_groups, window)
+    candidates.append(("TRADE_FEE_BPS_SPIKE", by_symbol, z, fee_bps[by_symbol], median, fee[by_symbol]))
+    z, median = _rolling_robust_z(np.log1p(np.maximum(turnover[by_symbol], 0)), symbol_groups, window)
+    candidates.append(("TRADE_SIZE_SPIKE", by_symbol, z, turnover[by_symbol], np.expm1(median), pnl[by_symbol]))
+
+    # Holding time and post-loss bursts are account-wide behaviour.
+    by_time = np.argsort(close_time, kind="stable")
+    account_groups = np.zeros(len(by_time), dtype=np.int64)
+    z, median = _rolling_robust_z(np.log1p(np.maximum(holding[by_time], 0)), account_groups, window)
+    candidates.append(("TRADE_HOLDING_OUTLIER", by_time, z, holding[by_time], np.expm1(median), pnl[by_time]))
+
+    times = close_time[by_time]
+    pnl_sorted = pnl[by_time]
+    burst_end = np.searchsorted(times, times + BURST_WINDOW_MS, side="right")
+    follow_count = (burst_end - np.arange(len(times)) - 1).astype(float)
+    cum_pnl = np.concatenate(([0.0], np.cumsum(pnl_sorted)))
+    follow_pnl = cum_pnl[burst_end] - cum_pnl[np.arange(len(times)) + 1]
+    z, median = _rolling_robust_z(follow_count, account_groups, window)
+    z = np.where((pnl_sorted < 0) & (follow_count >= BURST_MIN_TRADES), z, np.nan)
+    candidates.append(("TRADE_BURST_AFTER_LOSS", by_time, z, follow_count, median, follow_pnl))
+
+    anomalies = []
+    for code, order, z, values, median, impact in candidates:
+        flagged = np.flatnonzero(np.isfinite(z) & (z >= threshold))
+        for pos in flagged[np.argsort(-z[flagged], kind="stable")][:limit]:
+            row = order[pos]
+            anomalies.append(
+                {
+                    "code": code,
+                    "severity": "high" if z[pos] >= 2 * threshold else "medium",
+                    "window": {"start": _iso(close_time[row]), "end": _iso(close_time[row])},
+                    "evidence": {
+                        "trade": {"symbol": symbol[row], "close_time": int(close_time[row])},
+                        "value": float(values[pos]),
+                        "rolling_median": float(median[pos]),
+                        "robust_z": float(z[pos]),
+                    },
+                    "impact": {"amount": float(impact[pos])},
+                }
+            )
+    anomalies.sort(key=lambda item: item["evidence"]["robust_z"], reverse=True)
+    return anomalies[:limit]
+
+
+def _rolling_robust_z(values: np.ndarray, groups: np.ndarray, window: int) -> tuple[np.ndarray, np.ndarray]:
+    # Modified z-score of each value against the median/MAD of the `window`
+    # known values before it in the same group; `groups` must be sorted.
+    z = np.full(len(values), np.nan)
+    median = np.full(len(values), np.nan)
+    known = np.flatnonzero(np.isfinite(values))
+    if len(known) <= window:
+        return z, median
+    known_values = values[known]
+    known_groups = groups[known]
+    group_start = np.searchsorted(known_groups, known_groups, side="left")
+    target = np.arange(window, len(known))
+    valid = target - window >= group_start[target]
+    if not valid.any():
+        return z, median
+    history = sliding_window_view(known_values[:-1], window)
+    target = target[valid]
+    work = history[valid]
+    med = _row_medians(work)
+    np.subtract(history[valid], med[:, None], out=work)
+    np.abs(work, out=work)
+    mad = _row_medians(work)
+    scale = np.maximum(mad, 1e-9 * np.maximum(np.abs(med), 1.0))
+    z[known[target]] = MAD_SCALE * (known_values[target] - med) / scale
+    median[known[target]] = med
+    return z, median
+
+
+def _row_medians(work: np.ndarray) -> np.ndarray:
+    # Partitions `work` in place; an even width averages the two middle values.
+    width = work.shape[1]
+    mid = width // 2
+    if width % 2:
+        work.partition(mid, axis=1)
+        return work[:, mid].copy()
+    work.partition((mid - 1, mid), axis=1)
+    return (work[:, mid - 1] + work[:, mid]) / 2
+
+
+def _column(facts: pd.DataFrame, name: str) -> np.ndarray:
+    if name not in facts.columns:
+        return np.full(len(facts), np.nan)
+    return pd.to_numeric(facts[name], errors="coerce").to_numpy(dtype=float)
+
+
+def _iso(ms: int) -> str:
+    return datetime.fromtimestamp(int(ms) / 1000, tz=timezone.utc).isoformat()
@@ -1,8 +1,15 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
 from decimal import Decimal
 
+import numpy as np
+import pandas as pd
+
 from app.schemas.ledger import Cashflow, Fill
+from app.services.analytics_context import LedgerAnalytics
 from app.services.anomalies import detect_anomalies
+from app.services.ledger_columns import LedgerColumns
+from app.services.trade_anomalies import MAD_SCALE, _rolling_robust_z, detect_trade_anomalies
 
 
 def test_fee_eats_profit():
@@ -34,3 +41,88 @@ def test_fee_eats_profit():
     ]
     anomalies = detect_anomalies(fills, cashflows)
     assert any(a["code"] == "FEE_EATS_PROFIT" for a in anomalies)
+
+
+def test_ledger_analytics_reuses_period_series_for_anomalies():
+    account_id = uuid4()
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    fills = []
+    cashflows = []
+    for day in range(10):
+        ts = start + timedelta(days=day)
+        fee = Decimal("30") if day == 9 else Decimal("1")
+        fills.append(
+            Fill(
+                ts_utc=ts,
+                exchange_id="okx",
+                account_id=account_id,
+                account_type="swap",
+                symbol="BTC-USDT-SWAP",
+                side="buy",
+                price=Decimal("100"),
+                qty=Decimal("1"),
+                notional=Decimal("100"),
+                fee=fee,
+                fee_asset="USDT",
+            )
+        )
+        cashflows.append(
+            Cashflow(
+                ts_utc=ts,
+                exchange_id="okx",
+                account_id=account_id,
+                account_type="swap",
+                type="realized_pnl",
+                amount=Decimal("2"),
+                asset="USDT",
+                symbol="BTC-USDT-SWAP",
+            )
+        )
+    analytics = LedgerAnalytics(pd.DataFrame(), ledger=LedgerColumns.from_ledger(fills, cashflows))
+
+    assert analytics.anomalies == detect_anomalies(fills, cashflows)
+    assert analytics.period_daily is analytics.period_daily
+    assert analytics.period_metrics["trades"] == 10
+
+
+def test_trade_level_detectors_rank_spikes_with_trade_refs():
+    rng = np.random.default_rng(3)
+    n = 400
+    facts = pd.DataFrame(
+        {
+            "close_time": np.arange(n) * 3_600_000,
+            "symbol": "ETHUSDT",
+            "pnl_net": rng.normal(0, 1, n),
+            "fee": 0.1,
+            "fee_bps": rng.normal(5.5, 0.1, n),
+            "turnover": rng.normal(1_000, 20, n),
+            "holding_seconds": rng.normal(600, 30, n),
+            "open_time": 1,
+        }
+    )
+    facts.loc[300, "fee_bps"] = 30.0
+    facts.loc[350, "turnover"] = 50_000.0
+    found = detect_trade_anomalies(facts)
+    codes = {item["code"]: item for item in found}
+    assert codes["TRADE_FEE_BPS_SPIKE"]["evidence"]["trade"]["close_time"] == 300 * 3_600_000
+    assert codes["TRADE_SIZE_SPIKE"]["evidence"]["value"] == 50_000.0
+    scores = [item["evidence"]["robust_z"] for item in found]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_rolling_robust_z_matches_pandas_rolling_median():
+    rng = np.random.default_rng(9)
+    values = np.round(rng.normal(0, 1, 300), 1)
+    values[rng.integers(0, 300, 20)] = np.nan
+    groups = np.repeat([0, 1, 2], 100)
+    for window in (8, 9):
+        z, median = _rolling_robust_z(values, groups, window)
+        for group in range(3):
+            rows = np.flatnonzero((groups == group) & np.isfinite(values))
+            known = pd.Series(values[rows])
+            history = known.shift(1).rolling(window)
+            expected_median = history.median()
+            expected_mad = history.apply(lambda x: np.median(np.abs(x - np.median(x))), raw=True)
+            expected_z = MAD_SCALE * (known - expected_median) / expected_mad
+            assert np.allclose(median[rows], expected_median, equal_nan=True)
+            assert np.allclose(z[rows], expected_z, equal_nan=True)
@@ -1,11 +1,23 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone
+from uuid import uuid4
 
+import numpy as np
 import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
 
-from app.attribution.joiner import build_trade_attribution_table
+from app.attribution.joiner import (
+    _asof_mark_slippage,
+    build_trade_attribution_table,
+    build_trade_attribution_tables,
+)
 from app.connectors.binance_um import BinanceUMClient
+from app.core.config import settings
+from app.db import models
+from app.services.attribution_report import _build_bybit_df_from_db, _build_bybit_dfs_from_db
+from app.services.imports import parse_bybit_transaction_log_rows
 from app.storage.cache import MarketDataCache
 
 
@@ -165,3 +177,163 @@ def test_funding_not_double_counted(tmp_path):
     end_ms = int(datetime(2026, 1, 5, tzinfo=timezone.utc).timestamp() * 1000)
     result = build_trade_attribution_table(df, client, cache, start_ms, end_ms, ["ETHUSDT"])
     assert abs(result["funding"].sum() + 5.0) < 1e-6
+
+
+def test_parallel_market_features_match_serial(tmp_path):
+    cache = MarketDataCache(tmp_path)
+    start_ms = int(datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+    end_ms = int(datetime(2026, 1, 2, tzinfo=timezone.utc).timestamp() * 1000)
+    rows = []
+    for i, symbol in enumerate(["ETHUSDT", "BTCUSDT"]):
+        for interval, step in (("1m", 60_000), ("5m", 300_000), ("1h", 3_600_000)):
+            times = range(start_ms - 86_400_000, end_ms, step)
+            klines = pd.DataFrame(
+                {
+                    "symbol": symbol,
+                    "open_time": list(times),
+                    "open": 100.0,
+                    "high": [101.0 + (t // step) % 7 for t in times],
+                    "low": 99.0,
+                    "close": [100.0 + i + (t // step) % 5 for t in times],
+                }
+            )
+            cache.save("klines", symbol, interval, klines)
+        for hour in range(1, 20, 3):
+            rows.append(
+                {
+                    "Contract": symbol,
+                    "Type": "TRADE",
+                    "Direction": "BUY",
+                    "Quantity": "1",
+                    "Filled Price": "2000",
+                    "Funding": "0",
+                    "Fee Paid": "-1",
+                    "Change": str(hour - 10),
+                    "Action": "CLOSE",
+                    "Time": f"2026-01-01 {hour:02d}:00:00.000",
+                }
+            )
+    df = pd.DataFrame(rows)
+    df["Time"] = pd.to_datetime(df["Time"], utc=True)
+    df["time_ms"] = (df["Time"].astype("int64") // 1_000_000).astype("int64")
+    df["symbol"] = df["Contract"]
+    df["action_norm"] = df["Action"].str.upper()
+    df["type_norm"] = df["Type"].str.upper()
+    df["direction_norm"] = df["Direction"].str.upper()
+
+    client = _dummy_client()
+    symbols = ["ETHUSDT", "BTCUSDT"]
+    serial = build_trade_attribution_table(df, client, cache, start_ms, end_ms, symbols, fetch_market=False, workers=1)
+    parallel = build_trade_attribution_table(df, client, cache, start_ms, end_ms, symbols, fetch_market=False, workers=2)
+    pd.testing.assert_frame_equal(serial, parallel)
+
+
+def test_batch_tables_match_per_range_tables(tmp_path):
+    cache = MarketDataCache(tmp_path)
+    start_ms = int(datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+    end_ms = int(datetime(2026, 1, 2, tzinfo=timezone.utc).timestamp() * 1000)
+    for i, symbol in enumerate(["ETHUSDT", "BTCUSDT"]):
+        for interval, step in (("1m", 60_000), ("5m", 300_000), ("1h", 3_600_000)):
+            times = range(start_ms - 86_400_000, end_ms, step)
+            klines = pd.DataFrame(
+                {
+                    "symbol": symbol,
+                    "open_time": list(times),
+                    "open": 100.0,
+                    "high": [101.0 + (t // step) % 7 for t in times],
+                    "low": 99.0,
+                    "close": [100.0 + i + (t // step) % 5 for t in times],
+                }
+            )
+            cache.save("klines", symbol, interval, klines)
+    rows = []
+    for hour in range(0, 24):
+        symbol = "ETHUSDT" if hour % 3 else "BTCUSDT"
+        action = "OPEN" if hour % 2 else "CLOSE"
+        rows.append((symbol, "TRADE", action, "1", "-0.5", str(hour - 12), f"2026-01-01 {hour:02d}:10:00.000"))
+        if hour % 8 == 0:
+            rows.append((symbol, "SETTLEMENT", "SETTLEMENT", "0", "0", "-1", f"2026-01-01 {hour:02d}:00:00.000"))
+    df = pd.DataFrame(rows, columns=["Contract", "Type", "Action", "Quantity", "Fee Paid", "Change", "Time"])
+    df["Filled Price"] = "2000"
+    df["Funding"] = np.where(df["Type"] == "SETTLEMENT", "-1", "0")
+    df["Direction"] = "BUY"
+    df["Time"] = pd.to_datetime(df["Time"], utc=True)
+    df["time_ms"] = (df["Time"].astype("int64") // 1_000_000).astype("int64")
+    df["symbol"] = df["Contract"]
+    df["action_norm"] = df["Action"].str.upper()
+    df["type_norm"] = df["Type"].str.upper()
+    df["direction_norm"] = df["Direction"].str.upper()
+
+    hour = 3_600_000
+    ranges = [(start_ms, end_ms), (start_ms + 5 * hour, start_ms + 13 * hour), (start_ms + 30 * hour, end_ms + 9 * hour)]
+    frames = [df[(df["time_ms"] >= lo) & (df["time_ms"] <= hi)] for lo, hi in ranges]
+    symbols = [sorted(set(frame["symbol"])) for frame in frames]
+    client = _dummy_client()
+    batch = build_trade_attribution_tables(frames, client, cache, ranges, symbols, fetch_market=False, workers=1)
+    for frame, (lo, hi), names, table in zip(frames, ranges, symbols, batch):
+        single = build_trade_attribution_table(frame, client, cache, lo, hi, names, fetch_market=False, workers=1)
+        pd.testing.assert_frame_equal(single, table)
+    assert len(batch[1]) < len(batch[0])
+    assert batch[2].empty
+    threaded = build_trade_attribution_tables(
+        frames, client, cache, ranges, symbols, fetch_market=False, workers=1, group_workers=2
+    )
+    for table, other in zip(batch, threaded):
+        pd.testing.assert_frame_equal(table, other)
+
+
+def test_mark_slippage_uses_execution_minute():
+    closes = pd.DataFrame(
+        {
+            "close_time": [30_000, 90_000, 100_000, 200_000],
+            "symbol": ["ETHUSDT"] * 4,
+            "direction": ["long", "short", "long", "long"],
+            "price": [101.0, 99.0, 99.5, 100.0],
+        }
+    )
+    marks = pd.DataFrame({"open_time": [0, 60_000], "open": [100.0, 99.0], "close": [100.0, 101.0]})
+    out = _asof_mark_slippage(closes, {"ETHUSDT": {"mark_bars": marks}}, ["ETHUSDT"])
+    # Positive is cost: a long sold below the mark paid, while a long sold
+    # above it and a short bought back below it gained.
+    assert np.allclose(out["slippage_bps"].to_numpy()[:3], [-100.0, -100.0, 50.0])
+    assert np.isnan(out["slippage_bps"].to_numpy()[3])
+
+
+def test_streamed_trade_log_frames_match_one_read(monkeypatch):
+    header = "Currency,Contract,Type,Direction,Quantity,Position,Filled Price,Funding,Fee Paid,Cash Flow,Change,Wallet Balance,Action,OrderId,TradeId,Time"
+    accounts = [uuid4(), uuid4()]
+    logs = []
+    for account_id in accounts:
+        rows = [header]
+        for idx in range(30):
+            day = 1 + idx // 6
+            rows.append(f"USDT,BTCUSDT,TRADE,BUY,1,1,{100 + idx},0,-0.01,0,0,{1000 + idx},Open,o{idx},a{idx},2024-01-{day:02d} {idx % 6:02d}:00:00")
+            rows.append(f"USDT,BTCUSDT,TRADE,BUY,1,0,{101 + idx},0,-0.01,0,{idx % 5 - 2},{1001 + idx},Close,c{idx},b{idx},2024-01-{day:02d} {idx % 6:02d}:30:00")
+        logs += parse_bybit_transaction_log_rows("\n".join(rows), account_id, "bybit", "linear")
+    engine = create_engine("sqlite://")
+    for model in (models.BybitTradeLog, models.Fill, models.Cashflow):
+        model.__table__.create(engine)
+    ranges = [
+        (datetime(2024, 1, 1), datetime(2024, 1, 3)),
+        (datetime(2024, 1, 2, 12), datetime(2024, 1, 6)),
+        (datetime(2024, 2, 1), datetime(2024, 2, 2)),
+    ]
+    groups = [[str(accounts[0])], [str(account_id) for account_id in accounts], [str(accounts[1])]]
+    with Session(engine) as db:
+        db.add_all([logs[idx] for idx in np.random.default_rng(5).permutation(len(logs))])
+        db.commit()
+
+        def read():
+            single = _build_bybit_df_from_db(db, None, None, datetime(2024, 1, 1), datetime(2024, 1, 31), [])
+            return [single] + _build_bybit_dfs_from_db(db, None, None, ranges, [], groups)
+
+        monkeypatch.setattr(settings, "REPORT_STREAM_CHUNK_ROWS", 0)
+        whole = read()
+        monkeypatch.setattr(settings, "REPORT_STREAM_CHUNK_ROWS", 7)
+        streamed = read()
+
+    assert [len(frame) for frame, _ in whole] == [120, 25, 72, 0]
+    for (got, got_realized), (want, want_realized) in zip(streamed, whole):
+        pd.testing.assert_frame_equal(got, want)
+        assert got_realized == want_realized
+    assert whole[0][0]["time_ms"].is_monotonic_increasing
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+
+from app.services.chart_series import build_chart_spec, lttb_indices
+from app.services.equity_curve import EquityCurve
+from app.services.metrics import DailyNet
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    x = np.arange(10_000, dtype=float)
+    y = np.sin(x / 500)
+    y[4_321] = 50.0
+    keep = lttb_indices(x, y, 200)
+    assert len(keep) == 200
+    assert keep[0] == 0 and keep[-1] == 9_999
+    assert np.all(np.diff(keep) > 0)
+    assert 4_321 in keep
+
+
+def test_chart_spec_respects_point_budget():
+    rng = np.random.default_rng(0)
+    curve = EquityCurve.from_pnl(np.arange(5_000) * 60_000, rng.normal(0, 1, 5_000))
+    daily = {date(2026, 1, d): DailyNet(net_after_fees_and_funding=Decimal(d), turnover=Decimal("100"), trading_fees=Decimal("0.05")) for d in range(1, 11)}
+    spec = build_chart_spec(curve, daily, budget=100)
+    charts = {chart["id"]: chart for chart in spec["charts"]}
+    assert set(charts) == {"equity", "drawdown", "daily_net", "fee_bps"}
+    assert len(charts["equity"]["option"]["series"][0]["data"]) == 100
+    assert len(charts["daily_net"]["option"]["series"][0]["data"]) == 10
+    assert charts["fee_bps"]["option"]["series"][0]["data"][0][1] == 5.0
+    assert max(point[1] for point in charts["drawdown"]["option"]["series"][0]["data"]) <= 0
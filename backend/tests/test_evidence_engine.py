@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from app.services.evidence_engine import EvidenceEngine, Scenario
+
+
+def _facts(n: int = 400, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "close_time": rng.integers(0, 10_000_000, n),
+            "pnl_net": rng.normal(0, 10, n).round(2),
+            "fee_bps": rng.random(n) * 8,
+            "market_state": rng.choice(["trend|high|na", "range|low|na", "range|mid|oi_up_price_up", "trend|mid|na"], n),
+        }
+    )
+
+
+def test_state_stats_match_groupby():
+    facts = _facts()
+    stats = EvidenceEngine.from_facts(facts).state_stats
+    grouped = facts.groupby("market_state")["pnl_net"]
+    assert np.allclose(stats["expectancy_net"], grouped.mean())
+    assert np.allclose(stats["win_rate_net"], grouped.apply(lambda x: (x > 0).mean()))
+    assert np.allclose(stats["tail_loss"], grouped.quantile(0.05))
+    assert (stats["trades"] == grouped.count()).all()
+
+
+def test_counterfactual_drawdowns_use_time_order():
+    facts = pd.DataFrame(
+        {
+            "close_time": [3, 1, 2, 4],
+            "pnl_net": [-5.0, 10.0, -2.0, 4.0],
+            "fee_bps": [1.0, 1.0, 1.0, 1.0],
+            "market_state": ["a", "b", "a", "b"],
+        }
+    )
+    result = EvidenceEngine.from_facts(facts).counterfactual_stats()
+    assert result["net_change_all"] == 7.0
+    assert result["mdd_all"] == 7.0
+
+
+def test_bootstrap_ci_brackets_point_estimates_and_is_reproducible():
+    engine = EvidenceEngine.from_facts(_facts())
+    ci = engine.bootstrap_state_ci(300, seed=3, chunk_elements=5_000)
+    stats = engine.state_stats
+    assert (ci["expectancy_net_lo"] <= stats["expectancy_net"]).all()
+    assert (ci["expectancy_net_hi"] >= stats["expectancy_net"]).all()
+    assert ((ci["win_rate_net_lo"] >= 0) & (ci["win_rate_net_hi"] <= 1)).all()
+    assert ci.equals(engine.bootstrap_state_ci(300, seed=3, chunk_elements=5_000))
+    rows = engine.performance_by_regime(bootstrap_resamples=50)["top"]
+    assert rows[0]["ci"]["resamples"] == 50
+
+
+def test_scenarios_match_filtered_replay():
+    facts = _facts()
+    facts["symbol"] = np.where(np.arange(len(facts)) % 3 == 0, "BTCUSDT", "ETHUSDT")
+    facts["fee"] = 0.5
+    facts["turnover"] = 1_000.0
+    facts["taker_proxy"] = np.arange(len(facts)) % 2
+    facts["after_big_loss_flag"] = (facts["pnl_net"].shift(1) < -15).astype(int)
+    engine = EvidenceEngine.from_facts(facts)
+    scenarios = [
+        Scenario(name="no_btc", exclude_symbols=frozenset({"BTCUSDT"})),
+        Scenario(name="no_trend_high", exclude_states=frozenset({"trend|high|na"})),
+        Scenario(name="cap", max_trades_2h=2, drop_after_big_loss=True),
+        Scenario(name="maker_taker", maker_fee_bps=1.0, taker_fee_bps=4.0),
+    ]
+    results = {row["name"]: row for row in engine.evaluate_scenarios(scenarios)}
+
+    ordered = facts.sort_values("close_time", kind="mergesort")
+    capped = ordered[ordered["after_big_loss_flag"] == 0]
+    capped = capped[capped.groupby(capped["close_time"] // 7_200_000).cumcount() < 2]
+    repriced = ordered["pnl_net"] + 0.5 - np.where(ordered["taker_proxy"] == 1, 0.4, 0.1)
+    expected = {
+        "no_btc": ordered.loc[ordered["symbol"] != "BTCUSDT", "pnl_net"],
+        "no_trend_high": ordered.loc[ordered["market_state"] != "trend|high|na", "pnl_net"],
+        "cap": capped["pnl_net"],
+        "maker_taker": repriced,
+    }
+    for name, pnl in expected.items():
+        equity = pnl.cumsum()
+        assert np.isclose(results[name]["net_change"], pnl.sum())
+        assert np.isclose(results[name]["max_drawdown"], (equity.cummax() - equity).max())
+        assert results[name]["trades"] == len(pnl)
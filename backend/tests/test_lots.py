@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from app.attribution.joiner import _match_open_times
+from app.attribution.lots import match_lots
+
+
+def _frame(rows: list[tuple[str, str, int, float]]) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=["symbol", "direction_norm", "time_ms", "qty"])
+
+
+def test_fifo_splits_partial_closes_across_lots():
+    opens = _frame([("ETHUSDT", "BUY", 0, 1.0), ("ETHUSDT", "BUY", 10_000, 3.0)])
+    closes = _frame([("ETHUSDT", "BUY", 20_000, 2.0), ("ETHUSDT", "BUY", 30_000, 2.0)])
+    open_times, matched = match_lots(opens, closes, "fifo")
+    assert np.allclose(open_times, [5_000.0, 10_000.0])
+    assert np.allclose(matched, [2.0, 2.0])
+
+
+def test_lifo_consumes_latest_lot_first():
+    opens = _frame([("ETHUSDT", "BUY", 0, 1.0), ("ETHUSDT", "BUY", 10_000, 1.0)])
+    closes = _frame([("ETHUSDT", "BUY", 20_000, 1.5)])
+    open_times, _ = match_lots(opens, closes, "lifo")
+    assert np.isclose(open_times[0], (10_000 * 1.0 + 0 * 0.5) / 1.5)
+
+
+def test_closes_without_logged_open_are_unknown():
+    opens = _frame([("ETHUSDT", "BUY", 50_000, 1.0), ("BTCUSDT", "SELL", 0, 1.0)])
+    closes = _frame([("ETHUSDT", "BUY", 20_000, 1.0), ("ETHUSDT", "SELL", 60_000, 1.0)])
+    for method in ("fifo", "lifo"):
+        open_times, matched = match_lots(opens, closes, method)
+        assert np.isnan(open_times).all()
+        assert (matched == 0).all()
+
+
+def test_default_holding_pairs_latest_open_like_a_stack():
+    data = pd.DataFrame(
+        {
+            "symbol": ["ETHUSDT"] * 3,
+            "direction_norm": ["BUY"] * 3,
+            "action_norm": ["OPEN", "OPEN", "OPEN"],
+            "time_ms": [0, 10_000, 40_000],
+            "Quantity": [1.0, 1.0, 1.0],
+        }
+    )
+    closes = _frame(
+        [("ETHUSDT", "BUY", 20_000, 1.0), ("ETHUSDT", "BUY", 30_000, 1.0), ("ETHUSDT", "BUY", 50_000, 1.0)]
+    )
+    open_times, holding = _match_open_times(data, closes)
+    assert open_times.tolist() == [10_000.0, 0.0, 40_000.0]
+    assert holding.tolist() == [10.0, 30.0, 10.0]
+
+
+def _random_rows(rng: np.random.Generator) -> pd.DataFrame:
+    return _frame(
+        [
+            ("ETHUSDT", str(rng.choice(["BUY", "SELL"])), int(rng.integers(0, 60)) * 1000, rng.integers(1, 8) / 4)
+            for _ in range(60)
+        ]
+    )
+
+
+def _events(opens: pd.DataFrame, closes: pd.DataFrame) -> list[tuple]:
+    return sorted(
+        [(row.direction_norm, row.time_ms, 0, i, row.qty) for i, row in enumerate(opens.itertuples())]
+        + [(row.direction_norm, row.time_ms, 1, i, row.qty) for i, row in enumerate(closes.itertuples())]
+    )
+
+
+def test_fifo_matches_queue_walk():
+    rng = np.random.default_rng(11)
+    for _ in range(5):
+        opens, closes = _random_rows(rng), _random_rows(rng)
+        open_times, matched = match_lots(opens, closes, "fifo")
+
+        queues: dict[str, list[list[float]]] = {}
+        for direction, time_ms, is_close, idx, qty in _events(opens, closes):
+            queue = queues.setdefault(direction, [])
+            if not is_close:
+                queue.append([time_ms, qty])
+                continue
+            taken, weighted = 0.0, 0.0
+            while qty > 0 and queue:
+                take = min(qty, queue[0][1])
+                taken, weighted, qty = taken + take, weighted + take * queue[0][0], qty - take
+                queue[0][1] -= take
+                if queue[0][1] <= 0:
+                    queue.pop(0)
+            assert np.isclose(matched[idx], taken)
+            if taken:
+                assert np.isclose(open_times[idx], weighted / taken)
+            else:
+                assert np.isnan(open_times[idx])
+
+
+def test_lifo_matches_stack_walk():
+    rng = np.random.default_rng(7)
+    opens, closes = _random_rows(rng), _random_rows(rng)
+    open_times, matched = match_lots(opens, closes, "lifo")
+
+    events = _events(opens, closes)
+    stacks: dict[str, list[list[float]]] = {}
+    for direction, time_ms, is_close, idx, qty in events:
+        stack = stacks.setdefault(direction, [])
+        if not is_close:
+            stack.append([time_ms, qty])
+            continue
+        taken, weighted = 0.0, 0.0
+        while qty > 0 and stack:
+            take = min(qty, stack[-1][1])
+            taken, weighted, qty = taken + take, weighted + take * stack[-1][0], qty - take
+            stack[-1][1] -= take
+            if stack[-1][1] <= 0:
+                stack.pop()
+        assert np.isclose(matched[idx], taken)
+        if taken:
+            assert np.isclose(open_times[idx], weighted / taken)
+        else:
+            assert np.isnan(open_times[idx])
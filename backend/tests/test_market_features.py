@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import numpy as np
 import pandas as pd
 
+from app.features.excursion import RangeExtremaIndex, trade_excursions
 from app.features.market_features import build_kline_features
 
 
@@ -17,3 +19,51 @@ def test_kline_bucket_extreme():
     )
     out = build_kline_features(df, window=3, prefix="30m")
     assert set(out["vol_bucket_30m"]).issubset({"low", "mid", "high"})
+
+
+def test_range_index_matches_slices_and_trade_excursions():
+    rng = np.random.default_rng(1)
+    close = 100 + rng.normal(0, 1, 500).cumsum()
+    bars = pd.DataFrame(
+        {
+            "open_time": np.arange(500) * 60_000,
+            "open": close,
+            "high": close + rng.random(500),
+            "low": close - rng.random(500),
+        }
+    )
+    index = RangeExtremaIndex.from_klines(bars)
+    lo = rng.integers(0, 500, 200)
+    hi = np.minimum(lo + rng.integers(0, 300, 200), 499)
+    assert np.array_equal(index.range_max(lo, hi), [bars["high"][a : b + 1].max() for a, b in zip(lo, hi)])
+    assert np.array_equal(index.range_min(lo, hi), [bars["low"][a : b + 1].min() for a, b in zip(lo, hi)])
+
+    mae, mfe = trade_excursions(index, [90_000.0, 90_000.0, np.nan], [250_000, 250_000, 250_000], ["long", "short", "long"])
+    entry = bars["open"][1]
+    up = (bars["high"][1:5].max() / entry - 1) * 1e4
+    down = (1 - bars["low"][1:5].min() / entry) * 1e4
+    assert np.allclose(mae[:2], [down, up])
+    assert np.allclose(mfe[:2], [up, down])
+    assert np.isnan(mae[2]) and np.isnan(mfe[2])
+
+
+def test_range_index_window_keeps_excursions_and_drops_outside_bars():
+    rng = np.random.default_rng(2)
+    close = 100 + rng.normal(0, 1, 500).cumsum()
+    bars = pd.DataFrame(
+        {
+            "open_time": np.arange(500) * 60_000,
+            "open": close,
+            "high": close + rng.random(500),
+            "low": close - rng.random(500),
+        }
+    )
+    open_times = rng.integers(100, 200, 50) * 60_000 + 30_000.0
+    close_times = open_times.astype(np.int64) + rng.integers(0, 100, 50) * 60_000
+    directions = rng.choice(["long", "short"], 50)
+    windowed = RangeExtremaIndex.from_klines(bars, int(open_times.min()), int(close_times.max()))
+    assert windowed.bar_open_time[0] <= open_times.min() < windowed.bar_open_time[0] + 60_000
+    assert windowed.bar_open_time[-1] <= close_times.max()
+    assert windowed.max_table.shape[1] < len(bars)
+    full = trade_excursions(RangeExtremaIndex.from_klines(bars), open_times, close_times, directions)
+    assert np.array_equal(trade_excursions(windowed, open_times, close_times, directions), full)
@@ -1,8 +1,24 @@
-from datetime import datetime, timezone
-from decimal import Decimal
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, localcontext
+from uuid import uuid4
+
+import numpy as np
+import pandas as pd
 
 from app.schemas.ledger import Cashflow, Fill
-from app.services.metrics import compute_metrics
+from app.services.conversion import BaseCurrencyConverter, convert_ledger_to_base
+from app.services.equity_curve import EquityCurve, TradeLogCurves
+from app.services.imports import parse_bybit_transaction_log_rows
+from app.services.ledger_columns import LedgerColumns, fixed_sums
+from app.services.metrics import (
+    TradeLogTotals,
+    compute_daily_series,
+    compute_metrics,
+    compute_metrics_from_trade_logs,
+    max_drawdown,
+)
+from app.services.progress import monthly_aggregate
+from app.storage.cache import MarketDataCache
 
 
 def test_metrics_fee_and_funding_split():
@@ -46,3 +62,222 @@ def test_metrics_fee_and_funding_split():
     assert metrics["funding_pnl"] == -0.2
     assert metrics["net_after_fees"] == 0.9
     assert metrics["net_after_fees_and_funding"] == 0.7
+
+
+def test_non_base_fees_and_cashflows_convert_to_base(tmp_path):
+    cache = MarketDataCache(tmp_path)
+    hour = 60 * 60 * 1000
+    cache.save("klines", "BNBUSDT", "1h", pd.DataFrame({"open_time": [0, hour], "close": [300.0, 310.0]}))
+    ts = datetime.fromtimestamp(1.5 * hour / 1000, tz=timezone.utc)
+    account_id = uuid4()
+    fills = [
+        Fill(
+            ts_utc=ts,
+            exchange_id="binance",
+            account_id=account_id,
+            account_type="um",
+            symbol="BTCUSDT",
+            side="buy",
+            price=Decimal("100"),
+            qty=Decimal("1"),
+            notional=Decimal("100"),
+            fee=Decimal("0.001"),
+            fee_asset="BNB",
+        )
+    ]
+    cashflows = [
+        Cashflow(
+            ts_utc=ts,
+            exchange_id="binance",
+            account_id=account_id,
+            account_type="um",
+            type="rebate",
+            amount=Decimal("0.01"),
+            asset="BNB",
+        ),
+        Cashflow(
+            ts_utc=ts,
+            exchange_id="binance",
+            account_id=account_id,
+            account_type="um",
+            type="rebate",
+            amount=Decimal("1"),
+            asset="XYZ",
+        ),
+    ]
+    fills, cashflows = convert_ledger_to_base(fills, cashflows, BaseCurrencyConverter(cache, base="USDT"))
+    metrics = compute_metrics(fills, cashflows)
+    # 1.5h sits inside the second bar, so its rate is the first bar's close.
+    assert metrics["trading_fees"] == 0.3
+    assert metrics["unconverted_fee_assets"] == []
+    assert metrics["unconverted_cashflow_assets"] == ["XYZ"]
+    assert cashflows[0].amount == Decimal("3.0")
+
+
+def test_equity_curve_drawdown_matches_daily_loop_and_tracks_recovery():
+    pnl = [5.0, -3.0, -4.0, 6.0, 1.0, -2.0]
+    stats = EquityCurve.from_pnl([1_000, 2_000, 3_000, 4_000, 5_000, 6_000], pnl).drawdown_stats()
+    assert stats["max_drawdown"] == float(max_drawdown([Decimal(str(v)) for v in pnl]))
+    assert stats["drawdown_seconds"] == 2
+    assert stats["recovery_seconds"] == 2
+    assert stats["longest_underwater_seconds"] == 4
+
+
+def test_fixed_sums_stay_exact_past_the_int64_range():
+    values = [1e19, -2.5e20, 9.3e18, 0.30000000000000004, 1e-20, 12.5, np.nan, 0.1]
+    codes = np.array([0, 0, 1, 1, 1, 2, 2, 2])
+    expected = [Decimal(0)] * 3
+    with localcontext() as context:
+        context.prec = 100
+        for value, code in zip(values, codes):
+            if np.isfinite(value):
+                expected[code] += Decimal(str(value))
+    assert fixed_sums(values, codes, 3) == expected
+
+
+def test_ledger_columns_match_decimal_metrics_exactly():
+    rng = np.random.default_rng(3)
+    account_id = uuid4()
+    start = datetime(2024, 1, 25)
+    fills = [
+        Fill(
+            ts_utc=start + timedelta(hours=int(hours)),
+            exchange_id="binance",
+            account_id=account_id,
+            account_type="um",
+            symbol="BTCUSDT",
+            side="buy",
+            price=price,
+            qty=qty,
+            notional=price * qty,
+            fee=fee,
+            fee_asset="USDT" if idx % 5 else "BNB",
+        )
+        for idx, (hours, price, qty, fee) in enumerate(
+            zip(rng.integers(0, 24 * 20, 300), rng.random(300) * 1e5, rng.random(300), rng.normal(0, 1e-3, 300))
+        )
+    ]
+    cashflows = [
+        Cashflow(
+            ts_utc=start + timedelta(hours=int(hours)),
+            exchange_id="binance",
+            account_id=account_id,
+            account_type="um",
+            type=kind,
+            amount=amount,
+            asset="USDT",
+            symbol="ETHUSDT" if idx % 3 else None,
+        )
+        for idx, (hours, kind, amount) in enumerate(
+            zip(
+                rng.integers(0, 24 * 20, 200),
+                rng.choice(["realized_pnl", "funding", "rebate", "borrow_interest", "transfer"], 200),
+                rng.normal(0, 50, 200),
+            )
+        )
+    ]
+    columns = LedgerColumns.from_ledger(fills, cashflows)
+
+    assert columns.metrics() == compute_metrics(fills, cashflows)
+    expected_daily = compute_daily_series(fills, cashflows)
+    daily = columns.daily_series()
+    assert list(daily) == list(expected_daily)
+    assert all(daily[day] == expected_daily[day] for day in daily)
+    assert [(m.month, m.metrics) for m in columns.monthly()] == [
+        (m.month, m.metrics) for m in monthly_aggregate(fills, cashflows)
+    ]
+
+
+def test_bybit_logs_are_typed_once_at_import():
+    content = "\n".join(
+        [
+            "Currency,Contract,Type,Direction,Quantity,Position,Filled Price,Funding,Fee Paid,Cash Flow,Change,Wallet Balance,Action,OrderId,TradeId,Time",
+            "USDT,BTCUSDT,Trade,BUY,2,2,100.5,0,-0.1,0,0,1000,open,o1,t1,2024-01-01 00:00:00",
+            "USDT,BTCUSDT,TRADE,SELL,2,0,101.5,0,-0.1,0,2,1002,Close,o2,t2,2024-01-01 01:00:00",
+            "USDT,BTCUSDT,SETTLEMENT,--,--,0,--,-0.25,0,0,-0.25,1001.75,--,,,2024-01-01 08:00:00",
+        ]
+    )
+    logs = parse_bybit_transaction_log_rows(content, uuid4(), "bybit", "linear")
+
+    assert [log.type_norm for log in logs] == ["TRADE", "TRADE", "SETTLEMENT"]
+    assert [log.action_norm for log in logs] == ["OPEN", "CLOSE", "--"]
+    assert logs[1].filled_price_num == Decimal("101.5")
+    assert logs[2].quantity_num is None
+    assert logs[2].funding_num == Decimal("-0.25")
+
+    metrics = compute_metrics_from_trade_logs(logs)
+    assert metrics["trades"] == 1
+    assert metrics["turnover"] == 203.0
+    assert metrics["trading_fees"] == 0.1
+    assert metrics["funding_pnl"] == -0.25
+    assert metrics["net_after_fees_and_funding"] == 1.65
+
+
+def test_trade_log_accumulators_ignore_chunk_boundaries():
+    rows = ["Currency,Contract,Type,Direction,Quantity,Position,Filled Price,Funding,Fee Paid,Cash Flow,Change,Wallet Balance,Action,OrderId,TradeId,Time"]
+    for idx in range(40):
+        day = 1 + idx // 8
+        rows.append(f"USDT,BTCUSDT,TRADE,BUY,1,1,{100 + idx},0,-0.01,0,0,{1000 + idx},Open,o{idx},a{idx},2024-01-{day:02d} {idx % 8:02d}:00:00")
+        rows.append(f"USDT,ETHUSDT,TRADE,SELL,1,0,{101 + idx},0,-0.01,0,{idx % 7 - 3},{1001 + idx},Close,c{idx},b{idx},2024-01-{day:02d} {idx % 8:02d}:30:00")
+        if idx % 8 == 7:
+            rows.append(f"USDT,BTCUSDT,SETTLEMENT,--,--,0,--,-0.{idx},0,0,0,{999 + idx},--,,,2024-01-{day:02d} 08:00:00")
+    logs = parse_bybit_transaction_log_rows("\n".join(rows), uuid4(), "bybit", "linear")
+
+    whole = TradeLogTotals().add(logs)
+    chunked = TradeLogTotals()
+    whole_curves = TradeLogCurves().add(logs)
+    chunked_curves = TradeLogCurves()
+    for offset in range(0, len(logs), 7):
+        chunked.add(logs[offset : offset + 7])
+        chunked_curves.add(logs[offset : offset + 7])
+
+    assert chunked.metrics() == whole.metrics() == compute_metrics_from_trade_logs(logs)
+    assert chunked.daily_series() == whole.daily_series()
+    assert chunked.window() == whole.window()
+    assert chunked.top_symbols() == whole.top_symbols()
+    assert chunked_curves.trade_curve().drawdown_stats() == whole_curves.trade_curve().drawdown_stats()
+    assert chunked_curves.wallet_curve().drawdown_stats() == whole_curves.wallet_curve().drawdown_stats()
+
+
+def test_ledger_columns_split_by_account_and_range():
+    accounts = [uuid4(), uuid4()]
+    start = datetime(2024, 3, 1)
+    fills = [
+        Fill(
+            ts_utc=start + timedelta(hours=idx * 5),
+            exchange_id="okx",
+            account_id=accounts[idx % 2],
+            account_type="swap",
+            symbol="BTCUSDT",
+            side="buy",
+            price=Decimal("100"),
+            qty=Decimal(idx + 1),
+            notional=Decimal(100 * (idx + 1)),
+            fee=Decimal("0.05"),
+            fee_asset="USDT",
+        )
+        for idx in range(30)
+    ]
+    cashflows = [
+        Cashflow(
+            ts_utc=start + timedelta(hours=idx * 7),
+            exchange_id="okx",
+            account_id=accounts[idx % 2],
+            account_type="swap",
+            type="realized_pnl" if idx % 3 else "funding",
+            amount=Decimal(idx - 9),
+            asset="USDT",
+            symbol="BTCUSDT",
+        )
+        for idx in range(20)
+    ]
+    columns = LedgerColumns.from_ledger(fills, cashflows)
+    lo, hi = start + timedelta(days=1), start + timedelta(days=4)
+
+    for account_id in accounts:
+        own_fills = [f for f in fills if f.account_id == account_id and lo <= f.ts_utc <= hi]
+        own_cash = [cf for cf in cashflows if cf.account_id == account_id and lo <= cf.ts_utc <= hi]
+        part = columns.between(lo, hi).for_accounts([account_id])
+        assert part.metrics() == compute_metrics(own_fills, own_cash)
+        assert part.daily_series() == compute_daily_series(own_fills, own_cash)
+    assert columns.for_accounts(accounts).metrics() == columns.metrics()
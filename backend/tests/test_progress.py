@@ -1,8 +1,36 @@
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from decimal import Decimal
+from uuid import uuid4
 
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.db import models
+from app.db.inserts import insert_ignoring_conflicts
 from app.schemas.ledger import Cashflow, Fill
-from app.services.progress import monthly_aggregate
+from app.services.conversion import BaseCurrencyConverter
+from app.services.ledger_columns import LedgerColumns
+from app.services.metrics import (
+    compute_daily_series,
+    compute_daily_series_from_rollups,
+    compute_metrics,
+    compute_metrics_from_rollups,
+)
+from app.services.progress import monthly_aggregate, monthly_aggregate_from_rollups
+from app.services.rollups import (
+    ROLLUP_AMOUNTS,
+    ROLLUP_COUNTS,
+    ROLLUP_SOURCE_LEDGER,
+    _ledger_rollups,
+    convert_rollup_amounts,
+    ensure_daily_rollups,
+    mark_converted,
+    refresh_rollups_for_rows,
+)
+from app.services.snapshots import load_rollups_with_snapshots
+from app.storage.cache import MarketDataCache
 
 
 def test_monthly_aggregate_groups():
@@ -34,3 +62,281 @@ def test_monthly_aggregate_groups():
     ]
     result = monthly_aggregate(fills, cashflows)
     assert result[0].month == "2024-01"
+
+
+def _rollup(day: date, asset: str = "USDT", **values) -> dict:
+    row = {"exchange_id": "bybit", "day": day, "symbol": "BTCUSDT", "asset": asset, "source": "ledger"}
+    row.update({name: 0 for name in ROLLUP_COUNTS})
+    row.update({name: 0.0 for name in ROLLUP_AMOUNTS})
+    row.update(values)
+    row["converted"] = asset == "USDT"
+    return row
+
+
+def test_monthly_aggregate_from_rollups_matches_ledger():
+    account_id = uuid4()
+    fills = [
+        Fill(
+            ts_utc=datetime(2024, 1, day, tzinfo=timezone.utc),
+            exchange_id="bybit",
+            account_id=account_id,
+            account_type="linear",
+            symbol="BTCUSDT",
+            side="buy",
+            price=Decimal("100"),
+            qty=Decimal("1"),
+            notional=Decimal("100"),
+            fee=Decimal("0.1"),
+            fee_asset="USDT" if day < 20 else "BNB",
+        )
+        for day in (3, 10, 25)
+    ] + [
+        Fill(
+            ts_utc=datetime(2024, 2, 2, tzinfo=timezone.utc),
+            exchange_id="bybit",
+            account_id=account_id,
+            account_type="linear",
+            symbol="BTCUSDT",
+            side="sell",
+            price=Decimal("110"),
+            qty=Decimal("2"),
+            notional=Decimal("220"),
+            fee=Decimal("0.2"),
+            fee_asset="USDT",
+        )
+    ]
+    cashflows = [
+        Cashflow(
+            ts_utc=datetime(2024, 1, 10, tzinfo=timezone.utc),
+            exchange_id="bybit",
+            account_id=account_id,
+            account_type="linear",
+            type="realized_pnl",
+            amount=Decimal("-3.0"),
+            asset="USDT",
+        ),
+        Cashflow(
+            ts_utc=datetime(2024, 2, 2, tzinfo=timezone.utc),
+            exchange_id="bybit",
+            account_id=account_id,
+            account_type="linear",
+            type="funding",
+            amount=Decimal("0.5"),
+            asset="USDT",
+        ),
+    ]
+    rollups = pd.DataFrame(
+        [
+            _rollup(date(2024, 1, 3), trades=1, turnover=100.0, fill_fees=0.1),
+            _rollup(date(2024, 1, 10), trades=1, turnover=100.0, fill_fees=0.1, realized_pnl=-3.0, cashflows=1),
+            _rollup(date(2024, 1, 25), asset="BNB", trades=1, turnover=100.0, fill_fees=0.1),
+            _rollup(date(2024, 2, 2), trades=1, turnover=220.0, fill_fees=0.2, funding=0.5, cashflows=1),
+        ]
+    )
+
+    expected = monthly_aggregate(fills, cashflows)
+    result = monthly_aggregate_from_rollups(rollups)
+    assert [summary.month for summary in result] == ["2024-01", "2024-02"]
+    for got, want in zip(result, expected):
+        assert got.metrics.keys() == want.metrics.keys()
+        for key, value in want.metrics.items():
+            if isinstance(value, float):
+                assert abs(got.metrics[key] - value) < 1e-9
+            else:
+                assert got.metrics[key] == value
+
+
+def test_monthly_aggregate_from_rollups_uses_frozen_months():
+    rollups = pd.DataFrame(
+        [
+            _rollup(date(2024, 1, 3), trades=1, turnover=100.0, fill_fees=0.1),
+            _rollup(date(2024, 2, 2), trades=1, turnover=220.0, fill_fees=0.2, funding=0.5, cashflows=1),
+        ]
+    )
+    live = monthly_aggregate_from_rollups(rollups)
+    frozen = {"2024-01": {**live[0].metrics, "turnover": 999.0}}
+
+    result = monthly_aggregate_from_rollups(rollups, frozen)
+    assert result[0].metrics["turnover"] == 999.0
+    assert result[1].metrics == live[1].metrics
+    frozen["2024-01"]["turnover"] = 0.0
+    assert result[0].metrics["turnover"] == 999.0
+
+
+def _rollup_db() -> Session:
+    engine = create_engine("sqlite://")
+    for model in (models.Fill, models.Cashflow, models.DailyRollup, models.MonthlySnapshot, models.RollupBackfill):
+        model.__table__.create(engine)
+    return Session(engine)
+
+
+def _ledger_fill(account_id, ts: datetime, notional: float, fee: float) -> dict:
+    return {
+        "ts_utc": ts,
+        "exchange_id": "bybit",
+        "account_id": account_id,
+        "account_type": "linear",
+        "symbol": "BTCUSDT",
+        "side": "buy",
+        "price": notional,
+        "qty": 1.0,
+        "notional": notional,
+        "fee": fee,
+        "fee_asset": "USDT",
+        "trade_id": f"t{ts.isoformat()}",
+    }
+
+
+def test_ensure_backfills_history_older_than_incremental_refresh():
+    account_id = uuid4()
+    history = [_ledger_fill(account_id, datetime(2024, 1, 5, hour), 100.1, 0.1) for hour in (1, 2, 3)]
+    synced = [_ledger_fill(account_id, datetime(2024, 3, 10), 220.0, 0.2)]
+    with _rollup_db() as db:
+        db.add_all([models.Fill(**row) for row in history + synced])
+        refresh_rollups_for_rows(db, ROLLUP_SOURCE_LEDGER, synced)
+        db.commit()
+        assert [row.day for row in db.query(models.DailyRollup)] == [date(2024, 3, 10)]
+
+        ensure_daily_rollups(db, [account_id], ROLLUP_SOURCE_LEDGER)
+        rows = {row.day: row for row in db.query(models.DailyRollup)}
+        assert sorted(rows) == [date(2024, 1, 5), date(2024, 3, 10)]
+        assert float(rows[date(2024, 1, 5)].turnover) == 300.3
+        assert float(rows[date(2024, 1, 5)].fill_fees) == 0.3
+
+        # Backfilling only flushes; the report transaction decides whether it sticks.
+        db.rollback()
+        assert [row.day for row in db.query(models.DailyRollup)] == [date(2024, 3, 10)]
+        assert db.query(models.RollupBackfill).count() == 0
+
+        ensure_daily_rollups(db, [account_id], ROLLUP_SOURCE_LEDGER)
+        db.commit()
+        db.query(models.Fill).filter(models.Fill.ts_utc < datetime(2024, 2, 1)).delete()
+        ensure_daily_rollups(db, [account_id], ROLLUP_SOURCE_LEDGER)
+        assert db.query(models.DailyRollup).count() == 2
+
+
+def test_freezing_snapshots_leaves_the_commit_to_the_caller():
+    account_id = uuid4()
+    rows = [_ledger_fill(account_id, datetime(2024, 1, 5), 100.0, 0.1)]
+    with _rollup_db() as db:
+        db.add_all([models.Fill(**row) for row in rows])
+        refresh_rollups_for_rows(db, ROLLUP_SOURCE_LEDGER, rows)
+        db.commit()
+
+        _, frozen = load_rollups_with_snapshots(db, [account_id], ROLLUP_SOURCE_LEDGER)
+        assert frozen["2024-01"]["turnover"] == 100.0
+        db.rollback()
+        assert db.query(models.MonthlySnapshot).count() == 0
+
+        load_rollups_with_snapshots(db, [account_id], ROLLUP_SOURCE_LEDGER)
+        db.commit()
+        january = db.query(models.MonthlySnapshot).filter(models.MonthlySnapshot.month == "2024-01")
+        snapshot = january.one()
+        # A second report freezing the same month concurrently is a no-op, not an error.
+        duplicate = {name: getattr(snapshot, name) for name in ("account_id", "source", "month", "base_currency")}
+        insert_ignoring_conflicts(
+            db,
+            models.MonthlySnapshot,
+            [{**duplicate, "metrics": {}, "daily": [], "updated_at": datetime.utcnow()}],
+            ["account_id", "source", "month", "base_currency"],
+        )
+        assert january.one().metrics["turnover"] == 100.0
+
+
+def test_streamed_ledger_columns_arrive_in_time_order():
+    account_id = uuid4()
+    rng = np.random.default_rng(7)
+    rows = [
+        _ledger_fill(account_id, datetime(2024, 1, 1 + int(day), int(hour)), 100.0 + idx, 0.1)
+        for idx, (day, hour) in enumerate(zip(rng.integers(0, 20, 40), rng.integers(0, 24, 40)))
+    ]
+    cash = [
+        {
+            "ts_utc": row["ts_utc"],
+            "exchange_id": "bybit",
+            "account_id": account_id,
+            "account_type": "linear",
+            "type": "realized_pnl" if idx % 3 else "funding",
+            "amount": float(idx % 7 - 3),
+            "asset": "USDT",
+        }
+        for idx, row in enumerate(rows)
+    ]
+    with _rollup_db() as db:
+        db.add_all([models.Fill(**row) for row in rng.permutation(rows)])
+        db.add_all([models.Cashflow(**row) for row in rng.permutation(cash)])
+        db.commit()
+
+        streamed = LedgerColumns.load(db, [account_id], chunk_rows=3)
+        whole = LedgerColumns.load(db, [account_id], chunk_rows=1000)
+
+    assert list(streamed.fill_ts) == sorted(row["ts_utc"] for row in rows)
+    assert list(streamed.cash_ts) == sorted(row["ts_utc"] for row in cash)
+    assert list(streamed.fill_notional) == list(whole.fill_notional)
+    assert streamed.metrics() == whole.metrics()
+    assert streamed.daily_series() == whole.daily_series()
+
+
+def test_rollup_metrics_match_ledger_metrics_exactly():
+    account_id = uuid4()
+    rng = np.random.default_rng(3)
+    times = [datetime(2024, 1, 1 + int(day), int(hour)) for day, hour in zip(rng.integers(0, 28, 600), rng.integers(0, 24, 600))]
+    symbols = rng.choice(["BTCUSDT", "ETHUSDT", "SOLUSDT", "XRPUSDT"], 600)
+    fills = [
+        {
+            **_ledger_fill(account_id, ts, round(float(notional), 8), round(float(fee), 8)),
+            "symbol": str(symbol),
+            "trade_id": f"t{idx}",
+        }
+        for idx, (ts, symbol, notional, fee) in enumerate(
+            zip(times, symbols, rng.uniform(10, 1000, 600), rng.uniform(0, 0.7, 600))
+        )
+    ]
+    cash = [
+        {
+            "ts_utc": ts,
+            "exchange_id": "bybit",
+            "account_id": account_id,
+            "account_type": "linear",
+            "symbol": str(symbol),
+            "type": str(kind),
+            "amount": round(float(amount), 8),
+            "asset": "USDT",
+        }
+        for ts, symbol, kind, amount in zip(
+            times,
+            symbols,
+            rng.choice(["realized_pnl", "funding", "rebate", "borrow_interest", "transfer"], 600),
+            rng.normal(0, 30, 600),
+        )
+    ]
+    with _rollup_db() as db:
+        db.add_all([models.Fill(**row) for row in fills] + [models.Cashflow(**row) for row in cash])
+        db.commit()
+        # The aggregate is read straight back: SQLite stores Numeric as a float.
+        rollups = _ledger_rollups(db, account_id, datetime(2024, 1, 1), datetime(2024, 2, 1))
+    rollups = mark_converted(rollups.assign(source=ROLLUP_SOURCE_LEDGER), "USDT")
+
+    decimal = lambda value: Decimal(repr(value))
+    ledger_fills = [
+        Fill(**{**row, "price": decimal(row["price"]), "qty": decimal(row["qty"]), "notional": decimal(row["notional"]), "fee": decimal(row["fee"])})
+        for row in fills
+    ]
+    ledger_cash = [Cashflow(**{**row, "amount": decimal(row["amount"])}) for row in cash]
+    assert compute_metrics_from_rollups(rollups) == compute_metrics(ledger_fills, ledger_cash)
+    assert compute_daily_series_from_rollups(rollups) == compute_daily_series(ledger_fills, ledger_cash)
+
+
+def test_rollup_conversion_keeps_decimal_amounts(tmp_path):
+    cache = MarketDataCache(tmp_path)
+    hour = 60 * 60 * 1000
+    cache.save("klines", "BNBUSDT", "1h", pd.DataFrame({"open_time": [0, hour], "close": [300.0, 310.0]}))
+    rollups = pd.DataFrame(
+        [
+            _rollup(date(1970, 1, 1), asset="BNB", trades=1, fill_fees=Decimal("0.001")),
+            _rollup(date(1970, 1, 1), trades=1, fill_fees=Decimal("0.1")),
+        ]
+    )
+    converted = convert_rollup_amounts(rollups, BaseCurrencyConverter(cache, base="USDT"), np.array([3 * hour, 3 * hour]))
+    assert converted["fill_fees"].tolist() == [Decimal("0.3100"), Decimal("0.1")]
+    assert compute_metrics_from_rollups(converted)["trading_fees"] == 0.41
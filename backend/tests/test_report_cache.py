@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db import models
+from app.schemas.report import ReportRequest
+from app.services.report_cache import MARKET_TABLES, clone_report_result, report_cache_key
+from app.services.rollups import ROLLUP_SOURCE_LEDGER, refresh_rollups_for_rows
+
+
+def _cache_db() -> Session:
+    engine = create_engine("sqlite://")
+    tables = [models.Fill, models.Cashflow, models.BybitTradeLog, models.DailyRollup, models.MonthlySnapshot]
+    for model in tables + [models.RollupBackfill, *MARKET_TABLES]:
+        model.__table__.create(engine)
+    return Session(engine)
+
+
+def _fill(account_id, ts: datetime) -> dict:
+    return {
+        "ts_utc": ts,
+        "exchange_id": "bybit",
+        "account_id": account_id,
+        "account_type": "linear",
+        "symbol": "BTCUSDT",
+        "side": "buy",
+        "price": 100.0,
+        "qty": 1.0,
+        "notional": 100.0,
+        "fee": 0.1,
+        "fee_asset": "USDT",
+        "trade_id": f"t{ts.isoformat()}",
+    }
+
+
+def _add_fills(db: Session, rows: list[dict]) -> None:
+    db.add_all([models.Fill(**row) for row in rows])
+    refresh_rollups_for_rows(db, ROLLUP_SOURCE_LEDGER, rows)
+    db.commit()
+
+
+def test_now_ended_presets_reuse_the_key_until_ledger_or_settings_change(monkeypatch):
+    account_id = uuid4()
+    now = datetime(2024, 3, 20, 12, tzinfo=timezone.utc)
+    payload = ReportRequest(preset="last_7d")
+    with _cache_db() as db:
+        _add_fills(db, [_fill(account_id, datetime(2024, 3, 10)), _fill(account_id, datetime(2024, 3, 18))])
+
+        def key(at: datetime) -> str:
+            return report_cache_key(db, payload, [account_id], at - timedelta(days=7), at)
+
+        first = key(now)
+        assert key(now + timedelta(minutes=5)) == first
+        assert key(now + timedelta(days=6)) != first
+
+        # A refresh outside the window still moves the ledger watermark.
+        _add_fills(db, [_fill(account_id, datetime(2024, 2, 1))])
+        refreshed = key(now)
+        assert refreshed != first
+        assert key(now + timedelta(seconds=30)) == refreshed
+
+        monkeypatch.setattr(settings, "CHART_POINT_BUDGET", settings.CHART_POINT_BUDGET + 1)
+        assert key(now) != refreshed
+
+
+def test_cloned_report_takes_the_new_range_labels():
+    start = datetime(2024, 3, 13, tzinfo=timezone.utc)
+    source = models.ReportRun(
+        summary_json={"scope": {"start": "old", "end": "old", "preset": "last_7d"}, "period": {"trades": 2}},
+        evidence_json={"meta": {"range": {"start": "old", "end": "old", "preset": "last_7d"}}},
+    )
+    target = models.ReportRun(start=start, end=start + timedelta(days=7))
+    clone_report_result(source, target)
+    assert target.summary_json["scope"] == {"start": start.isoformat(), "end": target.end.isoformat(), "preset": "last_7d"}
+    assert target.summary_json["period"] == {"trades": 2}
+    assert target.evidence_json["meta"]["range"]["end"] == target.end.isoformat()
+    assert source.summary_json["scope"]["start"] == "old"